@@ -1,6 +1,9 @@
 from django.contrib.auth import get_user_model
 from django.contrib.auth.backends import ModelBackend
-from django.db.models import Q
+from django.core.exceptions import PermissionDenied
+from django.db.models import Case, Q, Value, When
+
+from extensions.ratelimit import check_limits, get_client_ip
 
 # Create your custom model backends / backends here.
 
@@ -21,20 +24,48 @@ class EmailOrUsernameModelBackend(ModelBackend):
         if username is None:
             username = kwargs.get(user_model.USERNAME_FIELD)
 
-        # The `username` field is allows to contain `@` characters so
-        # technically a given email address could be present in either field,
-        # possibly even for different users, so we'll query for all matching
-        # records and test each one.
-        users = user_model._default_manager.filter(
-            Q(**{user_model.USERNAME_FIELD: username}) | Q(email__iexact=username)
-        )
-
-        # Test whether any matched user has the provided password:
-        for user in users:
-            if user.check_password(password):
-                return user
-        if not users:
+        # Password guessing is throttled per IP address (when there is a request) before any query, then per account
+        # (read extensions/ratelimit.py) before any password hashing. PermissionDenied stops authenticate() at once,
+        # the login fails like with a wrong password.
+        if check_limits("login", ip=get_client_ip(request) if request is not None else None):
+            raise PermissionDenied
+
+        if username is None or password is None:
+            return None
+
+        user = self.get_login_user(username)
+        # The bucket of an account is the user, whatever login was typed (the username, or the email in any case), so
+        # an attacker cannot get new tokens by changing the case. Logins of no user share a bucket per casefolded
+        # login.
+        if check_limits("login", account="user:{}".format(user.pk) if user is not None else
+                        "login:{}".format(str(username).casefold())):
+            raise PermissionDenied
+        if user is None:
             # Run the default password hasher once to reduce the timing
             # difference between an existing and a non-existing user (see
             # https://code.djangoproject.com/ticket/20760)
             user_model().set_password(password)
+            return None
+        # The password is checked even for inactive users, so they take as long as everyone else.
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+
+    def get_login_user(self, login):
+        """
+        The user of a login: a username, or an email address in any case. One query, served by two indexes (the unique
+        username and the UPPER(email) index of CustomUser), that returns at most one user.
+        """
+        return self.get_login_users(login).first()
+
+    def get_login_users(self, login):
+        """
+        The users that match a login, best match first. The `username` field is allowed to contain `@` characters, so
+        technically a given email address could be present in either field, possibly even for different users (and
+        the emails are only unique with their exact case). The exact username wins, then the oldest account, so the
+        password is checked (hashed) only once.
+        """
+        user_model = get_user_model()
+        username_field = user_model.USERNAME_FIELD
+        return user_model._default_manager.filter(
+            Q(**{username_field: login}) | Q(email__iexact=login)
+        ).order_by(Case(When(**{username_field: login}, then=Value(0)), default=Value(1)), "pk")
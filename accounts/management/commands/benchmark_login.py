@@ -0,0 +1,108 @@
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+
+from accounts.backends import EmailOrUsernameModelBackend
+from blog.models import SiteStatistic
+
+
+class Command(BaseCommand):
+    """
+    Measures the logins of EmailOrUsernameModelBackend on a big users table (1M users by default): the user lookup
+    alone (one query, the part that grows with the table) for username, email and unknown logins, and whole
+    authentications (lookup plus password hashing) for the same three kinds. The unknown logins should take as long
+    as the others, the hasher runs for them too.
+
+    The missing benchmark users ("<prefix>-<number>", with mixed case emails so the email logins exercise the
+    case-insensitive lookup) are created first with bulk_create, in batches, all with the same password hash. They are
+    kept for the next runs; delete them with a filter on the prefix. The query plan of an email lookup is printed at
+    the end: it should use accounts_user_email_upper_idx, not a sequential scan.
+
+    Usage: python manage.py benchmark_login [--users 1000000] [--lookups 2000] [--authentications 20]
+    """
+
+    help = "Measures username and email login throughput of the authentication backend on a large users table."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000000)
+        parser.add_argument("--lookups", type=int, default=2000)
+        parser.add_argument("--authentications", type=int, default=20)
+        parser.add_argument("--prefix", default="bench-user")
+        parser.add_argument("--batch-size", type=int, default=10000)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        self.prefix = options["prefix"]
+        self.random = random.Random(options["seed"])
+        self.seed_users(options["users"], options["batch_size"])
+        backend = EmailOrUsernameModelBackend()
+
+        logins = {
+            "username": lambda number: "{}-{}".format(self.prefix, number),
+            # Stored as "Bench-User-N@Example.com": the lookup must ignore the case.
+            "email": lambda number: "{}-{}@example.com".format(self.prefix, number),
+            "missing": lambda number: "{}-missing-{}@example.com".format(self.prefix, number),
+        }
+
+        self.stdout.write("{:<10} {:>12} {:>12} {:>14}".format("login", "median (ms)", "p95 (ms)", "lookups/s"))
+        for kind, login in logins.items():
+            timings = self.measure(lambda: backend.get_login_user(login(self.random.randrange(options["users"]))),
+                                   options["lookups"])
+            self.report(kind, timings)
+
+        self.stdout.write("\n{:<10} {:>12} {:>12} {:>14}".format("login", "median (ms)", "p95 (ms)", "logins/s"))
+        password = "{}-password".format(self.prefix)
+        # The benchmark logs in much faster than the rate limits of the logins allow.
+        with override_settings(RATELIMITS={}):
+            for kind, login in logins.items():
+                timings = self.measure(lambda: backend.authenticate(
+                    None, username=login(self.random.randrange(options["users"])), password=password),
+                    options["authentications"])
+                self.report(kind, timings)
+
+        self.stdout.write("\nQuery plan of an email login:")
+        self.stdout.write(backend.get_login_users(logins["email"](0))[:1].explain())
+
+    def seed_users(self, count, batch_size):
+        user_model = get_user_model()
+        existing = user_model.objects.filter(username__startswith="{}-".format(self.prefix)).exclude(
+            username__contains="-missing-").count()
+        if existing >= count:
+            return
+        self.stdout.write("Creating {} benchmark users...".format(count - existing))
+        # Hashing a password is slow on purpose, so all the benchmark users share one hash.
+        password = make_password("{}-password".format(self.prefix))
+        for start in range(existing, count, batch_size):
+            user_model.objects.bulk_create([
+                user_model(
+                    username="{}-{}".format(self.prefix, number),
+                    email="{}-{}@Example.com".format(self.prefix.title(), number),
+                    password=password,
+                )
+                for number in range(start, min(start + batch_size, count))
+            ])
+        # bulk_create sends no signals; the planner needs fresh statistics to pick the indexes of the new rows.
+        SiteStatistic.objects.reconcile(["users"])
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE {}".format(user_model._meta.db_table))
+
+    @staticmethod
+    def measure(function, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function()
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        return timings
+
+    def report(self, kind, timings):
+        median = timings[len(timings) // 2]
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        self.stdout.write("{:<10} {:>12.3f} {:>12.3f} {:>14.0f}".format(
+            kind, median, p95, len(timings) / (sum(timings) / 1000)))
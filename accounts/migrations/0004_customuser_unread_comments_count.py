@@ -0,0 +1,18 @@
+# Generated by Django 4.0.6 on 2026-10-18 08:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_alter_customuser_email'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='unread_comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='نظرات خوانده نشده'),
+        ),
+    ]
@@ -1,8 +1,11 @@
 from django.db import models
+from django.db.models.functions import Upper
 from django.contrib.auth.models import AbstractUser
 from django.utils.translation import gettext as _
 from django.utils.html import format_html
 
+from extensions.images import get_variant_url
+
 # Create your models here.
 
 
@@ -31,8 +34,14 @@ class CustomUser(AbstractUser):
 
     avatar = models.ImageField(_("آواتار"), upload_to="accounts/", default="defaults/user_default_avatar.png",
                                blank=True)
+    # The resized copies of the avatar and their sizes (read extensions/images.py), like the banners of the posts.
+    avatar_variants = models.JSONField(_("نسخه های آواتار"), default=dict, blank=True, editable=False)
     bio = models.TextField(_("بیوگرافی"), null=True, blank=True)
     is_author = models.BooleanField(_("وضعیت نویسندگی"), default=False, null=False, blank=False)
+    # The number of unread comments on the posts of this user, the badge of the admins portal. It is kept up to date by
+    # the signals and the bulk actions of the comments (blog/signals.py and CommentQuerySet in blog/managers.py), so
+    # the badge is read with the user itself, without counting the comments.
+    unread_comments_count = models.PositiveIntegerField(_("نظرات خوانده نشده"), default=0, editable=False)
 
     # You have already seen a lot about this type of method. For details, visit the models.py page in the blog
     # directory.
@@ -41,10 +50,16 @@ class CustomUser(AbstractUser):
         <span>
             <img src="{}" style="height: 50px; width: 50px; border-radius: 50%;">
         </span>
-        """.format(self.avatar.url))
+        """.format(get_variant_url(self.avatar, self.avatar_variants, 100)))
     get_avatar_thumbnail.short_description = _("آواتار")
 
     class Meta:
         # Persian format settings of this model
         verbose_name = _("کاربر")
         verbose_name_plural = _("کاربر ها")
+
+        indexes = [
+            # Logins with an email address compare UPPER(email) (email__iexact, read accounts/backends.py). Without an
+            # index on the same expression, every login reads the whole users table.
+            models.Index(Upper("email"), name="accounts_user_email_upper_idx"),
+        ]
@@ -1,3 +1,48 @@
 from django.test import TestCase
+from django.db import connection
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+
+from extensions.benchmarks import QueryCounter
+
+from .backends import EmailOrUsernameModelBackend
 
 # Create your tests here.
+
+
+class LoginLookupTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username="reader", email="Reader@Example.com",
+                                                        password="CORRECT PASSWORD")
+        # A username that looks like the email address of another user: the exact username wins.
+        cls.lookalike = get_user_model().objects.create_user(username="writer@example.com", email="writer@mail.com",
+                                                             password="OTHER PASSWORD")
+        get_user_model().objects.create_user(username="writer", email="WRITER@example.com", password="PASSWORD")
+
+    def setUp(self):
+        cache.clear()
+        self.backend = EmailOrUsernameModelBackend()
+
+    def test_username_or_email_in_any_case(self):
+        self.assertEqual(self.backend.get_login_user("reader"), self.user)
+        self.assertEqual(self.backend.get_login_user("reader@example.com"), self.user)
+        self.assertEqual(self.backend.get_login_user("READER@EXAMPLE.COM"), self.user)
+        self.assertEqual(self.backend.get_login_user("writer@example.com"), self.lookalike)
+        self.assertIsNone(self.backend.get_login_user("nobody@example.com"))
+
+    def test_login_is_one_query(self):
+        for login in ("reader", "Reader@example.com", "nobody"):
+            queries = QueryCounter()
+            with connection.execute_wrapper(queries):
+                self.backend.authenticate(None, username=login, password="CORRECT PASSWORD")
+            self.assertEqual(queries.count, 1, login)
+
+    def test_authenticate(self):
+        self.assertEqual(self.backend.authenticate(None, username="READER@example.com", password="CORRECT PASSWORD"),
+                         self.user)
+        self.assertIsNone(self.backend.authenticate(None, username="reader", password="WRONG"))
+        self.assertIsNone(self.backend.authenticate(None, username="nobody", password="CORRECT PASSWORD"))
+        self.user.is_active = False
+        self.user.save()
+        self.assertIsNone(self.backend.authenticate(None, username="reader", password="CORRECT PASSWORD"))
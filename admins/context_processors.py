@@ -0,0 +1,13 @@
+from django.utils.functional import SimpleLazyObject
+
+from extensions.utils import get_jalali_today
+
+# Create your custom context processors here.
+
+
+def today(request):
+    """
+    The Jalali date of today, shown at the top of every admins page. It is computed once per day (read
+    get_jalali_today in extensions/utils.py), and only when a template actually shows it.
+    """
+    return {"today": SimpleLazyObject(get_jalali_today)}
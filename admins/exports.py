@@ -0,0 +1,136 @@
+import csv
+import json
+
+from django.contrib.auth import get_user_model
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, Q
+
+from blog.models import Post, Comment
+
+# Create your data exports here.
+# They are shared by the export view of the admins (admins/views.py) and "manage.py export_data", so a file downloaded
+# from the portal and a file written by cron are the same.
+
+# The rows are read from a server-side cursor (QuerySet.iterator) CHUNK_SIZE rows at a time, so the memory of the
+# worker does not grow with the size of the table.
+CHUNK_SIZE = 2000
+
+FORMATS = ("csv", "jsonl")
+
+# Spreadsheet applications run a cell that starts with one of these characters as a formula ("CSV injection"): a
+# comment or a title like "=HYPERLINK(...)" would run on the computer of the admin who opens the file.
+FORMULA_CHARACTERS = ("=", "+", "-", "@", "\t", "\r")
+
+
+def get_posts():
+    # The columns of the import_posts command (author, category, tags), so an export can be imported again.
+    return Post.objects.order_by("id").values(
+        "id", "title", "slug", "description", "content", "pub_datetime", "read_time", "status", "active", "views",
+        "datetime_created", "datetime_modified",
+        author_username=F("author__username"),
+        category_title=F("category__title"),
+        tag_names=ArrayAgg("tags__name", filter=Q(tags__isnull=False), distinct=True, default=[]),
+    )
+
+
+def get_comments():
+    # The parent (the id of the answered comment, empty for a thread) keeps the threads in the file.
+    return Comment.objects.order_by("id").values(
+        "id", "parent_id", "title", "text", "active", "read", "datetime_created", "datetime_modified",
+        post_slug=F("post__slug"),
+        author_username=F("author__username"),
+    )
+
+
+def get_users():
+    # Never the password hashes.
+    return get_user_model().objects.order_by("id").values(
+        "id", "username", "email", "first_name", "last_name", "bio", "is_author", "is_staff", "is_superuser",
+        "is_active", "date_joined", "last_login",
+    )
+
+
+EXPORTS = {
+    "posts": get_posts,
+    "comments": get_comments,
+    "users": get_users,
+}
+
+# Some annotated columns have the names of the import_posts command in the files.
+COLUMN_NAMES = {"author_username": "author", "category_title": "category", "tag_names": "tags", "post_slug": "post",
+                "parent_id": "parent"}
+
+
+class _Echo:
+    """
+    A file-like object that returns what is written to it instead of keeping it, so csv.writer can format one row at a
+    time for a generator (the streaming CSV example of the Django documentation).
+    """
+
+    def write(self, value):
+        return value
+
+
+def _format_tags(names):
+    # The format of the tags fields of the forms (taggit): comma separated, quoted when the name has a comma.
+    return ", ".join('"{}"'.format(name) if "," in name else name for name in names)
+
+
+def escape_formula(value):
+    """
+    Makes a CSV cell that a spreadsheet would run as a formula plain text, with a leading apostrophe (which the
+    spreadsheet hides). The values that already start with apostrophes before such a character get one more, so
+    unescape_formula (used by import_posts) always gives back the exported value.
+    """
+    if isinstance(value, str) and value.lstrip("'").startswith(FORMULA_CHARACTERS):
+        return "'" + value
+    return value
+
+
+def unescape_formula(value):
+    if isinstance(value, str) and value.startswith("'") and value.lstrip("'").startswith(FORMULA_CHARACTERS):
+        return value[1:]
+    return value
+
+
+def _format_rows(rows, file_format):
+    if file_format == "csv":
+        writer = csv.writer(_Echo())
+        header = None
+        for row in rows:
+            if header is None:
+                header = list(row)
+                # The byte order mark tells spreadsheet applications that the (Persian) text is UTF-8.
+                yield "﻿" + writer.writerow([COLUMN_NAMES.get(column, column) for column in header])
+            yield writer.writerow([
+                escape_formula(_format_tags(row[column]) if column == "tag_names" else row[column])
+                for column in header
+            ])
+    else:
+        for row in rows:
+            yield json.dumps({COLUMN_NAMES.get(column, column): value for column, value in row.items()},
+                             cls=DjangoJSONEncoder, ensure_ascii=False) + "\n"
+
+
+def iter_export(name, file_format):
+    """
+    Yields the export (a table of EXPORTS) as CSV or JSONL text, one row at a time.
+    """
+    return _format_rows(EXPORTS[name]().iterator(chunk_size=CHUNK_SIZE), file_format)
+
+
+def write_export(name, file_format, output):
+    """
+    Writes the export to a text file and returns the number of rows written (the CSV header is not a row).
+    """
+    count = 0
+
+    def counted(rows):
+        nonlocal count
+        for count, row in enumerate(rows, start=1):
+            yield row
+
+    for text in _format_rows(counted(EXPORTS[name]().iterator(chunk_size=CHUNK_SIZE)), file_format):
+        output.write(text)
+    return count
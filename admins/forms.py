@@ -1,7 +1,13 @@
 from django import forms
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
 
 from django.contrib.auth import get_user_model
 
+from taggit.forms import TagField
+
+from blog.models import Post, Category, Comment
+
 # Create your custom forms here.
 
 
@@ -17,3 +23,91 @@ class UserForm(forms.ModelForm):
             "email",
             "bio",
         )
+
+
+class PostBulkActionForm(forms.Form):
+    """
+    The bulk actions of the admins post list: one action on all the selected posts, in one transaction and with a
+    handful of bulk queries (read the bulk methods of PostQuerySet in blog/managers.py), instead of one get() and one
+    save() per post. Authors can only select their own posts, superusers any post.
+    """
+
+    ACTION_CHOICES = (
+        ("publish", _("انتشار")),
+        ("unpublish", _("پیش نویس")),
+        ("deactivate", _("غیر فعال سازی")),
+        ("delete", _("حذف")),
+        ("move_to_category", _("تغییر دسته بندی")),
+        ("add_tags", _("افزودن تگ")),
+        ("remove_tags", _("حذف تگ")),
+    )
+
+    action = forms.ChoiceField(label=_("عملگر"), choices=ACTION_CHOICES)
+    posts = forms.ModelMultipleChoiceField(label=_("پست ها"), queryset=Post.objects.none())
+    category = forms.ModelChoiceField(label=_("دسته بندی"), queryset=Category.objects.all(), required=False)
+    tags = TagField(label=_("تگ ها"), required=False)
+
+    def __init__(self, *args, user, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Only the ids are loaded to validate the selection.
+        posts = Post.objects.only("id")
+        if not user.is_superuser:
+            posts = posts.filter(author=user)
+        self.fields["posts"].queryset = posts
+
+    def clean(self):
+        cleaned_data = super().clean()
+        action = cleaned_data.get("action")
+        if action == "move_to_category" and not cleaned_data.get("category"):
+            self.add_error("category", _("دسته بندی جدید را انتخاب کنید."))
+        if action in ("add_tags", "remove_tags") and not cleaned_data.get("tags"):
+            self.add_error("tags", _("حداقل یک تگ وارد کنید."))
+        return cleaned_data
+
+    def save(self):
+        """
+        Runs the action and returns the number of posts it was applied to.
+        """
+        action = self.cleaned_data["action"]
+        posts = Post.objects.filter(pk__in=[post.pk for post in self.cleaned_data["posts"]])
+        with transaction.atomic():
+            if action == "delete":
+                # Not delete(): it sends the signals of every post and comment (read PostQuerySet.bulk_delete).
+                return posts.bulk_delete()
+            elif action == "move_to_category":
+                return len(posts.move_to_category(self.cleaned_data["category"]))
+            elif action in ("add_tags", "remove_tags"):
+                return len(getattr(posts, action)(self.cleaned_data["tags"]))
+            return len(getattr(posts, action)())
+
+
+class CommentBulkActionForm(forms.Form):
+    """
+    The bulk actions of the moderation queue: approve, reject or mark as read all the selected comments, in one
+    transaction and with a few bulk queries (read the bulk methods of CommentQuerySet in blog/managers.py). Authors can
+    only select the comments of their own posts, superusers any comment.
+    """
+
+    ACTION_CHOICES = (
+        ("approve", _("تایید")),
+        ("reject", _("رد")),
+        ("mark_read", _("خوانده شده")),
+    )
+
+    action = forms.ChoiceField(label=_("عملگر"), choices=ACTION_CHOICES)
+    comments = forms.ModelMultipleChoiceField(label=_("نظرات"), queryset=Comment.objects.none())
+
+    def __init__(self, *args, user, **kwargs):
+        super().__init__(*args, **kwargs)
+        comments = Comment.objects.only("id")
+        if not user.is_superuser:
+            comments = comments.filter(post__author=user)
+        self.fields["comments"].queryset = comments
+
+    def save(self):
+        """
+        Runs the action and returns the number of comments it was applied to.
+        """
+        comments = Comment.objects.filter(pk__in=[comment.pk for comment in self.cleaned_data["comments"]])
+        with transaction.atomic():
+            return len(getattr(comments, self.cleaned_data["action"])())
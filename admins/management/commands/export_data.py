@@ -0,0 +1,34 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from admins.exports import EXPORTS, FORMATS, write_export
+
+
+class Command(BaseCommand):
+    """
+    Writes a whole table (posts, comments or users) as CSV or JSONL, the same file as the export links of the admins
+    portal (read admins/exports.py). The rows are read from a server-side cursor and written as they come, so the
+    memory does not grow with the size of the table. An export of the posts can be imported again with
+    "manage.py import_posts".
+
+    Usage: python manage.py export_data posts [--format csv] [--output posts.csv]
+    """
+
+    help = "Streams the posts, comments or users to a CSV or JSONL file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("name", choices=sorted(EXPORTS))
+        parser.add_argument("--format", choices=FORMATS, default="jsonl")
+        parser.add_argument("--output", help="The file to write, by default the standard output.")
+
+    def handle(self, *args, **options):
+        output = open(options["output"], "w", encoding="utf-8", newline="") if options["output"] else sys.stdout
+        try:
+            rows = write_export(options["name"], options["format"], output)
+        finally:
+            if output is not sys.stdout:
+                output.close()
+        if options["output"]:
+            self.stdout.write(self.style.SUCCESS("Exported {} {} to {}.".format(rows, options["name"],
+                                                                               options["output"])))
@@ -1,3 +1,300 @@
+import csv
+import datetime
+import io
+import json
+import os
+import tempfile
+
 from django.test import TestCase
+from django.db import connection
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+
+from extensions.benchmarks import QueryCounter
+from blog.models import Post, Category, Comment, RelatedPost, SiteStatistic
 
 # Create your tests here.
+
+
+class PostBulkActionTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create(username="author", is_author=True)
+        cls.other = get_user_model().objects.create(username="other", is_author=True)
+        cls.category = Category.objects.create(title="BULK", slug="bulk", designer=cls.user)
+        cls.new_category = Category.objects.create(title="BULK NEW", slug="bulk-new", designer=cls.user)
+        cls.posts = [cls.create_post(number, cls.user) for number in range(20)]
+        cls.other_post = cls.create_post(20, cls.other)
+
+    @classmethod
+    def create_post(cls, number, author):
+        post = Post.objects.create(
+            title="BULK POST {}".format(number),
+            content="BULK",
+            description="BULK {}".format(number),
+            slug="bulk-post-{}".format(number),
+            pub_datetime=timezone.now() - datetime.timedelta(days=1),
+            status="0",
+            category=cls.category,
+            author=author,
+        )
+        post.tags.add("bulk")
+        return post
+
+    def bulk_action(self, action, posts, **data):
+        self.client.force_login(self.user)
+        return self.client.post(reverse("admins:post_bulk_action"), dict(
+            action=action, posts=[post.pk for post in posts], next=reverse("admins:post_list"), **data))
+
+    def test_publish_and_deactivate_in_a_few_queries(self):
+        queries = QueryCounter()
+        with connection.execute_wrapper(queries):
+            response = self.bulk_action("publish", self.posts)
+        # Mostly the similar posts lists.
+        self.assertLess(queries.count, 200)
+        self.assertRedirects(response, reverse("admins:post_list"), fetch_redirect_response=False)
+        self.assertEqual(Post.actives.filter(author=self.user).count(), 20)
+        self.assertEqual(SiteStatistic.objects.get_values()["public_posts"], 20)
+        self.assertEqual(RelatedPost.objects.filter(post=self.posts[0]).count(), RelatedPost.objects.RELATED_POSTS_SIZE)
+
+        self.bulk_action("deactivate", self.posts[:5])
+        self.assertEqual(Post.actives.filter(author=self.user).count(), 15)
+        self.assertEqual(SiteStatistic.objects.get_values(), SiteStatistic.objects.get_exact_counts())
+        self.assertFalse(RelatedPost.objects.filter(related__in=self.posts[:5]).exists())
+
+    def test_category_and_tags(self):
+        self.bulk_action("move_to_category", self.posts[:3], category=self.new_category.pk)
+        self.assertEqual(Post.objects.filter(category=self.new_category).count(), 3)
+
+        self.bulk_action("add_tags", self.posts[:3], tags="first, second")
+        self.bulk_action("add_tags", self.posts[:4], tags="first")
+        self.assertEqual(Post.objects.filter(tags__name="first").count(), 4)
+        self.assertEqual(Post.objects.filter(tags__name="second").count(), 3)
+        self.bulk_action("remove_tags", self.posts, tags="bulk, second")
+        self.assertEqual(sorted(self.posts[0].tags.names()), ["first"])
+
+    def test_delete_and_permissions(self):
+        # Authors cannot touch the posts of others: the whole action is rejected.
+        self.bulk_action("delete", self.posts[:2] + [self.other_post])
+        self.assertEqual(Post.objects.count(), 21)
+
+        self.bulk_action("delete", self.posts[:2])
+        self.assertEqual(Post.objects.count(), 19)
+        self.assertEqual(SiteStatistic.objects.get_values(), SiteStatistic.objects.get_exact_counts())
+        # A category is required for moving.
+        self.bulk_action("move_to_category", self.posts[2:4])
+        self.assertEqual(Post.objects.filter(category=self.category).count(), 19)
+
+    def test_delete_in_a_constant_number_of_queries(self):
+        reader = get_user_model().objects.create(username="reader")
+
+        def delete_with_comments(posts, comments_per_post):
+            for post in posts:
+                for number in range(comments_per_post):
+                    comment = Comment.objects.create(post=post, author=reader, text="COMMENT {}".format(number),
+                                                     active=not number % 2)
+                    Comment.objects.create(parent=comment, author=reader, text="REPLY")
+            queries = QueryCounter()
+            with connection.execute_wrapper(queries):
+                self.bulk_action("delete", posts)
+            return queries.count
+
+        self.client.force_login(self.user)
+        # The same queries, whatever the number of posts and comments (the posts are drafts: no lists to rebuild).
+        self.assertEqual(delete_with_comments(self.posts[:2], 1), delete_with_comments(self.posts[2:6], 10))
+        self.assertEqual(Post.objects.count(), 15)
+        self.assertFalse(Comment.objects.exists())
+        self.assertEqual(SiteStatistic.objects.get_values(), SiteStatistic.objects.get_exact_counts())
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.unread_comments_count, 0)
+
+
+class ExportTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = get_user_model().objects.create(username="exporter", email="exporter@example.com",
+                                                    password="SECRET HASH", is_superuser=True, is_staff=True)
+        cls.author = get_user_model().objects.create(username="export-author", is_author=True)
+        cls.category = Category.objects.create(title="EXPORTED", slug="exported", designer=cls.author)
+        cls.posts = []
+        for number in range(3):
+            post = Post.objects.create(
+                title="پست {}".format(number),
+                content="<p>EXPORTED, \"quoted\"\nnew line</p>",
+                description="EXPORTED {}".format(number),
+                slug="exported-post-{}".format(number),
+                pub_datetime=timezone.now() - datetime.timedelta(days=1),
+                status="1",
+                category=cls.category,
+                author=cls.author,
+            )
+            post.tags.add("exported", "tag {}".format(number))
+            cls.posts.append(post)
+        Comment.objects.create(post=cls.posts[0], author=cls.admin, text="EXPORTED COMMENT")
+
+    def download(self, name, file_format):
+        response = self.client.get(reverse("admins:export", args=[name, file_format]))
+        self.assertTrue(response.streaming)
+        return response, b"".join(response.streaming_content).decode("utf-8")
+
+    def test_only_superusers_can_export(self):
+        self.client.force_login(self.author)
+        response = self.client.get(reverse("admins:export", args=["users", "csv"]))
+        self.assertEqual(response.status_code, 403)
+        self.client.force_login(self.admin)
+        response = self.client.get(reverse("admins:export", args=["passwords", "csv"]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_jsonl_export(self):
+        self.client.force_login(self.admin)
+        response, content = self.download("posts", "jsonl")
+        self.assertIn('filename="posts-', response["Content-Disposition"])
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual([row["slug"] for row in rows], ["exported-post-0", "exported-post-1", "exported-post-2"])
+        self.assertEqual(rows[0]["title"], "پست 0")
+        self.assertEqual((rows[0]["author"], rows[0]["category"]), ("export-author", "EXPORTED"))
+        self.assertEqual(sorted(rows[0]["tags"]), ["exported", "tag 0"])
+
+        _, content = self.download("users", "jsonl")
+        self.assertNotIn("SECRET HASH", content)
+        self.assertNotIn("password", json.loads(content.splitlines()[0]))
+
+        _, content = self.download("comments", "jsonl")
+        comment = json.loads(content)
+        self.assertEqual((comment["post"], comment["author"], comment["text"]),
+                         ("exported-post-0", "exporter", "EXPORTED COMMENT"))
+
+    def test_csv_export_can_be_imported_again(self):
+        self.client.force_login(self.admin)
+        _, content = self.download("posts", "csv")
+        self.assertTrue(content.startswith("﻿id,"))
+
+        # The same file from the command, imported into an empty blog.
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "posts.csv")
+        output = io.StringIO()
+        call_command("export_data", "posts", "--format", "csv", "--output", path, stdout=output)
+        self.assertIn("Exported 3 posts", output.getvalue())
+        Post.objects.all().delete()
+
+        call_command("import_posts", path, stdout=io.StringIO(), stderr=io.StringIO())
+        post = Post.objects.get(slug="exported-post-1")
+        self.assertEqual(post.title, "پست 1")
+        self.assertEqual(post.content, "<p>EXPORTED, \"quoted\"\nnew line</p>")
+        self.assertEqual(sorted(post.tags.names()), ["exported", "tag 1"])
+        self.assertTrue(post.is_public)
+
+    def test_csv_export_escapes_formulas(self):
+        Post.objects.filter(pk=self.posts[1].pk).update(title="=HYPERLINK(\"http://example.com\")")
+        Post.objects.filter(pk=self.posts[2].pk).update(title="'-1")
+        self.posts[0].tags.add("@everyone")
+        self.client.force_login(self.admin)
+        _, content = self.download("posts", "csv")
+        rows = list(csv.DictReader(io.StringIO(content.lstrip("﻿"))))
+        self.assertEqual([row["title"] for row in rows], ["پست 0", "'=HYPERLINK(\"http://example.com\")", "''-1"])
+        self.assertEqual(rows[0]["tags"], "'@everyone, exported, tag 0")
+
+        # import_posts reads the original values back.
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "posts.csv")
+        call_command("export_data", "posts", "--format", "csv", "--output", path, stdout=io.StringIO())
+        Post.objects.all().delete()
+        call_command("import_posts", path, stdout=io.StringIO(), stderr=io.StringIO())
+        self.assertEqual(Post.objects.get(slug="exported-post-1").title, "=HYPERLINK(\"http://example.com\")")
+        self.assertEqual(Post.objects.get(slug="exported-post-2").title, "'-1")
+
+    def test_comments_export_has_the_parent(self):
+        reply = Comment.objects.create(post=self.posts[0], author=self.admin, text="EXPORTED REPLY",
+                                       parent=Comment.objects.get(text="EXPORTED COMMENT"))
+        self.client.force_login(self.admin)
+        _, content = self.download("comments", "jsonl")
+        parents = {row["id"]: row["parent"] for row in map(json.loads, content.splitlines())}
+        self.assertEqual(parents, {reply.parent_id: None, reply.id: reply.parent_id})
+
+    def test_command_counts_the_rows(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        for file_format in ("csv", "jsonl"):
+            output = io.StringIO()
+            call_command("export_data", "comments", "--format", file_format, "--output",
+                         os.path.join(directory.name, "comments." + file_format), stdout=output)
+            self.assertIn("Exported 1 comments", output.getvalue())
+
+
+class CommentModerationTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = get_user_model().objects.create(username="moderator", is_author=True)
+        cls.other = get_user_model().objects.create(username="other-moderator", is_author=True)
+        cls.reader = get_user_model().objects.create(username="commenter")
+        category = Category.objects.create(title="MODERATION", slug="moderation", designer=cls.author)
+        cls.post, cls.other_post = [Post.objects.create(
+            title="MODERATED {}".format(number),
+            content="MODERATED",
+            description="MODERATED {}".format(number),
+            slug="moderated-{}".format(number),
+            pub_datetime=timezone.now() - datetime.timedelta(days=1),
+            status="1",
+            category=category,
+            author=author,
+        ) for number, author in enumerate((cls.author, cls.other))]
+        cls.comments = [Comment.objects.create(post=cls.post, author=cls.reader, text="COMMENT {}".format(number))
+                        for number in range(30)]
+        Comment.objects.create(post=cls.other_post, author=cls.reader, text="OTHER COMMENT")
+
+    def assertCounters(self, unread, approved):
+        self.post.refresh_from_db()
+        self.author.refresh_from_db()
+        self.assertEqual((self.post.unread_comments_count, self.post.comments_count), (unread, approved))
+        self.assertEqual(self.author.unread_comments_count, unread)
+        self.assertEqual(SiteStatistic.objects.get_values(), SiteStatistic.objects.get_exact_counts())
+
+    def test_counters_follow_single_changes(self):
+        self.assertCounters(30, 0)
+        comment = self.comments[0]
+        comment.read = True
+        comment.save()
+        self.assertCounters(29, 0)
+        self.comments[1].delete()
+        self.assertCounters(28, 0)
+
+    def test_queue_is_keyset_paginated_and_limited_to_own_posts(self):
+        self.client.force_login(self.author)
+        response = self.client.get(reverse("admins:comment_list"))
+        self.assertEqual(len(response.context["comments"]), 25)
+        self.assertNotContains(response, "OTHER COMMENT")
+        response = self.client.get(reverse("admins:comment_list"), {"after": response.context["page_obj"].next_cursor})
+        self.assertEqual(len(response.context["comments"]), 5)
+        self.assertFalse(response.context["page_obj"].has_next())
+
+    def test_bulk_actions_keep_the_counters(self):
+        self.client.force_login(self.author)
+        url = reverse("admins:comment_bulk_action")
+        queries = QueryCounter()
+        with connection.execute_wrapper(queries):
+            self.client.post(url, {"action": "approve", "comments": [comment.pk for comment in self.comments[:10]]})
+        self.assertLess(queries.count, 15)
+        self.assertCounters(20, 10)
+
+        self.client.post(url, {"action": "reject", "comments": [comment.pk for comment in self.comments[5:15]]})
+        self.assertCounters(15, 5)
+        self.client.post(url, {"action": "mark_read", "comments": [comment.pk for comment in self.comments[15:20]]})
+        self.assertCounters(10, 5)
+
+        response = self.client.get(reverse("admins:comment_list", args=["pending"]))
+        self.assertEqual(len(response.context["comments"]), 10)
+
+        # The comments of the posts of other authors cannot be selected.
+        other_comment = Comment.objects.get(text="OTHER COMMENT")
+        self.client.post(url, {"action": "approve", "comments": [other_comment.pk]})
+        other_comment.refresh_from_db()
+        self.assertFalse(other_comment.active)
+
+    def test_portal_badge(self):
+        self.client.force_login(self.author)
+        response = self.client.get(reverse("admins:admins"))
+        self.assertEqual(response.context["unread_comments"], 30)
@@ -12,15 +12,20 @@ urlpatterns = [
     path("", views.admin_portal_view, name="admins"),
     path("profile/", views.admin_profile_view, name="profile"),
     path("terms/", views.admin_terms_view, name="terms"),
+    path("export/<str:name>/<str:file_format>/", views.export_view, name="export"),
 
     path("blog/post/list/", views.post_list_view_lazy, name="post_list_lazy"),
     path("blog/post/list/page/", views.post_list_view, name="post_list"),
     path("blog/post/search/list/", views.searched_post_list_view, name="post_search"),
+    path("blog/post/bulk/", views.post_bulk_action_view, name="post_bulk_action"),
     path("blog/post/list/author/<str:author_username>/", views.post_list_view, name="post_list"),
     path("blog/post/detail/<int:pk>/", views.post_detail_view, name="post_detail"),
     path("blog/post/create/", views.post_create_view, name="post_create"),
     path("blog/post/update/<int:pk>/", views.post_update_view, name="post_update"),
     path("blog/post/delete/<int:pk>/", views.post_delete_view, name="post_delete"),
+    path("blog/comment/list/", views.comment_list_view, name="comment_list"),
+    path("blog/comment/list/<str:queue>/", views.comment_list_view, name="comment_list"),
+    path("blog/comment/bulk/", views.comment_bulk_action_view, name="comment_bulk_action"),
     path("blog/category/list/", views.category_list_view_lazy, name="category_list_lazy"),
     path("blog/category/list/page/", views.category_list_view, name="category_list"),
     path("blog/category/list/author/<str:category_designer_username>/", views.category_list_view, name="category_list"),
@@ -18,27 +18,51 @@ and JavaScript, because not all pieces of code are made with the Django framewor
 """
 
 
+import datetime
+
+from django.conf import settings
 from django.shortcuts import render, redirect
+from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponseForbidden, HttpResponseRedirect, HttpResponseNotFound
+from django.http import HttpResponseRedirect, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.http import url_has_allowed_host_and_scheme
+from django.views.decorators.http import require_POST
 from django.core.exceptions import ObjectDoesNotExist
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.contrib.auth import get_user_model
 from django.utils import timezone
+from django.db.models import F
 
-from django.contrib.postgres.search import SearchVector, SearchQuery, SearchRank
+from django.contrib.postgres.search import SearchQuery, SearchRank
 
-from .forms import UserForm
+from .forms import UserForm, PostBulkActionForm, CommentBulkActionForm
+from .exports import EXPORTS, FORMATS, iter_export
 
-from blog.models import Post, Category, Comment
+from blog.models import Post, Category, Comment, PostDailyViews, SiteStatistic
 from blog.forms import PostForm, CategoryForm, MiniPostCreateForm, PostSearchForm
 from accounts.models import CustomUser
-from extensions.utils import get_jalali_today
+from extensions.paginators import KeysetPaginator
 
 # Create your views here.
 
-global today
-today = get_jalali_today()
+# The Jalali date of today ("today") is not passed by the views; it is added to the context of every template by the
+# admins.context_processors.today context processor.
+
+# The number of days in the views charts (the admin portal and the post details).
+VIEWS_CHART_DAYS = 30
+# The comments per page of the moderation queue.
+COMMENTS_PER_PAGE = 25
+
+
+def get_views_chart(post=None):
+    """
+    The daily views (and, for one post, the distinct visitors) of the last VIEWS_CHART_DAYS days, read from the
+    rolled up PostDailyViews rows (read the rollup_post_views command), never from the raw views.
+    """
+    last_day = timezone.localdate()
+    first_day = last_day - datetime.timedelta(days=VIEWS_CHART_DAYS - 1)
+    return PostDailyViews.objects.get_series(first_day, last_day, post=post)
 
 
 @login_required()
@@ -58,15 +82,21 @@ def admin_portal_view(request):
         # Here we check whether the user has the is_author status turned on or not. Of course, if the user has the
         # status of is_staff turned on, we can accept to enter the management, we will have this part in all View
         # functions, so remember it.
-        return HttpResponseForbidden(render(request, "admins/errors/403.html"))
-
-    # Here it is also known what queries have been made (variable names can have direct references to the function of
-    # the variable.)
-    total_posts = Post.objects.count()
-    total_actives_posts = Post.actives.count()
-    total_comments = Comment.objects.count()
-    total_users = get_user_model().objects.count()
-    recent_posts = Post.objects.filter(author=request.user).order_by("-datetime_created")[:10]
+        return render(request, "admins/errors/403.html", status=403)
+
+    # The totals are not counted here (COUNT(*) reads the whole table): they are read from the maintained counters of
+    # the SiteStatistic model in one query. With SITE_STATISTICS_APPROXIMATE, the totals of the biggest tables are the
+    # estimates of the PostgreSQL planner instead (read SiteStatisticManager.get_values in blog/managers.py).
+    statistics = SiteStatistic.objects.get_values(approximate=settings.SITE_STATISTICS_APPROXIMATE)
+    total_posts = statistics["posts"]
+    total_actives_posts = statistics["public_posts"]
+    total_comments = statistics["comments"]
+    # The badge of the superusers counts the whole site; authors only see the comments of their own posts, whose
+    # counter comes with the logged in user itself (CustomUser.unread_comments_count).
+    unread_comments = statistics["unread_comments"] if request.user.is_superuser else \
+        request.user.unread_comments_count
+    total_users = statistics["users"]
+    recent_posts = Post.objects.summaries().filter(author=request.user).order_by("-datetime_created")[:10]
 
     # This is also a simple pagination system, and no additional explanation is needed, this pagination is already built
     # and explained in the Django documentation.
@@ -117,10 +147,12 @@ def admin_portal_view(request):
         "total_posts": total_posts,
         "total_actives_posts": total_actives_posts,
         "total_comments": total_comments,
+        "unread_comments": unread_comments,
         "total_users": total_users,
         "recent_posts": recent_posts,
         "post_create_form": post_create_form,
-        "today": today,
+        # The views of the whole blog, per day.
+        "views_series": get_views_chart()[0],
     }
     return render(request, "admins/portals/admin_portal.html", context)
 
@@ -132,7 +164,7 @@ def admin_profile_view(request):
     the intended user. The user can edit or manipulate his personal information on the site :)
     """
     if not request.user.is_author and not request.user.is_staff and not request.user.is_superuser:
-        return HttpResponseForbidden(render(request, "admins/errors/403.html"))
+        return render(request, "admins/errors/403.html", status=403)
 
     # First, we need to have access to the intended user. The best solution for this idea is to obtain user information
     # through the "request" variable.
@@ -152,7 +184,7 @@ def admin_profile_view(request):
     else:
         form = UserForm()
 
-    return render(request, "admins/portals/admin_profile.html", {"form": form, "user": user, "today": today})
+    return render(request, "admins/portals/admin_profile.html", {"form": form, "user": user})
 
 
 @login_required()
@@ -161,15 +193,15 @@ def admin_terms_view(request):
     This view is only for displaying a template in which the rules of the website are displayed.
     """
     if not request.user.is_author and not request.user.is_staff and not request.user.is_superuser:
-        return HttpResponseForbidden(render(request, "admins/errors/403.html"))
+        return render(request, "admins/errors/403.html", status=403)
 
-    return render(request, "admins/portals/admin_terms.html", {"today": today})
+    return render(request, "admins/portals/admin_terms.html")
 
 
 @login_required()
 def post_list_view_lazy(request):
     if not request.user.is_author and not request.user.is_staff and not request.user.is_superuser:
-            return HttpResponseForbidden(render(request, "admins/errors/403.html"))
+            return render(request, "admins/errors/403.html", status=403)
 
     return HttpResponseRedirect("/admins/blog/post/list/page/")
 
@@ -177,7 +209,7 @@ def post_list_view_lazy(request):
 @login_required()
 def post_list_view(request, author_username=None):
     if not request.user.is_author and not request.user.is_staff and not request.user.is_superuser:
-            return HttpResponseForbidden(render(request, "admins/errors/403.html"))
+            return render(request, "admins/errors/403.html", status=403)
 
     # Here we also check that if the user entered the author_username value through the URLs, it will return the posts
     # related to that user.
@@ -185,9 +217,9 @@ def post_list_view(request, author_username=None):
         try:
             author = get_user_model().objects.get(username=author_username)
         except ObjectDoesNotExist:
-            return HttpResponseNotFound(request, "admins/errors/404.html")
+            return render(request, "admins/errors/404.html", status=404)
 
-        posts = Post.objects.all().filter(author=author)
+        posts = Post.objects.summaries().filter(author=author)
         paginator = Paginator(posts, 25)
         page_number = request.GET.get("page")
         page_obj = paginator.get_page(page_number)
@@ -195,7 +227,7 @@ def post_list_view(request, author_username=None):
     else:
         author = None
 
-        posts = Post.objects.all()
+        posts = Post.objects.summaries()
         paginator = Paginator(posts, 25)
         page_number = request.GET.get("page")
         page_obj = paginator.get_page(page_number)
@@ -207,11 +239,42 @@ def post_list_view(request, author_username=None):
         "page_number": page_number,
         "author_username": author_username,
         "author": author,
-        "today": today
+        # The choices of the bulk actions form.
+        "bulk_actions": PostBulkActionForm.ACTION_CHOICES,
+        "categories": Category.objects.only("id", "title"),
     }
     return render(request, "admins/blog/post_list.html", context)
 
 
+@login_required()
+@require_POST
+def post_bulk_action_view(request):
+    """
+    The bulk actions of the post list (publish, unpublish, deactivate, delete, change the category, add or remove
+    tags) on all the selected posts at once. The whole action runs in one transaction with bulk queries (read
+    PostBulkActionForm in admins/forms.py), so hundreds of posts cost about as much as one. Then we go back to the
+    list the posts were selected from.
+    """
+    if not request.user.is_author and not request.user.is_staff and not request.user.is_superuser:
+        return render(request, "admins/errors/403.html", status=403)
+
+    next_url = request.POST.get("next")
+    if not url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()},
+                                           require_https=request.is_secure()):
+        next_url = reverse("admins:post_list")
+
+    form = PostBulkActionForm(request.POST, user=request.user)
+    if form.is_valid():
+        count = form.save()
+        messages.success(request, "عملگر «{}» روی {} پست اجرا شد.".format(
+            dict(form.fields["action"].choices)[form.cleaned_data["action"]], count))
+    else:
+        for errors in form.errors.values():
+            for error in errors:
+                messages.error(request, error)
+    return HttpResponseRedirect(next_url)
+
+
 @login_required()
 def searched_post_list_view(request):
     """
@@ -223,7 +286,7 @@ def searched_post_list_view(request):
     obtain in your Django documentation.
     """
     if not request.user.is_author and not request.user.is_staff and not request.user.is_superuser:
-        return HttpResponseForbidden(render(request, "admins/errors/403.html"))
+        return render(request, "admins/errors/403.html", status=403)
     
     form = PostSearchForm()
     query = None
@@ -234,13 +297,19 @@ def searched_post_list_view(request):
         if form.is_valid():
             query = form.cleaned_data["query"]
             
-            search_vector = SearchVector("title")
+            # The stored and indexed search_vector field of the posts (read blog/models.py) is searched here.
             search_query = SearchQuery(query)
-            result = Post.objects.annotate(search=search_vector, rank=SearchRank(search_vector, search_query))\
-                .filter(search=query).order_by("-rank")
+            result = Post.objects.summaries().filter(search_vector=search_query)\
+                .annotate(rank=SearchRank(F("search_vector"), search_query)).order_by("-rank")
                 
-    return render(request, "admins/blog/post_list.html", {"form": form, "query": query, "posts": result,
-                                                          "today": today})
+    context = {
+        "form": form,
+        "query": query,
+        "posts": result,
+        "bulk_actions": PostBulkActionForm.ACTION_CHOICES,
+        "categories": Category.objects.only("id", "title"),
+    }
+    return render(request, "admins/blog/post_list.html", context)
 
 
 @login_required()
@@ -250,14 +319,22 @@ def post_detail_view(request, pk):
     question.
     """
     if not request.user.is_author and not request.user.is_staff and not request.user.is_superuser:
-            return HttpResponseForbidden(render(request, "admins/errors/403.html"))
+            return render(request, "admins/errors/403.html", status=403)
 
     try:
         post = Post.objects.get(id=pk)
     except ObjectDoesNotExist:
-        return HttpResponseNotFound(render(request, "admins/errors/404.html"))
+        return render(request, "admins/errors/404.html", status=404)
 
-    return render(request, "admins/blog/post_detail.html", {"post": post})
+    views_series, visitors = get_views_chart(post)
+    context = {
+        "post": post,
+        "views_series": views_series,
+        "views_total": sum(day["views"] for day in views_series),
+        # Distinct over the whole chart (merged visitor sketches), not the sum of the days.
+        "visitors_total": visitors,
+    }
+    return render(request, "admins/blog/post_detail.html", context)
 
 
 @login_required()
@@ -273,7 +350,7 @@ def post_create_view(request):
     copy of the same database objects, except that it is empty and (ready to) be filled.
     """
     if not request.user.is_author and not request.user.is_staff and not request.user.is_superuser:
-            return HttpResponseForbidden(render(request, "admins/errors/403.html"))
+            return render(request, "admins/errors/403.html", status=403)
 
     form = None
 
@@ -315,7 +392,6 @@ def post_create_view(request):
 
     context = {
         "form": form,
-        "today": today,
     }
     return render(request, "admins/blog/post_create.html", context)
 
@@ -332,7 +408,7 @@ def post_update_view(request, pk):
     previous information.
     """
     if not request.user.is_author and not request.user.is_staff and not request.user.is_superuser:
-            return HttpResponseForbidden(render(request, "admins/errors/403.html"))
+            return render(request, "admins/errors/403.html", status=403)
 
     post = None
     form = None
@@ -341,9 +417,9 @@ def post_update_view(request, pk):
         post = Post.objects.get(id=pk)
 
         if request.user != post.author and not request.user.is_superuser:
-            return HttpResponseForbidden(render(request, "admins/errors/403.html"))
+            return render(request, "admins/errors/403.html", status=403)
     except ObjectDoesNotExist:
-        return HttpResponseNotFound(render(request, "admins/errors/404.html"))
+        return render(request, "admins/errors/404.html", status=404)
 
     form = PostForm(request.POST or None, request.FILES or None, instance=post)
     if form.is_valid():
@@ -353,7 +429,7 @@ def post_update_view(request, pk):
         form.save_m2m()
         return redirect("admins:post_detail", Post.objects.first().id)
 
-    return render(request, "admins/blog/post_update.html", {"form": form, "post": post, "today": today})
+    return render(request, "admins/blog/post_update.html", {"form": form, "post": post})
 
 
 @login_required()
@@ -365,7 +441,7 @@ def post_delete_view(request, pk):
     of posts.
     """
     if not request.user.is_author and not request.user.is_staff and not request.user.is_superuser:
-            return HttpResponseForbidden(render(request, "admins/errors/403.html"))
+            return render(request, "admins/errors/403.html", status=403)
 
     post = None
     form = None
@@ -374,21 +450,21 @@ def post_delete_view(request, pk):
         post = Post.objects.get(id=pk)
 
         if request.user != post.author and not request.user.is_superuser:
-            return HttpResponseForbidden(render(request, "admins/errors/403.html"))
+            return render(request, "admins/errors/403.html", status=403)
     except ObjectDoesNotExist:
-        return HttpResponseNotFound(render(request, "admins/errors/404.html"))
+        return render(request, "admins/errors/404.html", status=404)
 
     if request.method == "POST":
         post.delete()
         return redirect("admins:post_list")
 
-    return render(request, "admins/blog/post_delete.html", {"form": form, "post": post, "today": today})
+    return render(request, "admins/blog/post_delete.html", {"form": form, "post": post})
 
 
 @login_required()
 def category_list_view_lazy(request):
     if not request.user.is_author and not request.user.is_staff and not request.user.is_superuser:
-            return HttpResponseForbidden(render(request, "admins/errors/403.html"))
+            return render(request, "admins/errors/403.html", status=403)
 
     return HttpResponseRedirect("/admins/post/category/page/")
 
@@ -396,14 +472,14 @@ def category_list_view_lazy(request):
 @login_required()
 def category_list_view(request, category_designer_username=None):
     if not request.user.is_author and not request.user.is_staff and not request.user.is_superuser:
-            return HttpResponseForbidden(render(request, "admins/errors/403.html"))
+            return render(request, "admins/errors/403.html", status=403)
 
     category_designer = None
     if category_designer_username:
         try:
             category_designer = CustomUser.objects.get(username=category_designer_username)
         except ObjectDoesNotExist:
-            return HttpResponseNotFound(render(request, "admins/errors/404.html"))
+            return render(request, "admins/errors/404.html", status=404)
 
         categories = Category.objects.filter(designer=category_designer)
     else:
@@ -415,30 +491,30 @@ def category_list_view(request, category_designer_username=None):
     page_obj.adjusted_elided_pages = paginator.get_elided_page_range(page_number or 1, on_each_side=1, on_ends=2)
 
     return render(request, "admins/blog/category_list.html", {"categories": page_obj, "page_obj": page_obj,
-                                                              "category_designer": category_designer, "today": today})
+                                                              "category_designer": category_designer})
 
 
 @login_required()
 def category_detail_view(request, pk):
     if not request.user.is_author and not request.user.is_staff and not request.user.is_superuser:
-            return HttpResponseForbidden(render(request, "admins/errors/403.html"))
+            return render(request, "admins/errors/403.html", status=403)
 
     try:
         category = Category.objects.get(id=pk)
     except ObjectDoesNotExist:
-        return HttpResponseNotFound(render(request, "admins/errors/404.html"))
+        return render(request, "admins/errors/404.html", status=404)
 
-    category_posts = category.category_blog_posts.all()
+    # The list projection of the posts (read blog/managers.py): no content, and the authors in the same query.
+    category_posts = category.category_blog_posts.summaries()
 
     return render(request, "admins/blog/category_detail.html", {"category": category,
-                                                                "category_posts": category_posts,
-                                                                "today": today, })
+                                                                "category_posts": category_posts})
 
 
 @login_required()
 def category_create_view(request):
     if not request.user.is_author and not request.user.is_staff and not request.user.is_superuser:
-            return HttpResponseForbidden(render(request, "admins/errors/403.html"))
+            return render(request, "admins/errors/403.html", status=403)
 
     form = None
 
@@ -452,13 +528,13 @@ def category_create_view(request):
     elif request.method == "GET":
         form = CategoryForm()
 
-    return render(request, "admins/blog/category_create.html", {"form": form, "today": today})
+    return render(request, "admins/blog/category_create.html", {"form": form})
 
 
 @login_required
 def category_update_view(request, pk):
     if not request.user.is_author and not request.user.is_staff and not request.user.is_superuser:
-            return HttpResponseForbidden(render(request, "admins/errors/403.html"))
+            return render(request, "admins/errors/403.html", status=403)
 
     category = None
     form = None
@@ -467,9 +543,9 @@ def category_update_view(request, pk):
         category = Category.objects.get(id=pk)
 
         if category.designer != request.user and request.user.is_superuser:
-            return HttpResponseForbidden(render(request, "admins/errors/403.html"))
+            return render(request, "admins/errors/403.html", status=403)
     except ObjectDoesNotExist:
-        return HttpResponseNotFound(render(request, "admins/errors/404.html"))
+        return render(request, "admins/errors/404.html", status=404)
 
     form = CategoryForm(request.POST or None, instance=category)
     if form.is_valid():
@@ -478,24 +554,94 @@ def category_update_view(request, pk):
         commit.save()
         return redirect("admins:category_detail", category.id)
 
-    return render(request, "admins/blog/category_update.html", {"category": category, "form": form, "today": today})
+    return render(request, "admins/blog/category_update.html", {"category": category, "form": form})
 
 
 @login_required()
 def category_delete_view(request, pk):
     if not request.user.is_author and not request.user.is_staff and not request.user.is_superuser:
-            return HttpResponseForbidden(render(request, "admins/errors/403.html"))
+            return render(request, "admins/errors/403.html", status=403)
 
     try:
         category = Category.objects.get(id=pk)
 
         if category.designer != request.user and not request.user.is_superuser:
-            return HttpResponseForbidden(render(request, "admins/errors/403.html"))
+            return render(request, "admins/errors/403.html", status=403)
     except ObjectDoesNotExist:
-        return HttpResponseNotFound(render(request, "admins/errors/404.html"))
+        return render(request, "admins/errors/404.html", status=404)
 
     if request.method == "POST":
         category.delete()
         return redirect("admins:category_list")
 
-    return render(request, "admins/blog/category_delete.html", {"category": category, "today": today})
+    return render(request, "admins/blog/category_delete.html", {"category": category})
+
+
+@login_required()
+def comment_list_view(request, queue="unread"):
+    """
+    The moderation queue: the unread comments (or only the pending ones, not approved yet), newest first. The list is
+    paginated with cursors (?after=X / ?before=X, read KeysetPaginator in extensions/paginators.py) on a partial index
+    of the unread comments, so it stays fast however many comments are waiting. The comments are approved, rejected or
+    marked as read in bulk (post_bulk_action's twin, comment_bulk_action_view).
+    """
+    if not request.user.is_author and not request.user.is_staff and not request.user.is_superuser:
+        return render(request, "admins/errors/403.html", status=403)
+    if queue not in ("unread", "pending"):
+        return render(request, "admins/errors/404.html", status=404)
+
+    paginator = KeysetPaginator(Comment.objects.moderation_queue(request.user, queue), COMMENTS_PER_PAGE,
+                                date_field="datetime_created")
+    page_obj = paginator.get_page(after=request.GET.get("after"), before=request.GET.get("before"))
+
+    context = {
+        "queue": queue,
+        "comments": page_obj,
+        "page_obj": page_obj,
+        "bulk_actions": CommentBulkActionForm.ACTION_CHOICES,
+    }
+    return render(request, "admins/blog/comment_list.html", context)
+
+
+@login_required()
+@require_POST
+def comment_bulk_action_view(request):
+    if not request.user.is_author and not request.user.is_staff and not request.user.is_superuser:
+        return render(request, "admins/errors/403.html", status=403)
+
+    next_url = request.POST.get("next")
+    if not url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()},
+                                           require_https=request.is_secure()):
+        next_url = reverse("admins:comment_list")
+
+    form = CommentBulkActionForm(request.POST, user=request.user)
+    if form.is_valid():
+        count = form.save()
+        messages.success(request, "عملگر «{}» روی {} نظر اجرا شد.".format(
+            dict(form.fields["action"].choices)[form.cleaned_data["action"]], count))
+    else:
+        for errors in form.errors.values():
+            for error in errors:
+                messages.error(request, error)
+    return HttpResponseRedirect(next_url)
+
+
+@login_required()
+def export_view(request, name, file_format):
+    """
+    Downloads a whole table (posts, comments or users, read admins/exports.py) as CSV or JSONL. The file is streamed:
+    the rows are read from a server-side cursor and sent as they are formatted, so neither the worker nor the database
+    keeps the whole table in memory, and the download starts at once. Only for superusers, because the users table
+    has the emails of everyone.
+    """
+    if not request.user.is_superuser:
+        return render(request, "admins/errors/403.html", status=403)
+    if name not in EXPORTS or file_format not in FORMATS:
+        return render(request, "admins/errors/404.html", status=404)
+
+    response = StreamingHttpResponse(
+        iter_export(name, file_format),
+        content_type="text/csv; charset=utf-8" if file_format == "csv" else "application/x-ndjson; charset=utf-8")
+    response["Content-Disposition"] = 'attachment; filename="{}-{}.{}"'.format(
+        name, timezone.localdate().isoformat(), file_format)
+    return response
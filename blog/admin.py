@@ -2,7 +2,7 @@ from django.contrib import admin
 
 from jalali_date.admin import ModelAdminJalaliMixin
 
-from .models import Category, Post, Comment
+from .models import Category, Post, Comment, SiteStatistic
 
 # Register your models here.
 
@@ -40,3 +40,11 @@ class CommentAdmin(admin.ModelAdmin):
     list_editable = ("active", )
     search_fields = ("author", "title", "text", )
     list_filter = ("datetime_created", "datetime_modified", "active", )
+    # A select box of every post, user and comment would load the whole tables on each change page.
+    raw_id_fields = ("post", "author", "parent", )
+
+
+@admin.register(SiteStatistic)
+class SiteStatisticAdmin(admin.ModelAdmin):
+    list_display = ("name", "value", "datetime_modified")
+    readonly_fields = ("name", "value", "datetime_modified")
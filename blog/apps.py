@@ -9,3 +9,7 @@ class BlogConfig(AppConfig):
     # Here we adjust the additional translation settings. In fact, we introduce the Persian version (in Persian format)
     # of the app to Django.
     verbose_name = _("بلاگ")
+
+    def ready(self):
+        # Connect the signal receivers of the blog (blog/signals.py).
+        from . import signals  # noqa: F401
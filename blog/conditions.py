@@ -0,0 +1,99 @@
+import datetime
+import hashlib
+
+from django.db.models import Max
+from django.views.decorators.http import condition
+
+from .models import Post
+from .context_processors import get_sidebar_version, get_version, bump_version
+
+# Create your conditional GET (ETag / Last-Modified) helpers here.
+# Browsers and crawlers send back the ETag and Last-Modified of the page they already have. If nothing has changed
+# since then, Django's condition() decorator answers "304 Not Modified" without calling the view, so nothing is
+# queried or rendered. The functions below must therefore be cheap: they only read version stamps.
+
+POSTS_VERSION_KEY = "blog:posts:version"
+
+
+def get_posts_version():
+    """
+    The newest datetime_modified of the posts does not move when a post is deleted, so the post lists have their own
+    version too, bumped by every change that no remaining post records: a deleted post (blog/signals.py), the bulk
+    actions and bulk_delete() (blog/managers.py).
+    """
+    return get_version(POSTS_VERSION_KEY)
+
+
+def bump_posts_version():
+    bump_version(POSTS_VERSION_KEY)
+
+
+def _version_to_datetime(version):
+    # The versions are times in nanoseconds.
+    return datetime.datetime.fromtimestamp(version / 10 ** 9, tz=datetime.timezone.utc)
+
+
+def _get_sidebar_modified():
+    # The sidebar version is the time of the last change of the sidebar tags and categories.
+    return _version_to_datetime(get_sidebar_version())
+
+
+def _make_etag(*parts):
+    return hashlib.md5("|".join(str(part) for part in parts).encode()).hexdigest()
+
+
+def get_posts_last_modified(request, *args, **kwargs):
+    """
+    The last change of any post list: the newest datetime_modified of all posts, or the publishing date of a scheduled
+    post that has just become public (which does not change datetime_modified), or the posts version (a deleted post),
+    or a change of the sidebar. Both maximums are read from an index (two tiny queries) and remembered on the request,
+    because both the ETag and the Last-Modified functions need them.
+    """
+    if not hasattr(request, "_blog_posts_last_modified"):
+        modified = Post.objects.aggregate(stamp=Max("datetime_modified"))["stamp"]
+        published = Post.actives.aggregate(stamp=Max("pub_datetime"))["stamp"]
+        request._blog_posts_last_modified = max(
+            stamp for stamp in (modified, published, _version_to_datetime(get_posts_version()), _get_sidebar_modified())
+            if stamp)
+    return request._blog_posts_last_modified
+
+
+def get_posts_etag(request, *args, **kwargs):
+    return _make_etag("posts", get_posts_last_modified(request).isoformat())
+
+
+def get_post_last_modified(request, slug, *args, **kwargs):
+    """
+    The last change of one public post, of its approved comments (Post.datetime_commented) or of the sidebar. If the
+    post does not exist (or is not public), there is no stamp and the view runs normally (and answers 404).
+    """
+    if not hasattr(request, "_blog_post_last_modified"):
+        stamps = Post.actives.filter(slug=slug).values_list("datetime_modified", "pub_datetime",
+                                                            "datetime_commented").first()
+        request._blog_post_last_modified = max(
+            stamp for stamp in stamps + (_get_sidebar_modified(), ) if stamp) if stamps else None
+    return request._blog_post_last_modified
+
+
+def get_post_etag(request, slug, *args, **kwargs):
+    last_modified = get_post_last_modified(request, slug)
+    if last_modified is None:
+        return None
+    # The comments form depends on the reader (logged in or not), so the ETag does too.
+    return _make_etag("post", slug, last_modified.isoformat(), request.user.pk)
+
+
+def get_sidebar_last_modified(request, *args, **kwargs):
+    return _get_sidebar_modified()
+
+
+def get_sidebar_etag(request, *args, **kwargs):
+    return _make_etag("sidebar", get_sidebar_version())
+
+
+# Ready-to-use decorators for the views.
+posts_condition = condition(etag_func=get_posts_etag, last_modified_func=get_posts_last_modified)
+# The post page has a comments form (and a CSRF token) for the reader, and only its ETag depends on the reader: a
+# Last-Modified date would answer 304 to an If-Modified-Since request across a login or a logout.
+post_condition = condition(etag_func=get_post_etag)
+sidebar_condition = condition(etag_func=get_sidebar_etag, last_modified_func=get_sidebar_last_modified)
@@ -0,0 +1,77 @@
+import time
+
+from django.core.cache import cache
+from django.db.models import Count
+from django.utils.functional import SimpleLazyObject
+
+from taggit.models import Tag
+
+from .models import Category
+
+# Create your custom context processors here.
+# Context processors add variables to the context of every template that is rendered with render(request, ...).
+
+SIDEBAR_SIZE = 25
+SIDEBAR_VERSION_KEY = "blog:sidebar:version"
+SIDEBAR_TIMEOUT = 60 * 60 * 24
+
+
+def get_version(key):
+    """
+    Cached data is stored under a version number. Instead of finding and deleting the cached data when something
+    changes, we simply move to a new version (bump_version) and the old data is never read again. The versions are
+    times in nanoseconds, so they also tell when the last change happened (blog/conditions.py).
+    """
+    version = cache.get(key)
+    if version is None:
+        # A fresh version (not 1) so that data cached before the version key was evicted is never served again.
+        version = time.time_ns()
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_version(key):
+    cache.set(key, time.time_ns(), None)
+
+
+def get_sidebar_version():
+    # The version of the sidebar tags and categories, bumped when a tag or a category changes.
+    return get_version(SIDEBAR_VERSION_KEY)
+
+
+def bump_sidebar_version():
+    bump_version(SIDEBAR_VERSION_KEY)
+
+
+def _get_cached(name, query):
+    key = "blog:sidebar:{}:{}".format(name, get_sidebar_version())
+    value = cache.get(key)
+    if value is None:
+        value = list(query())
+        cache.set(key, value, SIDEBAR_TIMEOUT)
+    return value
+
+
+def get_sidebar_tags():
+    # The most used tags first, so the sidebar is the same on every page and every process.
+    return _get_cached("tags", lambda: Tag.objects.annotate(posts_count=Count("taggit_taggeditem_items"))
+                       .order_by("-posts_count", "name")[:SIDEBAR_SIZE])
+
+
+def get_sidebar_categories():
+    return _get_cached("categories", lambda: Category.objects.filter(active=True)
+                       .order_by("-datetime_modified", "id")[:SIDEBAR_SIZE])
+
+
+def sidebar(request):
+    """
+    Serves the tags and categories of the sidebar (blog/includes/_tag_list.html and _category_list.html) to every
+    template from the shared cache. The values are lazy, so pages without a sidebar (like the admins panel) do not
+    even touch the cache. The version is bumped in blog/signals.py whenever a tag, a category or the tags of a post
+    change.
+    """
+    return {
+        "tags_list": SimpleLazyObject(get_sidebar_tags),
+        "categories": SimpleLazyObject(get_sidebar_categories),
+    }
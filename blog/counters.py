@@ -0,0 +1,144 @@
+import atexit
+import threading
+import time
+from collections import defaultdict
+
+from django.db.models import F
+from django.utils import timezone
+
+from extensions.sketches import hash64
+
+# Create your custom counters here.
+
+
+class PostViewCounter:
+    """
+    Counting the views of a post with "post.views = post.views + 1; post.save()" on every request has three problems:
+    it rewrites every column of the post, it changes datetime_modified (and so the order of posts), and popular posts
+    wait on each other for the same row lock.
+
+    This counter keeps the views in memory (per process) and writes them to the database in batches. A batch is a
+    handful of UPDATE ... SET views = views + N queries (F() expressions), one per distinct N, so no row is rewritten
+    and datetime_modified stays untouched. The buffer is written every FLUSH_INTERVAL seconds or every FLUSH_SIZE
+    views (whichever comes first), and once more when the process exits, so no views are lost on shutdown. The
+    interval is checked at the start of every request too (flush_if_due, on request_started in blog/signals.py), not
+    only when a view comes: a worker that serves other pages does not keep the last views of a quiet post for hours.
+
+    When the visitor is known, the view is also kept as an event (post, visitor, time) for the daily analytics, and
+    the events of a batch are appended to PostViewEvent with one bulk INSERT (read the rollup_post_views command).
+    """
+
+    FLUSH_INTERVAL = 10
+    FLUSH_SIZE = 500
+
+    def __init__(self, flush_interval=FLUSH_INTERVAL, flush_size=FLUSH_SIZE):
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self._buffer = defaultdict(int)
+        self._events = []
+        self._buffered = 0
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    def increment(self, post_id, amount=1, visitor=None):
+        with self._lock:
+            self._buffer[post_id] += amount
+            self._buffered += amount
+            if visitor is not None:
+                self._events.extend([(post_id, visitor, timezone.now())] * amount)
+            due = self._buffered >= self.flush_size or self._is_interval_over()
+        if due:
+            self.flush()
+
+    def _is_interval_over(self):
+        return time.monotonic() - self._last_flush >= self.flush_interval
+
+    def flush_if_due(self):
+        """
+        Writes the buffer if it has waited FLUSH_INTERVAL seconds. Without buffered views, it costs nothing (no
+        query).
+        """
+        with self._lock:
+            due = self._buffered > 0 and self._is_interval_over()
+        if due:
+            return self.flush()
+        return 0
+
+    def pending(self, post_id):
+        """
+        Returns the views of this post that are still waiting in the buffer.
+        """
+        with self._lock:
+            return self._buffer.get(post_id, 0)
+
+    def flush(self):
+        """
+        Writes the buffered views (and view events) to the database. If writing fails, the views are put back into the
+        buffer and will be written with the next flush.
+        """
+        # Imported here, because the models module should not depend on this module being imported first.
+        from .models import Post, PostViewEvent
+
+        with self._lock:
+            buffer, self._buffer = self._buffer, defaultdict(int)
+            events, self._events = self._events, []
+            self._buffered = 0
+            self._last_flush = time.monotonic()
+
+        if not buffer:
+            return 0
+
+        if events:
+            try:
+                # A post that was deleted since its view would fail the whole INSERT (foreign key).
+                post_ids = set(Post.objects.filter(pk__in={event[0] for event in events}).values_list("id", flat=True))
+                PostViewEvent.objects.bulk_create([
+                    PostViewEvent(post_id=post_id, visitor=visitor, datetime_created=datetime_created)
+                    for post_id, visitor, datetime_created in events if post_id in post_ids
+                ], batch_size=1000)
+            except Exception:
+                with self._lock:
+                    self._events[:0] = events
+                    for post_id, amount in buffer.items():
+                        self._buffer[post_id] += amount
+                        self._buffered += amount
+                raise
+
+        # Posts that got the same number of views share one UPDATE query.
+        groups = defaultdict(list)
+        for post_id, amount in buffer.items():
+            groups[amount].append(post_id)
+
+        for amount, post_ids in list(groups.items()):
+            try:
+                Post.objects.filter(pk__in=post_ids).update(views=F("views") + amount)
+            except Exception:
+                with self._lock:
+                    for unsaved_amount, unsaved_post_ids in groups.items():
+                        for post_id in unsaved_post_ids:
+                            self._buffer[post_id] += unsaved_amount
+                            self._buffered += unsaved_amount
+                raise
+            del groups[amount]
+
+        return sum(buffer.values())
+
+
+def get_visitor(request):
+    """
+    The (signed, for a BigIntegerField) 64-bit hash that identifies the visitor of a request: the session if there is
+    one, otherwise the IP address and the browser. No session is created for this.
+    """
+    session_key = getattr(getattr(request, "session", None), "session_key", None)
+    if session_key:
+        identity = "session:" + session_key
+    else:
+        identity = "{}|{}".format(request.META.get("REMOTE_ADDR", ""), request.META.get("HTTP_USER_AGENT", ""))
+    visitor = hash64(identity)
+    return visitor - (1 << 64) if visitor >= 1 << 63 else visitor
+
+
+post_view_counter = PostViewCounter()
+
+# Write whatever is left in the buffer when the worker shuts down.
+atexit.register(post_view_counter.flush)
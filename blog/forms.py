@@ -6,7 +6,7 @@ from django.forms.widgets import Textarea
 from jalali_date.fields import JalaliDateField, SplitJalaliDateTimeField
 from jalali_date.widgets import AdminJalaliDateWidget, AdminSplitJalaliDateTime
 
-from .models import Post, Category
+from .models import Post, Category, Comment
 
 # Create your custom forms here.
 
@@ -66,3 +66,22 @@ class CategoryForm(forms.ModelForm):
         
 class PostSearchForm(forms.Form):
     query = forms.CharField(max_length=225)
+
+
+class CommentForm(forms.ModelForm):
+    """
+    A new comment (or a reply) of a reader. The comment it replies to must be an approved comment of the same post.
+    """
+
+    def __init__(self, *args, post=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields["parent"].queryset = Comment.objects.filter(post=post, active=True)
+        self.fields["parent"].widget = forms.HiddenInput()
+
+    class Meta:
+        model = Comment
+        fields = (
+            "title",
+            "text",
+            "parent",
+        )
@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from extensions.utils import gregorian_to_jalali
+from blog.models import Post
+
+
+class Command(BaseCommand):
+    """
+    Fills the stored jalali_year and jalali_month fields of the posts (the Jalali archive). New and edited posts get
+    them when they are saved, so this command is for backfills: after the migration that added the fields, or after
+    posts were inserted without save() (bulk_create, raw SQL).
+
+    The posts are read in ranges of ids (only the id and the publishing date) and every range is written back with
+    one bulk UPDATE query.
+
+    Usage: python manage.py backfill_jalali_dates --batch-size 2000 [--all]
+    """
+
+    help = "Fills the stored Jalali year and month of the posts in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=2000)
+        parser.add_argument("--all", action="store_true", help="Recompute every post, not only the missing ones.")
+
+    def handle(self, *args, **options):
+        posts = Post.objects.all()
+        if not options["all"]:
+            posts = posts.filter(jalali_year__isnull=True)
+
+        total = fill_jalali_dates(posts, options["batch_size"])
+        if total is None:
+            self.stdout.write("There are no posts to fill.")
+            return
+        self.stdout.write(self.style.SUCCESS("Filled the Jalali dates of {} posts.".format(total)))
+
+
+def fill_jalali_dates(posts, batch_size):
+    """
+    The batched update of the command, also run by the migration that added the fields (0047) with its historical
+    model: the posts (a queryset) are filled range by range. Returns the number of filled posts, or None if there are
+    no posts.
+    """
+    bounds = posts.aggregate(first=Min("id"), last=Max("id"))
+    if bounds["first"] is None:
+        return None
+
+    total = 0
+    for start in range(bounds["first"], bounds["last"] + 1, batch_size):
+        changed = []
+        for pk, pub_datetime in posts.filter(id__range=(start, start + batch_size - 1)).values_list(
+                "id", "pub_datetime"):
+            pub_datetime = timezone.localtime(pub_datetime)
+            jalali_year, jalali_month, _ = gregorian_to_jalali(pub_datetime.year, pub_datetime.month,
+                                                               pub_datetime.day)
+            changed.append(posts.model(id=pk, jalali_year=jalali_year, jalali_month=jalali_month))
+        posts.model.objects.bulk_update(changed, ["jalali_year", "jalali_month"])
+        total += len(changed)
+    return total
@@ -0,0 +1,59 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+
+from extensions.paginators import KeysetPaginator
+from blog.models import Post
+from blog.views import POSTS_PER_PAGE
+
+
+class Command(BaseCommand):
+    """
+    Compares the time needed to fetch a page of public posts at different depths, once with OFFSET (?page=X) and once
+    with a cursor (?after=X). With OFFSET the time grows with the depth, with a cursor it should stay flat.
+
+    Usage: python manage.py benchmark_pagination --depths 1 10 100 400 --repeat 5
+    """
+
+    help = "Measures OFFSET vs keyset (cursor) pagination latency of the public post list at several page depths."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--depths", nargs="+", type=int, default=[1, 10, 100, 400])
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        posts = Post.actives.order_by("-pub_datetime", "-id")
+        repeat = options["repeat"]
+
+        self.stdout.write("{:>8} {:>14} {:>14}".format("page", "offset (ms)", "keyset (ms)"))
+        for depth in options["depths"]:
+            offset = POSTS_PER_PAGE * (depth - 1)
+
+            # The cursor of the page is the last post of the previous page. We find it once, outside the timing.
+            cursor = None
+            if depth > 1:
+                previous_last = posts[offset - 1:offset].first()
+                if previous_last is None:
+                    self.stdout.write("{:>8} {:>14}".format(depth, "(no such page)"))
+                    continue
+                cursor = KeysetPaginator(posts, POSTS_PER_PAGE).encode_cursor(previous_last)
+
+            offset_time = self._measure(lambda: list(Paginator(posts, POSTS_PER_PAGE).page(depth)), repeat)
+            keyset_time = self._measure(
+                lambda: list(KeysetPaginator(posts, POSTS_PER_PAGE).get_page(after=cursor)), repeat)
+
+            self.stdout.write("{:>8} {:>14.2f} {:>14.2f}".format(depth, offset_time, keyset_time))
+
+    @staticmethod
+    def _measure(function, repeat):
+        """
+        Returns the median time (in milliseconds) of calling the function "repeat" times.
+        """
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function()
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        return timings[len(timings) // 2]
@@ -0,0 +1,269 @@
+import csv
+import json
+import os
+import sys
+import time
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from taggit.models import Tag, TaggedItem
+from taggit.utils import parse_tags
+
+from blog.models import Post, Category, SiteStatistic
+from blog.context_processors import bump_sidebar_version
+from admins.exports import unescape_formula
+
+# The fields of the posts that a record can have (besides author, category and tags). Missing ones get the defaults of
+# the model.
+POST_FIELDS = ("title", "content", "description", "slug", "pub_datetime", "read_time", "status", "active", "views")
+
+
+class Command(BaseCommand):
+    """
+    Imports posts from another system: a JSONL file (one JSON object per line) or a CSV file (with a header row), with
+    the fields of POST_FIELDS plus "author" (a username, the user must exist), "category" (a title, created if
+    missing) and "tags" (a list, or a comma separated string as in the tags field of the forms). For example:
+
+        {"title": "...", "content": "<p>...</p>", "description": "...", "slug": "...", "author": "admin",
+         "category": "News", "tags": ["django", "python"], "pub_datetime": "2023-05-01T10:00:00+03:30", "status": "1"}
+
+    The file is read as a stream, batch by batch, so memory does not grow with the size of the file. A batch is
+    validated record by record (the validators of the model fields, Post.clean_fields()), but everything that needs
+    the database is done for the whole batch: one query for the authors, the categories, the tags and the existing
+    slugs and descriptions, one bulk INSERT for the new categories, tags, posts and tag rows, and one UPDATE for the
+    search vectors. Each batch is one transaction.
+
+    Invalid records are reported (with their record number) and skipped. Records whose slug already exists are skipped
+    too, so importing the same file twice does not duplicate anything. With --checkpoint, the number of records done
+    is saved after every batch and the next run continues from there. With --dry-run, every batch runs in a
+    transaction that is rolled back: everything is checked, nothing is written.
+
+    Like every bulk insert, no save() and no signals: the similar posts lists are not built. Run
+    "manage.py rebuild_related_posts" after the import.
+
+    Usage: python manage.py import_posts posts.jsonl [--format csv] [--batch-size 1000] [--checkpoint import.json]
+           [--dry-run]
+    """
+
+    help = "Imports posts from a JSONL or CSV file in batches, with a dry-run mode and resumable checkpoints."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="The JSONL or CSV file, or - for the standard input.")
+        parser.add_argument("--format", choices=("jsonl", "csv"), help="By default, from the extension of the file.")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--checkpoint", help="A JSON file to save the progress in, and to resume from.")
+        parser.add_argument("--dry-run", action="store_true", help="Check everything, write nothing.")
+
+    def handle(self, *args, **options):
+        file_format = options["format"] or ("csv" if options["path"].endswith(".csv") else "jsonl")
+        checkpoint = self.read_checkpoint(options)
+        self.authors, self.categories, self.tags = {}, {}, {}
+        self.content_type = ContentType.objects.get_for_model(Post)
+        self.totals = {"imported": 0, "existing": 0, "invalid": 0}
+
+        source = sys.stdin if options["path"] == "-" else open(options["path"], encoding="utf-8-sig", newline="")
+        try:
+            records = enumerate(self.read_records(source, file_format), start=1)
+            # Resume: skip the records that a previous run has already done.
+            done = checkpoint.get("records", 0)
+            if done:
+                records = islice(records, done, None)
+                self.stdout.write("Resuming after record {}.".format(done))
+
+            start = time.perf_counter()
+            while True:
+                batch = list(islice(records, options["batch_size"]))
+                if not batch:
+                    break
+                with transaction.atomic():
+                    self.import_batch(batch)
+                    if options["dry_run"]:
+                        transaction.set_rollback(True)
+                if options["dry_run"]:
+                    # The categories and tags created by this batch were rolled back.
+                    self.categories, self.tags = {}, {}
+                else:
+                    done = batch[-1][0]
+                    self.write_checkpoint(options, done)
+
+                elapsed = time.perf_counter() - start
+                self.stdout.write("{} records ({imported} imported, {existing} existing, {invalid} invalid), "
+                                  "{:.0f} records/s".format(batch[-1][0], sum(self.totals.values()) / elapsed,
+                                                            **self.totals))
+        finally:
+            if source is not sys.stdin:
+                source.close()
+
+        if self.totals["imported"] and not options["dry_run"]:
+            # bulk_create does not send signals, so the cached sidebar does not know about the new tags and categories.
+            bump_sidebar_version()
+        self.stdout.write(self.style.SUCCESS("{} {imported} posts ({existing} existing, {invalid} invalid).{}".format(
+            "Would import" if options["dry_run"] else "Imported",
+            "" if options["dry_run"] else ' Run "manage.py rebuild_related_posts" to build the similar posts lists.',
+            **self.totals)))
+
+    @staticmethod
+    def read_records(source, file_format):
+        if file_format == "csv":
+            # The exports (admins/exports.py) escape the cells that a spreadsheet would run as formulas.
+            for record in csv.DictReader(source):
+                yield {key: unescape_formula(value) for key, value in record.items()}
+            return
+        for line in source:
+            line = line.strip()
+            if line:
+                try:
+                    yield json.loads(line)
+                except ValueError as error:
+                    # Reported (and skipped) by import_batch, like any other invalid record.
+                    yield {"__error__": "Invalid JSON: {}".format(error)}
+
+    def read_checkpoint(self, options):
+        if not options["checkpoint"] or not os.path.exists(options["checkpoint"]):
+            return {}
+        with open(options["checkpoint"], encoding="utf-8") as checkpoint_file:
+            checkpoint = json.load(checkpoint_file)
+        if checkpoint.get("path") != options["path"]:
+            raise CommandError("The checkpoint {} belongs to {}.".format(options["checkpoint"], checkpoint.get("path")))
+        return checkpoint
+
+    @staticmethod
+    def write_checkpoint(options, records):
+        if not options["checkpoint"]:
+            return
+        # Written next to the real file and renamed over it, so a crash never leaves half a checkpoint.
+        temporary_path = options["checkpoint"] + ".tmp"
+        with open(temporary_path, "w", encoding="utf-8") as checkpoint_file:
+            json.dump({"path": options["path"], "records": records}, checkpoint_file)
+        os.replace(temporary_path, options["checkpoint"])
+
+    def invalid(self, number, error):
+        self.stderr.write("Record {}: {}".format(number, error))
+        self.totals["invalid"] += 1
+
+    def validate(self, batch):
+        """
+        Returns [(record number, unsaved post, author username, category title, tag names)] for the valid records.
+        """
+        valid = []
+        for number, record in batch:
+            if "__error__" in record:
+                self.invalid(number, record["__error__"])
+                continue
+            post = Post(**{name: record[name] for name in POST_FIELDS if record.get(name) not in (None, "")})
+            try:
+                # The unique fields (slug and description) are checked later, for the whole batch at once.
+                post.clean_fields(exclude=[field.name for field in Post._meta.fields if field.name not in POST_FIELDS])
+            except ValidationError as error:
+                self.invalid(number, "; ".join("{}: {}".format(field, " ".join(messages))
+                                               for field, messages in error.message_dict.items()))
+                continue
+            if timezone.is_naive(post.pub_datetime):
+                post.pub_datetime = timezone.make_aware(post.pub_datetime)
+            tags = record.get("tags") or []
+            tags = parse_tags(tags) if isinstance(tags, str) else [str(tag) for tag in tags]
+            author, category = str(record.get("author") or ""), str(record.get("category") or "").strip()
+            if not author or not category:
+                self.invalid(number, "author and category are required.")
+                continue
+            valid.append((number, post, author, category, tags))
+        return valid
+
+    def resolve_authors(self, usernames):
+        missing = set(usernames) - self.authors.keys()
+        if missing:
+            self.authors.update(get_user_model().objects.filter(username__in=missing).values_list("username", "id"))
+
+    def resolve_categories(self, titles, designers):
+        """
+        Finds the categories of the batch by title and creates the missing ones (with one bulk INSERT). The designer of a
+        new category is the author of the first post that uses it.
+        """
+        missing = set(titles) - self.categories.keys()
+        if not missing:
+            return
+        for title, pk, active in Category.objects.filter(title__in=missing).values_list("title", "id", "active"):
+            self.categories[title] = (pk, active)
+        Category.objects.bulk_create([
+            Category(title=title, slug=slugify(title, allow_unicode=True), designer_id=designers[title])
+            for title in missing - self.categories.keys()
+        ], ignore_conflicts=True)
+        for title, pk, active in Category.objects.filter(title__in=missing - self.categories.keys()).values_list(
+                "title", "id", "active"):
+            self.categories[title] = (pk, active)
+
+    def resolve_tags(self, names):
+        missing = set(names) - self.tags.keys()
+        if not missing:
+            return
+        self.tags.update(Tag.objects.filter(name__in=missing).values_list("name", "id"))
+        Tag.objects.bulk_create([Tag(name=name, slug=Tag().slugify(name)) for name in missing - self.tags.keys()],
+                                ignore_conflicts=True)
+        self.tags.update(Tag.objects.filter(name__in=missing - self.tags.keys()).values_list("name", "id"))
+        # Two names with the same slug: the slug of the second one needs the numbered slugs of Tag.save().
+        for name in missing - self.tags.keys():
+            self.tags[name] = Tag.objects.get_or_create(name=name)[0].id
+
+    def import_batch(self, batch):
+        valid = self.validate(batch)
+
+        self.resolve_authors(author for _, _, author, _, _ in valid)
+        valid_authors = []
+        for record in valid:
+            if record[2] in self.authors:
+                valid_authors.append(record)
+            else:
+                self.invalid(record[0], "The author {} does not exist.".format(record[2]))
+        valid = valid_authors
+
+        designers = {}
+        for _, _, author, category, _ in valid:
+            designers.setdefault(category, self.authors[author])
+        self.resolve_categories(designers.keys(), designers)
+        self.resolve_tags({tag for _, _, _, _, tags in valid for tag in tags})
+
+        # The unique fields: against the database (one query each) and inside the batch.
+        existing_slugs = set(Post.objects.filter(slug__in=[post.slug for _, post, _, _, _ in valid]).values_list(
+            "slug", flat=True))
+        existing_descriptions = set(Post.objects.filter(
+            description__in=[post.description for _, post, _, _, _ in valid]).values_list("description", flat=True))
+
+        now = timezone.now()
+        posts, post_tags = [], []
+        for number, post, author, category, tags in valid:
+            if post.slug in existing_slugs:
+                self.totals["existing"] += 1
+                continue
+            if post.description in existing_descriptions:
+                self.invalid(number, "A post with the same description already exists.")
+                continue
+            if category not in self.categories:
+                self.invalid(number, "The category {} could not be created.".format(category))
+                continue
+            existing_slugs.add(post.slug)
+            existing_descriptions.add(post.description)
+
+            post.author_id = self.authors[author]
+            post.category_id, category_active = self.categories[category]
+            # bulk_create does not call save(), so the stored fields that save() maintains are computed here.
+            post.is_public = post.active and post.status == "1" and category_active and post.pub_datetime <= now
+            post.jalali_year, post.jalali_month = post.get_jalali_year_month()
+            posts.append(post)
+            post_tags.append(tags)
+
+        Post.objects.bulk_create(posts)
+        TaggedItem.objects.bulk_create([
+            TaggedItem(content_type=self.content_type, object_id=post.id, tag_id=self.tags[tag])
+            for post, tags in zip(posts, post_tags) for tag in set(tags)
+        ])
+        Post.objects.filter(pk__in=[post.id for post in posts]).update(search_vector=Post.get_search_vector())
+        SiteStatistic.objects.increment("posts", len(posts))
+        SiteStatistic.objects.increment("public_posts", sum(post.is_public for post in posts))
+        self.totals["imported"] += len(posts)
@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from blog.models import Post, RelatedPost
+
+
+class Command(BaseCommand):
+    """
+    Posts can be scheduled: their publishing date (pub_datetime) is in the future. Such a post is saved with
+    is_public=False, and nothing saves it again when its date arrives. This command finds those posts and makes them
+    public (and builds their similar posts lists, which only contain public posts).
+
+    Run it from cron every minute, or leave it running as a small worker with --loop.
+
+    Usage: python manage.py publish_scheduled_posts [--loop] [--interval 60]
+    """
+
+    help = "Makes scheduled posts public when their publishing date arrives."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--loop", action="store_true", help="Keep running and check every --interval seconds.")
+        parser.add_argument("--interval", type=int, default=60)
+
+    def handle(self, *args, **options):
+        while True:
+            published = self.publish()
+            if published:
+                self.stdout.write("Published {} scheduled posts.".format(published))
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
+
+    @staticmethod
+    def publish():
+        published_ids = Post.objects.filter(is_public=False, active=True, status="1").refresh_is_public()
+        for post in Post.objects.filter(pk__in=published_ids):
+            RelatedPost.objects.rebuild_around(post)
+        return len(published_ids)
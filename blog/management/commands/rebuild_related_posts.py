@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from blog.models import Post, RelatedPost
+
+
+class Command(BaseCommand):
+    """
+    The similar posts lists (RelatedPost) are kept up to date by signals, one post at a time. This command rebuilds
+    all of them from scratch, for example after the first migration or after importing posts with bulk queries
+    (which do not send signals). Until then, the posts without a list get their similar posts at query time (read
+    post_detail_view), which is much slower.
+
+    Usage: python manage.py rebuild_related_posts
+    """
+
+    help = "Rebuilds the precomputed similar posts list of every post."
+
+    def handle(self, *args, **options):
+        total = 0
+        for post in Post.objects.only("id", "category_id").iterator(chunk_size=500):
+            RelatedPost.objects.rebuild_for(post)
+            total += 1
+        self.stdout.write(self.style.SUCCESS("Rebuilt the similar posts of {} posts.".format(total)))
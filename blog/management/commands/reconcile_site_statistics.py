@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from blog.models import Post, Comment, SiteStatistic
+
+
+class Command(BaseCommand):
+    """
+    The counters of the admin portal (SiteStatistic) are kept up to date by signals, but bulk_create, queryset
+    updates and raw SQL change the tables without sending any. This command counts everything exactly (COUNT(*), so
+    not on every request) and corrects the counters that drifted, including the comment counters of every post and
+    author (Post.comments_count, Post.unread_comments_count and CustomUser.unread_comments_count).
+
+    Run it from cron once a day (or after a bulk import).
+
+    Usage: python manage.py reconcile_site_statistics
+    """
+
+    help = "Recounts the counters of the admin portal and corrects the ones that drifted."
+
+    def handle(self, *args, **options):
+        stored = dict(SiteStatistic.objects.values_list("name", "value"))
+        for name, value in SiteStatistic.objects.reconcile().items():
+            if name not in stored:
+                self.stdout.write("{}: {} (new)".format(name, value))
+            elif stored[name] != value:
+                self.stdout.write("{}: {} -> {} (drift {:+d})".format(name, stored[name], value, value - stored[name]))
+        Comment.objects.refresh_counters(Post.objects.values("id"))
+        self.stdout.write(self.style.SUCCESS("The site statistics are up to date."))
@@ -0,0 +1,57 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Max, Min
+
+from blog.models import Post
+
+
+class Command(BaseCommand):
+    """
+    Fills the stored search_vector field of the posts. New and edited posts are indexed when they are saved, so this
+    command is for backfills: after the migration that added the field, or after changing the search document.
+
+    The posts are split into ranges of ids and each range is indexed with one UPDATE query. Several ranges are indexed
+    at the same time (each worker thread has its own database connection).
+
+    Usage: python manage.py reindex_post_search --batch-size 1000 --workers 4 [--missing]
+    """
+
+    help = "Rebuilds the stored full-text search vector of the posts in parallel batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument("--missing", action="store_true", help="Only index posts that have no search vector yet.")
+
+    def handle(self, *args, **options):
+        posts = Post.objects.all()
+        if options["missing"]:
+            posts = posts.filter(search_vector__isnull=True)
+
+        bounds = posts.aggregate(first=Min("id"), last=Max("id"))
+        if bounds["first"] is None:
+            self.stdout.write("There are no posts to index.")
+            return
+
+        batch_size = options["batch_size"]
+        ranges = [(start, start + batch_size - 1) for start in range(bounds["first"], bounds["last"] + 1, batch_size)]
+
+        def index_range(id_range):
+            return posts.filter(id__range=id_range).update(search_vector=Post.get_search_vector())
+
+        def index_range_in_thread(id_range):
+            try:
+                return index_range(id_range)
+            finally:
+                # Every thread opens its own connection, which Django does not close for us.
+                connection.close()
+
+        if options["workers"] > 1:
+            with ThreadPoolExecutor(max_workers=options["workers"]) as executor:
+                total = sum(executor.map(index_range_in_thread, ranges))
+        else:
+            total = sum(map(index_range, ranges))
+
+        self.stdout.write(self.style.SUCCESS("Indexed {} posts in {} batches.".format(total, len(ranges))))
@@ -0,0 +1,55 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+from django.utils import timezone
+
+from blog.models import PostViewEvent, PostDailyViews
+
+
+class Command(BaseCommand):
+    """
+    Sums the raw view events (PostViewEvent) into the daily views of the posts (PostDailyViews), then compacts the old
+    data, so the analytics take bounded space:
+
+    - the days from the newest rolled up day (it may have been rolled up before it ended) to today are rebuilt, or
+      the last --days days if that is more, or every day that still has events on the first run;
+    - the events older than --keep-events days are deleted (their days are already rolled up);
+    - the visitor sketches of the days older than --keep-sketches days are emptied. Their views and visitors stay, but
+      they can no longer be merged into the distinct visitors of a range.
+
+    Run it from cron every few minutes (the charts of today are as fresh as the last run).
+
+    Usage: python manage.py rollup_post_views [--days 2] [--keep-events 7] [--keep-sketches 90]
+    """
+
+    help = "Rolls the view events up into daily views and compacts the old events."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=2, help="Rebuild at least this many days (today included).")
+        parser.add_argument("--keep-events", type=int, default=7, help="Days of raw view events to keep.")
+        parser.add_argument("--keep-sketches", type=int, default=90, help="Days of visitor sketches to keep.")
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        # The events are appended in time order, so the smallest id is the oldest event (without scanning the table).
+        # A day older than it has no events anymore (compacted), and rebuilding it would erase its views.
+        oldest_event = PostViewEvent.objects.order_by("id").only("datetime_created").first()
+        if oldest_event is not None:
+            oldest_day = timezone.localdate(oldest_event.datetime_created)
+            newest_day = PostDailyViews.objects.aggregate(newest=Max("date"))["newest"]
+            first_day = min(today - datetime.timedelta(days=options["days"] - 1), newest_day or oldest_day)
+            day = max(first_day, oldest_day)
+            while day <= today:
+                posts = PostDailyViews.objects.rollup(day)
+                self.stdout.write("{}: {} posts viewed.".format(day, posts))
+                day += datetime.timedelta(days=1)
+
+        events_cutoff, _ = PostDailyViews.objects.get_day_range(today - datetime.timedelta(days=options["keep_events"]))
+        deleted, _ = PostViewEvent.objects.filter(datetime_created__lt=events_cutoff).delete()
+        emptied = PostDailyViews.objects.filter(
+            date__lt=today - datetime.timedelta(days=options["keep_sketches"])).exclude(visitors_sketch=b"").update(
+            visitors_sketch=b"")
+
+        self.stdout.write(self.style.SUCCESS("Deleted {} old view events and emptied {} old visitor sketches.".format(
+            deleted, emptied)))
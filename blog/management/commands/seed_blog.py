@@ -0,0 +1,209 @@
+import datetime
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import CharField, OuterRef, Subquery, Value
+from django.db.models.functions import Cast, Concat, LPad
+from django.utils import timezone
+
+from taggit.models import Tag, TaggedItem
+
+from extensions.date import jalali
+from blog.managers import COMMENT_PATH_STEP
+from blog.models import Post, Category, Comment, SiteStatistic
+from blog.context_processors import bump_sidebar_version
+
+# Persian words used to build titles, descriptions, contents and comments. The text does not mean anything, but it has
+# the length and the characters of real posts, which matters for the size of the rows and for the search index.
+WORDS = (
+    "فناوری", "هوش", "مصنوعی", "برنامه", "نویسی", "پایتون", "جنگو", "وب", "سرور", "پایگاه", "داده", "امنیت",
+    "شبکه", "موبایل", "اندروید", "آیفون", "پردازنده", "گرافیک", "بازی", "ویدیو", "اینترنت", "ابری", "رایانش",
+    "توسعه", "نرم", "افزار", "سخت", "طراحی", "کاربر", "تجربه", "سریع", "امن", "جدید", "بررسی", "آموزش", "خبر",
+    "مقاله", "تحلیل", "بازار", "شرکت", "استارتاپ", "ربات", "خودرو", "برقی", "فضا", "ماهواره", "انرژی", "باتری",
+    "لپ", "تاپ", "گوشی", "هوشمند", "ساعت", "دوربین", "صفحه", "نمایش", "کد", "باز", "لینوکس", "ویندوز",
+)
+
+
+class Command(BaseCommand):
+    """
+    Fills the database with a large, realistic blog: authors, categories, tags, posts (with Persian text and
+    publishing dates spread over several Jalali years) and comments. It is meant for benchmarks (read
+    "manage.py benchmark_views"), never for a production database.
+
+    Everything is inserted with bulk_create in batches, so memory stays constant and 1M posts take minutes, not
+    hours. bulk_create does not call save() or send signals, so the stored fields that save() usually maintains
+    (is_public, jalali_year and jalali_month) are computed here, and the search vectors are filled with
+    reindex_post_search at the end. Run "manage.py rebuild_related_posts" afterwards if you need the similar posts
+    lists too.
+
+    Usage: python manage.py seed_blog --posts 100000 [--comments 3] [--seed 1]
+    """
+
+    help = "Seeds the database with synthetic authors, categories, tags, posts and comments for benchmarks."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--posts", type=int, default=10000, help="For example 10000, 100000 or 1000000.")
+        parser.add_argument("--authors", type=int, default=50)
+        parser.add_argument("--categories", type=int, default=30)
+        parser.add_argument("--tags", type=int, default=500)
+        parser.add_argument("--tags-per-post", type=int, default=4)
+        parser.add_argument("--comments", type=int, default=3, help="Average number of comments per post.")
+        parser.add_argument("--first-jalali-year", type=int, default=1395)
+        parser.add_argument("--last-jalali-year", type=int, default=1402)
+        parser.add_argument("--batch-size", type=int, default=2000)
+        parser.add_argument("--prefix", default="seed", help="Prefix of the slugs and usernames (must be unique).")
+        parser.add_argument("--seed", type=int, default=None, help="Random seed, to seed the same data again.")
+        parser.add_argument("--workers", type=int, default=4, help="Workers of the final reindex_post_search.")
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options["seed"])
+        self.prefix = options["prefix"]
+        start = time.perf_counter()
+
+        authors = self.create_authors(options["authors"])
+        categories = self.create_categories(options["categories"], authors)
+        tags = self.create_tags(options["tags"])
+        self.stdout.write("Created {} authors, {} categories and {} tags.".format(
+            len(authors), len(categories), len(tags)))
+
+        content_type = ContentType.objects.get_for_model(Post)
+        batch_size = options["batch_size"]
+        created = 0
+        while created < options["posts"]:
+            size = min(batch_size, options["posts"] - created)
+            with transaction.atomic():
+                posts = self.create_posts(created, size, authors, categories, options)
+                self.create_tagged_items(posts, tags, options["tags_per_post"], content_type)
+                self.create_comments(posts, authors, options["comments"])
+            created += size
+            self.stdout.write("{} / {} posts ({:.0f} posts/s)".format(
+                created, options["posts"], created / (time.perf_counter() - start)))
+
+        call_command("reindex_post_search", "--missing", "--workers", str(options["workers"]), stdout=self.stdout)
+        # bulk_create does not send signals, so the cached sidebar does not know about the new tags and categories.
+        bump_sidebar_version()
+        # ... and the counters of the admin portal have not counted the new rows.
+        SiteStatistic.objects.reconcile()
+        self.stdout.write(self.style.SUCCESS("Seeded {} posts in {:.1f}s.".format(
+            created, time.perf_counter() - start)))
+
+    def words(self, count):
+        return " ".join(self.random.choice(WORDS) for _ in range(count))
+
+    def jalali_datetime(self, options):
+        """
+        A random moment between the first day of first_jalali_year and the last day of last_jalali_year, so the posts
+        fill every Jalali month of the archive.
+        """
+        year = self.random.randint(options["first_jalali_year"], options["last_jalali_year"])
+        month = self.random.randint(1, 12)
+        day = self.random.randint(1, 31 if month <= 6 else 30 if month <= 11 else 29)
+        date = jalali.Persian(year, month, day).gregorian_datetime()
+        moment = datetime.datetime.combine(date, datetime.time(self.random.randint(0, 23), self.random.randint(0, 59)))
+        return timezone.make_aware(moment)
+
+    def create_authors(self, count):
+        # Hashing a password is slow on purpose, so all the seeded users share one hash.
+        password = make_password("{}-password".format(self.prefix))
+        return get_user_model().objects.bulk_create([
+            get_user_model()(
+                username="{}-author-{}".format(self.prefix, number),
+                email="{}-author-{}@example.com".format(self.prefix, number),
+                first_name=self.words(1),
+                last_name=self.words(1),
+                password=password,
+                is_author=True,
+            )
+            for number in range(count)
+        ])
+
+    def create_categories(self, count, authors):
+        return Category.objects.bulk_create([
+            Category(
+                title="{} {}-{}".format(self.words(2), self.prefix, number),
+                description=self.words(20),
+                slug="{}-category-{}".format(self.prefix, number),
+                designer=self.random.choice(authors),
+                # A few inactive categories, so the public filters have something to hide.
+                active=self.random.random() > 0.05,
+            )
+            for number in range(count)
+        ])
+
+    def create_tags(self, count):
+        return Tag.objects.bulk_create([
+            Tag(name="{} {}-{}".format(self.words(1), self.prefix, number), slug="{}-tag-{}".format(self.prefix, number))
+            for number in range(count)
+        ])
+
+    def create_posts(self, first_number, count, authors, categories, options):
+        now = timezone.now()
+        posts = []
+        for number in range(first_number, first_number + count):
+            category = self.random.choice(categories)
+            post = Post(
+                title=self.words(self.random.randint(4, 10)),
+                content="".join("<p>{}</p>".format(self.words(self.random.randint(30, 80)))
+                                for _ in range(self.random.randint(3, 12))),
+                description="{} {}".format(self.words(12), number),
+                author=self.random.choice(authors),
+                slug="{}-post-{}".format(self.prefix, number),
+                pub_datetime=self.jalali_datetime(options),
+                category=category,
+                read_time=self.random.randint(2, 20),
+                # Most posts are published and active, some are drafts or deactivated.
+                status="1" if self.random.random() > 0.1 else "0",
+                active=self.random.random() > 0.05,
+                views=self.random.randint(0, 10000),
+            )
+            post.is_public = post.active and post.status == "1" and category.active and post.pub_datetime <= now
+            post.jalali_year, post.jalali_month = post.get_jalali_year_month()
+            posts.append(post)
+        return Post.objects.bulk_create(posts)
+
+    def create_tagged_items(self, posts, tags, tags_per_post, content_type):
+        TaggedItem.objects.bulk_create([
+            TaggedItem(content_type=content_type, object_id=post.id, tag=tag)
+            for post in posts
+            for tag in self.random.sample(tags, min(tags_per_post, len(tags)))
+        ])
+
+    def create_comments(self, posts, authors, comments_per_post):
+        if not comments_per_post:
+            return
+        comments = Comment.objects.bulk_create([
+            self.comment(post, authors)
+            for post in posts
+            for _ in range(self.random.randint(0, comments_per_post * 2))
+        ])
+        # About a third of the comments get a reply, so the pages of the posts have threads.
+        replies = Comment.objects.bulk_create([
+            self.comment(comment.post, authors, parent=comment) for comment in comments if self.random.random() < 0.3
+        ])
+
+        # bulk_create does not call save(), which writes the materialized paths (read CommentQuerySet in
+        # blog/managers.py): one UPDATE for the new threads, then one for their replies.
+        own_path = LPad(Cast("id", CharField()), COMMENT_PATH_STEP, Value("0"))
+        Comment.objects.filter(pk__in=[comment.pk for comment in comments]).update(path=own_path)
+        Comment.objects.filter(pk__in=[reply.pk for reply in replies]).update(path=Concat(Subquery(
+            Comment.objects.filter(pk=OuterRef("parent_id")).values("path")), own_path))
+        # ... nor sends the signals that maintain the counters of the posts and of their authors.
+        Comment.objects.refresh_counters({comment.post_id for comment in comments}, commented=True)
+
+    def comment(self, post, authors, parent=None):
+        return Comment(
+            post=post,
+            parent=parent,
+            depth=1 if parent else 0,
+            author=self.random.choice(authors),
+            title=self.words(3),
+            text=self.words(self.random.randint(5, 60)),
+            active=self.random.random() > 0.3,
+            read=self.random.random() > 0.5,
+        )
@@ -1,18 +1,552 @@
-from django.db import models
+import datetime
+from collections import defaultdict
+
+from django.db import connection, models, transaction
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 
+from extensions.sketches import HyperLogLog
+from extensions.utils import JALALI_MONTHS, gregorian_to_jalali
+
 # Create your custom database managers here.
 
 
-class ActivePostManager(models.Manager):
+class PostQuerySet(models.QuerySet):
+    """
+    A post is public (visible to readers) when it is active, published (status "1"), its category is active and its
+    publishing date has arrived. Checking these four conditions on every public query needs a join on Category, so
+    the answer is stored in the is_public field of the post instead. This queryset recomputes that field.
+    """
+
+    def refresh_is_public(self):
+        """
+        Recomputes is_public for the posts of this queryset with (at most) two UPDATE queries and returns the ids of
+        the posts that have just become public.
+        """
+        public = models.Q(active=True, status="1", category__active=True, pub_datetime__lte=timezone.now())
+        # The models module imports this module, so we import the models here to avoid a circular import.
+        from .models import SiteStatistic
+
+        published_ids = list(self.filter(public).exclude(is_public=True).values_list("id", flat=True))
+        self.model.objects.filter(pk__in=published_ids).update(is_public=True)
+        unpublished = self.exclude(public).exclude(is_public=False).update(is_public=False)
+        # update() sends no signals, so the counter of public posts is corrected here.
+        SiteStatistic.objects.increment("public_posts", len(published_ids) - unpublished)
+        return published_ids
+
+    def _bulk_change(self, **fields):
+        """
+        Updates the posts of this queryset with one UPDATE query and does what Post.save() and the signals would have
+        done for each of them: is_public (and the public posts counter), datetime_modified (the version stamp of the
+        cached public lists, which update() does not touch) and the similar posts lists. Returns the ids of the posts.
+        """
+        # The models module imports this module, so we import the models here to avoid a circular import.
+        from .models import RelatedPost
+        from .conditions import bump_posts_version
+
+        # The ids are read first: the update may change which posts match the filters of this queryset.
+        post_ids = list(self.values_list("id", flat=True))
+        posts = self.model.objects.filter(pk__in=post_ids)
+        posts.update(datetime_modified=timezone.now(), **fields)
+        posts.refresh_is_public()
+        RelatedPost.objects.rebuild_around_many(posts.only("id", "category_id"))
+        # The posts that are no longer public do not move the newest datetime_modified of the public lists.
+        bump_posts_version()
+        return post_ids
+
+    def publish(self):
+        """
+        Publishes the posts now, like the "publish" button of the admin portal (active, status "1", published now).
+        """
+        now = timezone.now()
+        local_now = timezone.localtime(now)
+        jalali_year, jalali_month, _ = gregorian_to_jalali(local_now.year, local_now.month, local_now.day)
+        return self._bulk_change(active=True, status="1", pub_datetime=now, jalali_year=jalali_year,
+                                 jalali_month=jalali_month)
+
+    def unpublish(self):
+        # Back to draft.
+        return self._bulk_change(status="0")
+
+    def deactivate(self):
+        return self._bulk_change(active=False)
+
+    def move_to_category(self, category):
+        return self._bulk_change(category=category)
+
+    def add_tags(self, names):
+        """
+        Adds the tags (created if needed) to every post of this queryset with one bulk INSERT of the missing
+        (post, tag) pairs, instead of post.tags.add() for every post.
+        """
+        from django.contrib.contenttypes.models import ContentType
+        from taggit.models import Tag, TaggedItem
+        from .context_processors import bump_sidebar_version
+
+        tags = [Tag.objects.get_or_create(name=name)[0] for name in names]
+        content_type = ContentType.objects.get_for_model(self.model)
+        post_ids = list(self.values_list("id", flat=True))
+        existing = set(TaggedItem.objects.filter(content_type=content_type, object_id__in=post_ids,
+                                                 tag__in=tags).values_list("object_id", "tag_id"))
+        TaggedItem.objects.bulk_create([
+            TaggedItem(content_type=content_type, object_id=post_id, tag=tag)
+            for post_id in post_ids for tag in tags if (post_id, tag.id) not in existing
+        ], batch_size=1000)
+        # bulk_create sends no signals (m2m_changed), so the cached sidebar tags are invalidated here.
+        bump_sidebar_version()
+        return self.model.objects.filter(pk__in=post_ids)._bulk_change()
+
+    def remove_tags(self, names):
+        from django.contrib.contenttypes.models import ContentType
+        from taggit.models import TaggedItem
+
+        post_ids = list(self.values_list("id", flat=True))
+        # The receivers of TaggedItem (blog/signals.py) invalidate the cached sidebar tags.
+        TaggedItem.objects.filter(content_type=ContentType.objects.get_for_model(self.model), object_id__in=post_ids,
+                                  tag__name__in=names).delete()
+        return self.model.objects.filter(pk__in=post_ids)._bulk_change()
+
+    def bulk_delete(self):
+        """
+        Deletes the posts with their comments, tags, similar posts lists and view statistics: one DELETE query per
+        table, then one correction of everything the signals would have corrected for every post and every comment
+        (the counters of the site and of the authors, the similar posts lists that listed the deleted posts and the
+        cached sidebar). Returns the number of deleted posts.
+
+        delete() sends post_delete for every post, every tagged item and every comment (replies included), and each of
+        them runs its receivers: a bulk delete would cost a few queries per comment.
+        """
+        from django.contrib.contenttypes.models import ContentType
+        from taggit.models import TaggedItem
+        from .models import Comment, RelatedPost, PostViewEvent, PostDailyViews, SiteStatistic
+        from .context_processors import bump_sidebar_version
+        from .conditions import bump_posts_version
+
+        post_ids = list(self.values_list("id", flat=True))
+        if not post_ids:
+            return 0
+        posts = self.model.objects.filter(pk__in=post_ids)
+        public = posts.filter(is_public=True).count()
+        author_ids = list(posts.order_by().values_list("author_id", flat=True).distinct())
+        comments = Comment.objects.filter(post__in=post_ids)
+        comment_counts = comments.aggregate(total=models.Count("id"),
+                                            unread=models.Count("id", filter=models.Q(read=False)))
+        # The lists of the other posts that show one of the deleted posts must find new neighbours.
+        referrer_ids = set(RelatedPost.objects.filter(related__in=post_ids).exclude(post__in=post_ids).values_list(
+            "post_id", flat=True))
+
+        # _raw_delete() is one DELETE query, without loading the rows nor sending signals. The rows that point to the
+        # posts go first (the replies are deleted with the comments they answer, in the same query).
+        for rows in (
+            TaggedItem.objects.filter(content_type=ContentType.objects.get_for_model(self.model),
+                                      object_id__in=post_ids),
+            comments,
+            RelatedPost.objects.filter(models.Q(post__in=post_ids) | models.Q(related__in=post_ids)),
+            PostViewEvent.objects.filter(post__in=post_ids),
+            PostDailyViews.objects.filter(post__in=post_ids),
+            posts,
+        ):
+            rows._raw_delete(rows.db)
+
+        SiteStatistic.objects.increment("posts", -len(post_ids))
+        SiteStatistic.objects.increment("public_posts", -public)
+        SiteStatistic.objects.increment("comments", -comment_counts["total"])
+        SiteStatistic.objects.increment("unread_comments", -comment_counts["unread"])
+        Comment.objects.refresh_author_counters(author_ids)
+        # Every affected list is rebuilt once, even when it listed several of the deleted posts.
+        for referrer in self.model.objects.filter(pk__in=referrer_ids).only("id", "category_id"):
+            RelatedPost.objects.rebuild_for(referrer)
+        bump_sidebar_version()
+        bump_posts_version()
+        return len(post_ids)
+
+    def summaries(self):
+        """
+        The list projection of posts: everything a post card needs, and nothing more. The content (the whole body of
+        the post, usually the biggest column by far) and the search vector are not loaded; the author and the category
+        come in the same query (JOIN) and the tags of the whole page in one extra query, instead of one query per card.
+        Every list of posts (blog, pages and admins) should start from here.
+        """
+        return self.defer("content", "search_vector").select_related("author", "category").prefetch_related("tags")
+
+    def jalali_archive(self):
+        """
+        The number of posts of every Jalali month, newest month first, as (jalali_year, jalali_month, posts_count)
+        rows: one grouped query on the stored jalali_year/jalali_month columns.
+        """
+        return self.exclude(jalali_year__isnull=True).values_list("jalali_year", "jalali_month").annotate(
+            posts_count=models.Count("id")).order_by("-jalali_year", "-jalali_month")
+
+
+class ActivePostManager(models.Manager.from_queryset(PostQuerySet)):
     """
     first we get all objects from the database by
     calling the get_queryset method of the inherited class
     i.e. Manager class using super().get_queryset().
-    After that we are filtering objects having city attribute equal to a_posts
-    and return the filtered objects.
+    After that we are filtering the posts that are public and return the filtered objects.
+
+    The is_public field is maintained when a post or its category is saved, and by the publish_scheduled_posts command
+    for posts whose publishing date arrives later. We still compare pub_datetime with now, so a scheduled post never
+    appears early, even if the command runs late. Both conditions are served by one partial index, with no join.
+
+    The manager also has the methods of PostQuerySet, for example Post.actives.jalali_archive().
     """
 
     def get_queryset(self):
-        return super().get_queryset().filter(active=True).exclude(status="0").\
-            filter(pub_datetime__lte=timezone.now()).exclude(category__active=False)
+        return super().get_queryset().filter(is_public=True, pub_datetime__lte=timezone.now())
+
+
+# The number of digits of one id in the path of a comment.
+COMMENT_PATH_STEP = 10
+
+
+class CommentQuerySet(models.QuerySet):
+    """
+    The comments of a post are a tree (replies have a parent). Every comment stores its materialized path: the ids of
+    its ancestors and its own id, each padded to COMMENT_PATH_STEP digits, so "0000000012" is a first-level comment and
+    "00000000120000000031" is a reply to it. Sorting by path gives the whole tree in reading order (every comment is
+    followed by its replies), so a page of the tree is one indexed range query, at any depth, without recursive queries
+    or one query per level.
+    """
+
+    def thread_page(self, post, after=None, per_page=20):
+        """
+        Returns the approved comments of the post that come after the path "after" (a cursor from the previous page),
+        in tree order, and the cursor of the next page (or None). Their authors, and the authors of the comments they
+        reply to, are joined in the same query.
+        """
+        comments = self.filter(post=post, active=True).select_related("author", "parent__author").order_by("path")
+        if after and after.isdigit() and not len(after) % COMMENT_PATH_STEP:
+            comments = comments.filter(path__gt=after)
+        # One extra row tells us if there is a next page, without any COUNT(*) query (the total is Post.comments_count).
+        comments = list(comments[:per_page + 1])
+        next_cursor = comments[per_page - 1].path if len(comments) > per_page else None
+        return comments[:per_page], next_cursor
+
+    def moderation_queue(self, user, queue="unread"):
+        """
+        The comments an admin has to look at, for the keyset pages of the moderation queue (newest first, read
+        blog_comment_unread_idx): "unread" (every comment nobody has read yet) or "pending" (the unread comments that
+        are not approved yet). Authors only see the comments of their own posts, superusers every comment.
+        """
+        comments = self.filter(read=False)
+        if queue == "pending":
+            comments = comments.filter(active=False)
+        if not user.is_superuser:
+            comments = comments.filter(post__author=user)
+        return comments.select_related("post", "author").only(
+            "id", "title", "text", "active", "read", "datetime_created", "parent_id", "post__id", "post__title",
+            "post__slug", "author__id", "author__username", "author__first_name", "author__last_name",
+            "author__avatar")
+
+    def _bulk_change(self, **fields):
+        """
+        Updates the comments of this queryset with one UPDATE query and corrects the counters that the signals would
+        have corrected for each of them (read refresh_counters). Returns the ids of the comments.
+        """
+        from .models import SiteStatistic
+
+        rows = list(self.values_list("id", "post_id"))
+        comments = self.model.objects.filter(pk__in=[pk for pk, _ in rows])
+        unread = comments.filter(read=False).count()
+        comments.update(**fields)
+        SiteStatistic.objects.increment("unread_comments", comments.filter(read=False).count() - unread)
+        self.model.objects.refresh_counters({post_id for _, post_id in rows}, commented="active" in fields)
+        return [pk for pk, _ in rows]
+
+    def approve(self):
+        return self._bulk_change(active=True, read=True)
+
+    def reject(self):
+        # Rejected comments stay (hidden and read), so they leave the queue but can still be approved later.
+        return self._bulk_change(active=False, read=True)
+
+    def mark_read(self):
+        return self._bulk_change(read=True)
+
+    def refresh_counters(self, post_ids, commented=False):
+        """
+        Recounts the approved and unread comments of the given posts (Post.comments_count and unread_comments_count)
+        and the unread comments of their authors (CustomUser.unread_comments_count): two UPDATE queries with a
+        correlated COUNT per post and per author. Only the given posts and their authors are recounted, so a bulk
+        action costs the same on a blog of any size.
+        """
+        from .models import Post
+
+        def count(comments, field):
+            return Coalesce(models.Subquery(comments.values(field).annotate(count=models.Count("id")).values(
+                "count")), 0)
+
+        posts = Post.objects.filter(pk__in=post_ids)
+        fields = {"datetime_commented": timezone.now()} if commented else {}
+        posts.update(
+            comments_count=count(self.model.objects.filter(post=models.OuterRef("pk"), active=True), "post"),
+            unread_comments_count=count(self.model.objects.filter(post=models.OuterRef("pk"), read=False), "post"),
+            **fields)
+        self.refresh_author_counters(posts.values("author_id"))
+
+    def refresh_author_counters(self, author_ids):
+        """
+        Recounts the unread comments of the given users (CustomUser.unread_comments_count) with one UPDATE query.
+        """
+        from django.contrib.auth import get_user_model
+
+        unread = self.model.objects.filter(post__author=models.OuterRef("pk"), read=False)
+        get_user_model().objects.filter(pk__in=author_ids).update(unread_comments_count=Coalesce(models.Subquery(
+            unread.values("post__author").annotate(count=models.Count("id")).values("count")), 0))
+
+
+class RelatedPostManager(models.Manager):
+    """
+    This manager builds the precomputed "similar posts" lists (the RelatedPost model). Building a list is the heavy
+    part (it joins the tags of many posts), but it only happens when a post is saved or its tags change, never when a
+    reader opens a post.
+    """
+
+    RELATED_POSTS_SIZE = 6
+
+    def rebuild_for(self, post):
+        """
+        Rebuilds the similar posts list of one post and returns the ids of the posts in it.
+        """
+        # The models module imports this module, so we import the models here to avoid a circular import.
+        from taggit.models import TaggedItem
+        from django.contrib.contenttypes.models import ContentType
+        from .models import Post
+
+        self.filter(post=post).delete()
+        if not Post.actives.filter(pk=post.pk).exists():
+            return []
+
+        tag_ids = set(post.tags.values_list("id", flat=True))
+        scored = []
+        if tag_ids:
+            # First the number of shared tags of every candidate, then the total number of tags of each candidate.
+            shared_tags = dict(
+                Post.actives.exclude(pk=post.pk).filter(tags__in=tag_ids).annotate(
+                    same_tags=models.Count("tags", distinct=True)).values_list("id", "same_tags")
+            )
+            total_tags = dict(
+                TaggedItem.objects.filter(content_type=ContentType.objects.get_for_model(Post),
+                                          object_id__in=shared_tags.keys()).values("object_id").annotate(
+                    total=models.Count("id")).values_list("object_id", "total")
+            )
+            for post_id, same_tags in shared_tags.items():
+                union = len(tag_ids) + total_tags.get(post_id, same_tags) - same_tags
+                scored.append((same_tags / union, post_id))
+            # Higher score first, newer post (higher id) first when scores are equal.
+            scored.sort(reverse=True)
+            scored = scored[:self.RELATED_POSTS_SIZE]
+
+        # Not enough posts with shared tags, fill the list with the newest posts of the same category.
+        missing = self.RELATED_POSTS_SIZE - len(scored)
+        if missing > 0:
+            chosen = [post_id for _, post_id in scored] + [post.pk]
+            scored += [
+                (0, post_id) for post_id in Post.actives.filter(category_id=post.category_id).exclude(pk__in=chosen)
+                .order_by("-pub_datetime").values_list("id", flat=True)[:missing]
+            ]
+
+        self.bulk_create([
+            self.model(post=post, related_id=post_id, score=score, rank=rank)
+            for rank, (score, post_id) in enumerate(scored)
+        ])
+        return [post_id for _, post_id in scored]
+
+    def rebuild_around(self, post, extra_post_ids=()):
+        """
+        Rebuilds the list of a post and the lists of its neighbours: the posts that list it now and the posts it is
+        similar to (Jaccard similarity is symmetric, so those are the lists it is most likely to enter). This keeps
+        the update incremental; "manage.py rebuild_related_posts" rebuilds every list from scratch.
+        """
+        from .models import Post
+
+        neighbour_ids = set(self.filter(related=post).values_list("post_id", flat=True))
+        neighbour_ids.update(self.rebuild_for(post))
+        neighbour_ids.update(extra_post_ids)
+        neighbour_ids.discard(post.pk)
+        for neighbour in Post.objects.filter(pk__in=neighbour_ids):
+            self.rebuild_for(neighbour)
+
+    def rebuild_around_many(self, posts):
+        """
+        rebuild_around for many posts at once (the bulk actions of the admins): every list is rebuilt only once, even
+        when it is the neighbour of several of the posts.
+        """
+        from .models import Post
+
+        posts = list(posts)
+        post_ids = {post.pk for post in posts}
+        neighbour_ids = set(self.filter(related__in=post_ids).values_list("post_id", flat=True))
+        for post in posts:
+            neighbour_ids.update(self.rebuild_for(post))
+        for neighbour in Post.objects.filter(pk__in=neighbour_ids - post_ids).only("id", "category_id"):
+            self.rebuild_for(neighbour)
+
+
+class SiteStatisticManager(models.Manager):
+    """
+    Reads and maintains the counters of the admin portal (the SiteStatistic model). A counter is changed with
+    "UPDATE ... SET value = value + N" (an F() expression) in the transaction of the change itself, so a rolled back
+    post or comment never leaves a wrong counter behind.
+    """
+
+    # The names of the counters (get_exact_counts shows how each one is counted).
+    STATISTICS = ("posts", "public_posts", "comments", "unread_comments", "users")
+
+    def get_exact_counts(self, names=STATISTICS):
+        from django.contrib.auth import get_user_model
+        from .models import Post, Comment
+
+        querysets = {
+            "posts": Post.objects.all(),
+            "public_posts": Post.actives.all(),
+            "comments": Comment.objects.all(),
+            "unread_comments": Comment.objects.filter(read=False),
+            "users": get_user_model().objects.all(),
+        }
+        return {name: querysets[name].count() for name in names}
+
+    def get_approximate_tables(self):
+        """
+        The counters that count a whole table, and so can be read from the statistics of the PostgreSQL planner.
+        """
+        from django.contrib.auth import get_user_model
+        from .models import Post, Comment
+
+        return {
+            "posts": Post._meta.db_table,
+            "comments": Comment._meta.db_table,
+            "users": get_user_model()._meta.db_table,
+        }
+
+    def increment(self, name, amount=1):
+        if not amount:
+            return
+        # A missing counter is not created here: get_values() counts it exactly the first time it is read.
+        self.filter(name=name).update(value=models.F("value") + amount)
+
+    def get_values(self, approximate=False):
+        """
+        Returns all the counters as a dict, in one query. With approximate=True, the counters of whole tables come from
+        pg_class.reltuples instead: the number of rows the planner estimated at the last VACUUM/ANALYZE. It is only an
+        estimate (usually within a few percent), but it needs no counter at all, which suits the biggest tables.
+        """
+        if approximate and connection.vendor == "postgresql":
+            tables = self.get_approximate_tables()
+            sql = ["SELECT name, value FROM {}".format(self.model._meta.db_table)]
+            params = []
+            for name, table in tables.items():
+                sql.append("SELECT %s, reltuples::bigint FROM pg_class WHERE oid = %s::regclass")
+                params += ["~" + name, table]
+            with connection.cursor() as cursor:
+                cursor.execute(" UNION ALL ".join(sql), params)
+                rows = dict(cursor.fetchall())
+            values = {name: value for name, value in rows.items() if not name.startswith("~")}
+            for name in tables:
+                # A table that was never analyzed has reltuples -1 (or 0 on old PostgreSQL versions).
+                if rows.get("~" + name, 0) > 0:
+                    values[name] = rows["~" + name]
+        else:
+            values = dict(self.values_list("name", "value"))
+
+        missing = [name for name in self.STATISTICS if name not in values]
+        if missing:
+            values.update(self.reconcile(missing))
+        return values
+
+    def reconcile(self, names=STATISTICS):
+        """
+        Counts the given counters exactly and stores the results. Returns {name: value}.
+
+        The row of every counter is locked (SELECT ... FOR UPDATE) before it is counted: a transaction that adds a post
+        at the same time either incremented the counter before (then we wait for it, and our count sees its post) or
+        increments it after we are done (then its post is not in our count, and its increment is not lost).
+        """
+        values = {}
+        for name in names:
+            with transaction.atomic():
+                statistic, _ = self.select_for_update().get_or_create(name=name)
+                statistic.value = self.get_exact_counts([name])[name]
+                statistic.save(update_fields=["value", "datetime_modified"])
+                values[name] = statistic.value
+        return values
+
+
+class PostDailyViewsManager(models.Manager):
+    """
+    Builds the daily views of the posts (the PostDailyViews model) from the raw view events, and reads them back as
+    chart series for the admins.
+    """
+
+    @staticmethod
+    def get_day_range(day):
+        # The local midnights around the day (the day of a view is the day of the readers, not UTC).
+        start = timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+        end = timezone.make_aware(datetime.datetime.combine(day + datetime.timedelta(days=1), datetime.time.min))
+        return start, end
+
+    def rollup(self, day):
+        """
+        (Re)builds the rows of one day from its view events and returns the number of posts viewed that day. The day
+        is rebuilt from scratch, so rolling up the same day again (today, every few minutes) is safe, as long as its
+        events have not been compacted yet.
+        """
+        from .models import PostViewEvent
+
+        views = defaultdict(int)
+        sketches = defaultdict(HyperLogLog)
+        start, end = self.get_day_range(day)
+        events = PostViewEvent.objects.filter(datetime_created__gte=start, datetime_created__lt=end)
+        for post_id, visitor in events.values_list("post_id", "visitor").iterator(chunk_size=5000):
+            views[post_id] += 1
+            # The hash is stored signed (BigIntegerField); the sketch wants the unsigned 64 bits.
+            sketches[post_id].add(visitor & 0xFFFFFFFFFFFFFFFF)
+
+        with transaction.atomic():
+            self.filter(date=day).delete()
+            self.bulk_create([
+                self.model(post_id=post_id, date=day, views=count, visitors=len(sketches[post_id]),
+                           visitors_sketch=sketches[post_id].to_bytes())
+                for post_id, count in views.items()
+            ], batch_size=1000)
+        return len(views)
+
+    def get_series(self, first_day, last_day, post=None):
+        """
+        The views and the distinct visitors of every day between first_day and last_day (of one post, or of the whole
+        blog), days without views included, plus the distinct visitors of the whole range. Returns (series, visitors)
+        where series is a list of {"date", "label", "views", "visitors"} dicts, ready for a chart.
+
+        For one post, the distinct visitors of the range are estimated by merging the daily sketches. For the whole
+        blog only the views are summed by the database (one grouped query); adding up the visitors of every post
+        would count a reader of two posts twice, so there are no visitors in that case.
+        """
+        rows = self.filter(date__range=(first_day, last_day))
+        total = None
+        if post is not None:
+            days = {}
+            total = HyperLogLog()
+            for date, views, visitors, sketch in rows.filter(post=post).values_list(
+                    "date", "views", "visitors", "visitors_sketch"):
+                days[date] = (views, visitors)
+                if sketch:
+                    total.merge(HyperLogLog.from_bytes(sketch))
+            total = len(total)
+        else:
+            days = {date: (views, None) for date, views in rows.order_by().values_list("date").annotate(
+                views=models.Sum("views")).values_list("date", "views")}
+
+        series = []
+        day = first_day
+        while day <= last_day:
+            jalali_year, jalali_month, jalali_day = gregorian_to_jalali(day.year, day.month, day.day)
+            views, visitors = days.get(day, (0, 0 if post is not None else None))
+            series.append({
+                "date": day.isoformat(),
+                "label": "{} {}".format(jalali_day, JALALI_MONTHS[jalali_month - 1]),
+                "views": views,
+                "visitors": visitors,
+            })
+            day += datetime.timedelta(days=1)
+        return series, total
@@ -0,0 +1,17 @@
+# Generated by Django 4.0.6 on 2026-10-18 07:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0041_remove_category_banner'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-pub_datetime', '-id'], name='blog_post_pub_datetime_id_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.0.6 on 2026-10-18 08:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0042_post_pub_datetime_id_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedPost',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(default=0, verbose_name='امتیاز شباهت')),
+                ('rank', models.PositiveSmallIntegerField(default=0, verbose_name='رتبه')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_posts', to='blog.post', verbose_name='پست')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_to_posts', to='blog.post', verbose_name='پست مشابه')),
+            ],
+            options={
+                'verbose_name': 'پست مشابه',
+                'verbose_name_plural': 'پست های مشابه',
+                'ordering': ('post', 'rank'),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='relatedpost',
+            index=models.Index(fields=['post', 'rank'], name='blog_relatedpost_rank_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='relatedpost',
+            constraint=models.UniqueConstraint(fields=('post', 'related'), name='blog_relatedpost_unique_pair'),
+        ),
+    ]
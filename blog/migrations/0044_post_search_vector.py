@@ -0,0 +1,35 @@
+# Generated by Django 4.0.6 on 2026-10-18 08:02
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+
+
+def fill_search_vectors(apps, schema_editor):
+    # The search only reads the stored vectors, so the existing posts are indexed here, with one UPDATE query and the
+    # document of Post.get_search_vector() (the historical model has no such method). Larger tables can be indexed
+    # later, in parallel batches, with "manage.py reindex_post_search".
+    Post = apps.get_model("blog", "Post")
+    Post.objects.update(search_vector=SearchVector("title", weight="A") + SearchVector("description", weight="B") +
+                        SearchVector("content", weight="C"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0043_relatedpost'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='blog_post_search_vector_idx'),
+        ),
+        migrations.RunPython(fill_search_vectors, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.0.6 on 2026-10-18 08:04
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def fill_is_public(apps, schema_editor):
+    Post = apps.get_model("blog", "Post")
+    Post.objects.filter(active=True, status="1", category__active=True, pub_datetime__lte=timezone.now())\
+        .update(is_public=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0044_post_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='is_public',
+            field=models.BooleanField(default=False, editable=False, verbose_name='قابل مشاهده برای خوانندگان'),
+        ),
+        migrations.RunPython(fill_is_public, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(('is_public', True)), fields=['-pub_datetime', '-id'], name='blog_post_public_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.0.6 on 2026-10-18 08:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0045_post_is_public'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-datetime_modified'], name='blog_post_modified_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.0.6 on 2026-10-18 08:25
+
+from django.db import migrations, models
+
+from blog.management.commands.backfill_jalali_dates import fill_jalali_dates
+
+
+def fill_post_jalali_dates(apps, schema_editor):
+    # The archive only reads the stored year and month, so the existing posts get them here.
+    fill_jalali_dates(apps.get_model("blog", "Post").objects.all(), 2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0046_post_modified_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='jalali_month',
+            field=models.PositiveSmallIntegerField(editable=False, null=True, verbose_name='ماه انتشار (شمسی)'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='jalali_year',
+            field=models.PositiveSmallIntegerField(editable=False, null=True, verbose_name='سال انتشار (شمسی)'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(('is_public', True)), fields=['jalali_year', 'jalali_month', '-pub_datetime', '-id'], name='blog_post_jalali_archive_idx'),
+        ),
+        migrations.RunPython(fill_post_jalali_dates, migrations.RunPython.noop),
+    ]
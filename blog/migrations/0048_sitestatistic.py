@@ -0,0 +1,45 @@
+# Generated by Django 4.0.6 on 2026-10-18 08:34
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def fill_site_statistics(apps, schema_editor):
+    SiteStatistic = apps.get_model("blog", "SiteStatistic")
+    Post = apps.get_model("blog", "Post")
+    Comment = apps.get_model("blog", "Comment")
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    SiteStatistic.objects.bulk_create([
+        SiteStatistic(name="posts", value=Post.objects.count()),
+        SiteStatistic(name="public_posts",
+                      value=Post.objects.filter(is_public=True, pub_datetime__lte=timezone.now()).count()),
+        SiteStatistic(name="comments", value=Comment.objects.count()),
+        SiteStatistic(name="users", value=User.objects.count()),
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('blog', '0047_post_jalali_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SiteStatistic',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='نام')),
+                ('value', models.BigIntegerField(default=0, verbose_name='مقدار')),
+                ('datetime_modified', models.DateTimeField(auto_now=True, verbose_name='تاریخ و زمان آخرین تغییر')),
+            ],
+            options={
+                'verbose_name': 'آمار سایت',
+                'verbose_name_plural': 'آمار سایت',
+                'ordering': ('name',),
+            },
+        ),
+        migrations.RunPython(fill_site_statistics, migrations.RunPython.noop),
+    ]
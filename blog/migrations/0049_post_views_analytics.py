@@ -0,0 +1,57 @@
+# Generated by Django 4.0.6 on 2026-10-18 08:38
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0048_sitestatistic'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostViewEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('visitor', models.BigIntegerField(verbose_name='بازدیدکننده')),
+                ('datetime_created', models.DateTimeField(default=django.utils.timezone.now, verbose_name='تاریخ و زمان بازدید')),
+                ('post', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='view_events', to='blog.post', verbose_name='پست')),
+            ],
+            options={
+                'verbose_name': 'بازدید',
+                'verbose_name_plural': 'بازدید ها',
+            },
+        ),
+        migrations.CreateModel(
+            name='PostDailyViews',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='تاریخ')),
+                ('views', models.PositiveIntegerField(default=0, verbose_name='بازدید ها')),
+                ('visitors', models.PositiveIntegerField(default=0, verbose_name='بازدیدکنندگان (تقریبی)')),
+                ('visitors_sketch', models.BinaryField(default=b'', verbose_name='طرح بازدیدکنندگان')),
+                ('post', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='daily_views', to='blog.post', verbose_name='پست')),
+            ],
+            options={
+                'verbose_name': 'بازدید روزانه',
+                'verbose_name_plural': 'بازدید های روزانه',
+                'ordering': ('post', 'date'),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='postviewevent',
+            index=django.contrib.postgres.indexes.BrinIndex(fields=['datetime_created'], name='blog_postviewevent_brin_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='postdailyviews',
+            index=models.Index(fields=['date'], name='blog_postdailyviews_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='postdailyviews',
+            constraint=models.UniqueConstraint(fields=('post', 'date'), name='blog_postdailyviews_unique_day'),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 4.0.6 on 2026-10-18 08:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Cast, Coalesce, LPad
+
+
+def fill_comment_threads(apps, schema_editor):
+    # The existing comments have no parent: their path is their own (padded) id.
+    Comment = apps.get_model("blog", "Comment")
+    Post = apps.get_model("blog", "Post")
+    Comment.objects.filter(path="").update(path=LPad(Cast("id", models.CharField()), 10, models.Value("0")))
+    # One UPDATE query for all the commented posts, with the count of each post in a subquery (like 0051).
+    approved = Comment.objects.filter(active=True)
+    Post.objects.filter(pk__in=approved.values("post_id")).update(comments_count=Coalesce(Subquery(
+        approved.filter(post=OuterRef("pk")).values("post").annotate(count=Count("id")).values("count")), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0049_post_views_analytics'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='عمق'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='replies', to='blog.comment', verbose_name='در پاسخ به'),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(default='', editable=False, max_length=255, verbose_name='مسیر'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='تعداد نظرات تایید شده'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='datetime_commented',
+            field=models.DateTimeField(editable=False, null=True, verbose_name='آخرین تغییر نظرات'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(condition=models.Q(('active', True)), fields=['post', 'path'], name='blog_comment_thread_idx'),
+        ),
+        migrations.RunPython(fill_comment_threads, migrations.RunPython.noop),
+    ]
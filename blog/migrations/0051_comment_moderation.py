@@ -0,0 +1,45 @@
+# Generated by Django 4.0.6 on 2026-10-18 08:57
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_unread(comments, field):
+    return Coalesce(Subquery(comments.values(field).annotate(count=Count("id")).values("count")), 0)
+
+
+def fill_unread_comments_counts(apps, schema_editor):
+    Comment = apps.get_model("blog", "Comment")
+    Post = apps.get_model("blog", "Post")
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    SiteStatistic = apps.get_model("blog", "SiteStatistic")
+    unread = Comment.objects.filter(read=False)
+    SiteStatistic.objects.update_or_create(name="unread_comments", defaults={"value": unread.count()})
+    Post.objects.filter(pk__in=unread.values("post_id")).update(
+        unread_comments_count=count_unread(unread.filter(post=OuterRef("pk")), "post"))
+    User.objects.filter(pk__in=unread.values("post__author_id")).update(
+        unread_comments_count=count_unread(unread.filter(post__author=OuterRef("pk")), "post__author"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('accounts', '0004_customuser_unread_comments_count'),
+        ('blog', '0050_comment_threads'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='unread_comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='نظرات خوانده نشده'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(condition=models.Q(('read', False)), fields=['-datetime_created', '-id'], name='blog_comment_unread_idx'),
+        ),
+        migrations.RunPython(fill_unread_comments_counts, migrations.RunPython.noop),
+    ]
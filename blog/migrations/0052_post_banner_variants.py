@@ -0,0 +1,18 @@
+# Generated by Django 4.0.6 on 2026-10-18 09:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0051_comment_moderation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='banner_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='نسخه های بنر'),
+        ),
+    ]
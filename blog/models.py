@@ -5,11 +5,16 @@ from django.contrib.auth import get_user_model
 from django.utils.html import format_html
 from django.urls import reverse
 
+from django.contrib.postgres.indexes import BrinIndex, GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+
 from ckeditor_uploader.fields import RichTextUploadingField
 from taggit.managers import TaggableManager
 
-from extensions.utils import get_jalali_date
-from .managers import ActivePostManager
+from extensions.utils import get_jalali_date, gregorian_to_jalali
+from extensions.images import get_variant_url
+from .managers import (COMMENT_PATH_STEP, PostQuerySet, ActivePostManager, CommentQuerySet, RelatedPostManager,
+                       SiteStatisticManager, PostDailyViewsManager)
 
 # Create your models here.
 
@@ -39,6 +44,11 @@ class Category(models.Model):
         
         ordering = ("-datetime_modified", )
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Activating or deactivating a category shows or hides all of its posts (Post.is_public).
+        self.category_blog_posts.all().refresh_is_public()
+
     # In the following two functions, we specify the names (identifiers) related to our model (class).
     def __unicode__(self):
         if len(str(self.title)) <= 25:
@@ -85,6 +95,9 @@ class Post(models.Model):
 
     banner = models.ImageField(_("بنر"), upload_to="blog/post/", blank=True,
                                default="defaults/blog_post_default_banner.png")
+    # The resized copies of the banner (in its format and in WebP) and their sizes, built when a new banner is saved
+    # (blog/signals.py) and by "manage.py build_image_variants" for existing files. Read extensions/images.py.
+    banner_variants = models.JSONField(_("نسخه های بنر"), default=dict, blank=True, editable=False)
     title = models.CharField(_("عنوان"), max_length=225)
 
     # To use this field, you must be familiar with the Django CKEditor package. This package allows you to have a
@@ -107,8 +120,27 @@ class Post(models.Model):
     status = models.CharField(_("وضعیت"), max_length=225, choices=STATUS_CHOICES, default="0")
     active = models.BooleanField(_("وضعیت فعال سازی"), default=True)
     views = models.PositiveBigIntegerField(_("بازدید ها"), default=0, blank=True)
+    # Whether readers can see the post: active, published, active category and a publishing date in the past. It is
+    # computed in save() (and in Category.save() and by "manage.py publish_scheduled_posts"), never edited by hand.
+    is_public = models.BooleanField(_("قابل مشاهده برای خوانندگان"), default=False, editable=False)
+    # The full-text search document of the post (title, description and content), stored so that searches do not have
+    # to tokenise every post again. It is filled after each save (blog/signals.py) and by "manage.py
+    # reindex_post_search" for existing posts.
+    search_vector = SearchVectorField(null=True, editable=False)
+    # The Jalali year and month of pub_datetime (in the local time), stored so that the archive pages can find the
+    # posts of a month with an index, instead of converting the date of every post. They are computed in save() and by
+    # "manage.py backfill_jalali_dates" for existing posts.
+    jalali_year = models.PositiveSmallIntegerField(_("سال انتشار (شمسی)"), null=True, editable=False)
+    jalali_month = models.PositiveSmallIntegerField(_("ماه انتشار (شمسی)"), null=True, editable=False)
+    # The number of approved comments and the time one was last approved, hidden or deleted. They are kept up to date
+    # by the signals of the comments (blog/signals.py), so the page of a post never counts its comments, and the
+    # second one is part of the version stamp of the post page (blog/conditions.py).
+    comments_count = models.PositiveIntegerField(_("تعداد نظرات تایید شده"), default=0, editable=False)
+    datetime_commented = models.DateTimeField(_("آخرین تغییر نظرات"), null=True, editable=False)
+    # The number of unread comments of the post (the moderation queue of the admins), kept like comments_count.
+    unread_comments_count = models.PositiveIntegerField(_("نظرات خوانده نشده"), default=0, editable=False)
     # Managers
-    objects = models.Manager()
+    objects = PostQuerySet.as_manager()
     actives = ActivePostManager()
 
     def get_pub_datetime_jalali_date(self):
@@ -117,12 +149,25 @@ class Post(models.Model):
         the Gregorian date and converting it to Solar/Jalali. If you have read the files carefully, there is a file
         in "extensions" directory called "utils.py" in which the contents of this method are written
         (and we have explained about it in full)
+
+        List views convert a whole page at once with set_jalali_dates (also in "utils.py"), which leaves the result on
+        the post as jalali_pub_datetime.
         """
+        if getattr(self, "jalali_pub_datetime", None):
+            return self.jalali_pub_datetime
         return get_jalali_date(self.pub_datetime)
     # This command is related to the above method (get_pub_datetime_jalali). Here we specify what the external name of
     # the method (what is displayed) is.
     get_pub_datetime_jalali_date.short_description = _("تاریخ انتشار")
 
+    @staticmethod
+    def get_search_vector():
+        """
+        Returns the expression that builds the search document of a post. Weights: A -> 1.0, B -> 0.4, C -> 0.2
+        """
+        return SearchVector("title", weight="A") + SearchVector("description", weight="B") + \
+            SearchVector("content", weight="C")
+
     # This function (as shown above) is responsible for creating a small banner to display in the admin panel.
     # Note that this whole function returns a normal string, but for security reasons Django does not display it.
     # In fact, our HTML and CSS commands will not be applied. For this reason, we use the format_html function,
@@ -132,7 +177,7 @@ class Post(models.Model):
         <span>
             <img src="{}" style="height: 95.5px; width: 135.5px;" />
         </span>
-        """.format(self.banner.url))
+        """.format(get_variant_url(self.banner, self.banner_variants, 271)))
     get_banner_thumbnail.short_description = _("بنرِ پست")
 
     class Meta:
@@ -156,6 +201,35 @@ class Post(models.Model):
         # want in the lower variable/Tuple.
         ordering = ("-datetime_modified", )
 
+        # Public lists are paginated with cursors on (pub_datetime, id); this index lets the database jump straight to
+        # the cursor instead of scanning (OFFSET) all the posts before it.
+        indexes = [
+            models.Index(fields=["-pub_datetime", "-id"], name="blog_post_pub_datetime_id_idx"),
+            GinIndex(fields=["search_vector"], name="blog_post_search_vector_idx"),
+            # Only public posts are in this index, so public lists read it without any join or extra condition.
+            models.Index(fields=["-pub_datetime", "-id"], name="blog_post_public_idx",
+                         condition=models.Q(is_public=True)),
+            # The newest change of any post is the version stamp of the public lists (blog/conditions.py).
+            models.Index(fields=["-datetime_modified"], name="blog_post_modified_idx"),
+            # The Jalali archive: the public posts of one month, newest first, and the number of posts of each month.
+            models.Index(fields=["jalali_year", "jalali_month", "-pub_datetime", "-id"],
+                         name="blog_post_jalali_archive_idx", condition=models.Q(is_public=True)),
+        ]
+
+    def get_is_public(self):
+        return self.active and self.status == "1" and self.category.active and self.pub_datetime <= timezone.now()
+
+    def get_jalali_year_month(self):
+        pub_datetime = timezone.localtime(self.pub_datetime)
+        return gregorian_to_jalali(pub_datetime.year, pub_datetime.month, pub_datetime.day)[:2]
+
+    def save(self, *args, **kwargs):
+        self.is_public = self.get_is_public()
+        self.jalali_year, self.jalali_month = self.get_jalali_year_month()
+        if kwargs.get("update_fields") is not None:
+            kwargs["update_fields"] = set(kwargs["update_fields"]) | {"is_public", "jalali_year", "jalali_month"}
+        super().save(*args, **kwargs)
+
     def get_absolute_url(self):
         return reverse("blog:post_detail", args=[self.slug])
 
@@ -189,7 +263,29 @@ class Comment(models.Model):
     text = models.TextField(_("متن نظر"))
     active = models.BooleanField(_("وضعیت فعال سازی"), default=False)
     read = models.BooleanField(_("خوانده شده"), default=False)
-    
+    # Threads: a reply points to the comment it answers. The materialized path (read CommentQuerySet in
+    # blog/managers.py) and the depth are computed in save().
+    parent = models.ForeignKey(verbose_name=_("در پاسخ به"), to="self", on_delete=models.CASCADE, null=True,
+                               blank=True, related_name="replies")
+    path = models.CharField(_("مسیر"), max_length=255, default="", editable=False)
+    depth = models.PositiveSmallIntegerField(_("عمق"), default=0, editable=False)
+    objects = CommentQuerySet.as_manager()
+
+    # Replies to a comment this deep are added next to it (to its parent) instead of one level deeper.
+    MAX_DEPTH = 4
+
+    def save(self, *args, **kwargs):
+        if self.parent_id and self._state.adding:
+            if self.parent.depth >= self.MAX_DEPTH:
+                self.parent = self.parent.parent
+            self.post_id = self.parent.post_id
+            self.depth = self.parent.depth + 1
+        super().save(*args, **kwargs)
+        if not self.path:
+            # The path ends with the id, which only exists after the INSERT.
+            self.path = (self.parent.path if self.parent_id else "") + str(self.pk).zfill(COMMENT_PATH_STEP)
+            Comment.objects.filter(pk=self.pk).update(path=self.path)
+
     def get_text_thumbnail(self):
         if len(str(self.text)) <= 25:
             return format_html("""
@@ -211,6 +307,14 @@ class Comment(models.Model):
         
         ordering = ("-datetime_created", )
 
+        indexes = [
+            # The approved comments of a post in tree order, from any path (the pages of CommentQuerySet.thread_page).
+            models.Index(fields=["post", "path"], name="blog_comment_thread_idx", condition=models.Q(active=True)),
+            # The moderation queue of the admins: the unread comments, newest first (keyset pages).
+            models.Index(fields=["-datetime_created", "-id"], name="blog_comment_unread_idx",
+                         condition=models.Q(read=False)),
+        ]
+
     def __unicode__(self):
         return str(self.author)
 
@@ -219,3 +323,124 @@ class Comment(models.Model):
 
     def __repr__(self):
         return str(self.author)
+
+
+class RelatedPost(models.Model):
+    """
+    A precomputed "similar posts" list. For every public post we keep its top RELATED_POSTS_SIZE neighbours, scored by
+    how much their tags overlap (Jaccard similarity: shared tags / all tags of both posts). If there are not enough
+    posts with shared tags, the list is filled with the newest posts of the same category (score 0).
+
+    The list is rebuilt in blog/signals.py whenever the tags or the visibility of a post change, so the detail page
+    reads the similar posts with one indexed query instead of joining the tags of the whole blog on every hit.
+    """
+
+    post = models.ForeignKey(verbose_name=_("پست"), to=Post, on_delete=models.CASCADE, related_name="related_posts")
+    related = models.ForeignKey(verbose_name=_("پست مشابه"), to=Post, on_delete=models.CASCADE,
+                                related_name="related_to_posts")
+    score = models.FloatField(_("امتیاز شباهت"), default=0)
+    rank = models.PositiveSmallIntegerField(_("رتبه"), default=0)
+
+    objects = RelatedPostManager()
+
+    class Meta:
+        verbose_name = _("پست مشابه")
+        verbose_name_plural = _("پست های مشابه")
+
+        ordering = ("post", "rank", )
+        constraints = [
+            models.UniqueConstraint(fields=["post", "related"], name="blog_relatedpost_unique_pair"),
+        ]
+        indexes = [
+            models.Index(fields=["post", "rank"], name="blog_relatedpost_rank_idx"),
+        ]
+
+    def __str__(self):
+        return "{} -> {}".format(self.post, self.related)
+
+
+class PostViewEvent(models.Model):
+    """
+    One view of a post: which post, when, and a (keyed, irreversible) 64-bit hash of the visitor. The events are
+    buffered in memory by blog/counters.py and appended in batches (bulk_create), never updated. The
+    rollup_post_views command sums them into PostDailyViews and deletes the old ones, so this table only holds the
+    last few days.
+    """
+
+    # No index on post: the events are only read by time (rollups) and the table is append-only and short.
+    post = models.ForeignKey(verbose_name=_("پست"), to=Post, on_delete=models.CASCADE, related_name="view_events",
+                             db_index=False)
+    visitor = models.BigIntegerField(_("بازدیدکننده"))
+    datetime_created = models.DateTimeField(_("تاریخ و زمان بازدید"), default=timezone.now)
+
+    class Meta:
+        verbose_name = _("بازدید")
+        verbose_name_plural = _("بازدید ها")
+
+        # Rows are appended in time order, so a BRIN index (a few pages for millions of rows) is enough to find the
+        # events of a day.
+        indexes = [
+            BrinIndex(fields=["datetime_created"], name="blog_postviewevent_brin_idx"),
+        ]
+
+    def __str__(self):
+        return "{} @ {}".format(self.post_id, self.datetime_created)
+
+
+class PostDailyViews(models.Model):
+    """
+    The views of one post in one (local) day: the number of views and the estimated number of distinct visitors, with
+    the HyperLogLog sketch (extensions/sketches.py) of those visitors, so the distinct visitors of several days can be
+    estimated by merging the sketches of the days. Built by the rollup_post_views command from PostViewEvent.
+    """
+
+    # The unique constraint on (post, date) is the index of the post.
+    post = models.ForeignKey(verbose_name=_("پست"), to=Post, on_delete=models.CASCADE, related_name="daily_views",
+                             db_index=False)
+    date = models.DateField(_("تاریخ"))
+    views = models.PositiveIntegerField(_("بازدید ها"), default=0)
+    visitors = models.PositiveIntegerField(_("بازدیدکنندگان (تقریبی)"), default=0)
+    # Emptied (b"") for old days by the rollup_post_views command: the counts stay, only merging is no longer possible.
+    visitors_sketch = models.BinaryField(_("طرح بازدیدکنندگان"), default=b"")
+
+    objects = PostDailyViewsManager()
+
+    class Meta:
+        verbose_name = _("بازدید روزانه")
+        verbose_name_plural = _("بازدید های روزانه")
+
+        ordering = ("post", "date", )
+        constraints = [
+            models.UniqueConstraint(fields=["post", "date"], name="blog_postdailyviews_unique_day"),
+        ]
+        indexes = [
+            # The views of the whole blog per day (the admin portal).
+            models.Index(fields=["date"], name="blog_postdailyviews_date_idx"),
+        ]
+
+    def __str__(self):
+        return "{} @ {}: {}".format(self.post_id, self.date, self.views)
+
+
+class SiteStatistic(models.Model):
+    """
+    The counters of the admin portal (number of posts, public posts, comments and users). Counting them with COUNT(*)
+    reads the whole table on every portal load, so every counter is one row here, kept up to date by blog/signals.py
+    (and by PostQuerySet.refresh_is_public for the queryset updates that send no signal). The reconcile_site_statistics
+    command recounts them from time to time, in case something (bulk_create, raw SQL) changed the tables silently.
+    """
+
+    name = models.CharField(_("نام"), max_length=50, unique=True)
+    value = models.BigIntegerField(_("مقدار"), default=0)
+    datetime_modified = models.DateTimeField(_("تاریخ و زمان آخرین تغییر"), auto_now=True)
+
+    objects = SiteStatisticManager()
+
+    class Meta:
+        verbose_name = _("آمار سایت")
+        verbose_name_plural = _("آمار سایت")
+
+        ordering = ("name", )
+
+    def __str__(self):
+        return "{}: {}".format(self.name, self.value)
@@ -0,0 +1,185 @@
+import logging
+
+from django.contrib.auth import get_user_model
+from django.core.signals import request_started
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
+from django.db.models import F
+from django.dispatch import receiver
+from django.utils import timezone
+
+from taggit.models import Tag, TaggedItem
+
+from extensions.images import refresh_variants
+
+from .models import Post, Category, Comment, RelatedPost, SiteStatistic
+from .counters import post_view_counter
+from .context_processors import bump_sidebar_version
+from .conditions import bump_posts_version
+
+# Create your signals (receivers) here.
+# Signals are connected in BlogConfig.ready() (blog/apps.py), when importing this module.
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender=Post)
+def rebuild_related_posts_on_save(sender, instance, created, raw=False, **kwargs):
+    # Only the visibility of the post (is_public), its category and its publishing date (the order of the posts that
+    # fill the lists) change the similar posts lists, compared with the saved row (remember_is_public_on_save). Most
+    # saves only edit the text. The tags are handled by m2m_changed (rebuild_related_posts_on_tags_change).
+    if raw:
+        return
+    if not created and instance._was_related_state == (instance.is_public, instance.category_id,
+                                                        instance.pub_datetime):
+        return
+    RelatedPost.objects.rebuild_around(instance)
+
+
+@receiver(post_save, sender=Post)
+def update_search_vector_on_save(sender, instance, raw=False, **kwargs):
+    # A queryset update() does not send post_save again, and the database builds the vector from the saved columns.
+    if raw:
+        return
+    Post.objects.filter(pk=instance.pk).update(search_vector=Post.get_search_vector())
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=get_user_model())
+def build_image_variants_on_save(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Only a new banner or avatar is resized: refresh_variants() compares the file with the source of the stored
+    # variants first, so the other saves cost nothing.
+    field_name = "banner" if sender is Post else "avatar"
+    if raw or (update_fields is not None and field_name not in update_fields):
+        return
+    refresh_variants(instance, field_name)
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def rebuild_related_posts_on_tags_change(sender, instance, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear") and isinstance(instance, Post):
+        RelatedPost.objects.rebuild_around(instance)
+
+
+@receiver(pre_delete, sender=Post)
+def remember_related_posts_on_delete(sender, instance, **kwargs):
+    # The rows of this post are deleted by CASCADE, but the posts that listed it must find a new neighbour.
+    instance._related_referrer_ids = list(RelatedPost.objects.filter(related=instance).values_list("post_id",
+                                                                                                  flat=True))
+
+
+@receiver(post_delete, sender=Post)
+def rebuild_related_posts_on_delete(sender, instance, **kwargs):
+    for post in Post.objects.filter(pk__in=getattr(instance, "_related_referrer_ids", [])):
+        RelatedPost.objects.rebuild_for(post)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=TaggedItem)
+@receiver(post_delete, sender=TaggedItem)
+def bump_sidebar_version_on_change(sender, **kwargs):
+    # The cached sidebar tags and categories (blog/context_processors.py) are out of date.
+    bump_sidebar_version()
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def bump_sidebar_version_on_tags_change(sender, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        bump_sidebar_version()
+
+
+@receiver(pre_save, sender=Post)
+def remember_is_public_on_save(sender, instance, **kwargs):
+    # Post.save() has already computed the new is_public; the saved one is still in the database. The category and the
+    # publishing date come with it in the same query, for rebuild_related_posts_on_save.
+    saved = None
+    if not instance._state.adding:
+        saved = Post.objects.filter(pk=instance.pk).values_list("is_public", "category_id", "pub_datetime").first()
+    instance._was_related_state = saved
+    instance._was_public = bool(saved and saved[0])
+
+
+@receiver(post_save, sender=Post)
+def count_post_on_save(sender, instance, created, **kwargs):
+    if created:
+        SiteStatistic.objects.increment("posts")
+    SiteStatistic.objects.increment("public_posts", int(instance.is_public) - int(instance._was_public))
+
+
+@receiver(post_delete, sender=Post)
+def count_post_on_delete(sender, instance, **kwargs):
+    SiteStatistic.objects.increment("posts", -1)
+    if instance.is_public:
+        SiteStatistic.objects.increment("public_posts", -1)
+
+
+@receiver(post_delete, sender=Post)
+def bump_posts_version_on_delete(sender, instance, **kwargs):
+    # The cached and conditional post lists (blog/conditions.py) still list the deleted post.
+    bump_posts_version()
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_save, sender=get_user_model())
+def count_object_on_save(sender, created, **kwargs):
+    if created:
+        SiteStatistic.objects.increment("comments" if sender is Comment else "users")
+
+
+@receiver(post_delete, sender=Comment)
+@receiver(post_delete, sender=get_user_model())
+def count_object_on_delete(sender, **kwargs):
+    SiteStatistic.objects.increment("comments" if sender is Comment else "users", -1)
+
+
+@receiver(pre_save, sender=Comment)
+def remember_comment_state_on_save(sender, instance, **kwargs):
+    instance._was_active, instance._was_read = False, True
+    if not instance._state.adding:
+        instance._was_active, instance._was_read = Comment.objects.filter(pk=instance.pk).values_list(
+            "active", "read").first() or (False, True)
+
+
+def _count_comment_change(comment, approved, unread):
+    """
+    Moves the counters of the comments by the given changes: the approved and unread comments of the post, the unread
+    comments of its author (the badge of the admins portal) and of the whole site. One UPDATE per counter, with F().
+    """
+    fields = {}
+    if approved:
+        fields.update(comments_count=F("comments_count") + approved, datetime_commented=timezone.now())
+    if unread:
+        fields.update(unread_comments_count=F("unread_comments_count") + unread)
+        get_user_model().objects.filter(user_blog_posts=comment.post_id).update(
+            unread_comments_count=F("unread_comments_count") + unread)
+        SiteStatistic.objects.increment("unread_comments", unread)
+    if fields:
+        Post.objects.filter(pk=comment.post_id).update(**fields)
+
+
+@receiver(post_save, sender=Comment)
+def count_comment_on_save(sender, instance, raw=False, **kwargs):
+    # The counters follow the approvals and the readings, without a COUNT(*).
+    if raw:
+        return
+    _count_comment_change(instance, approved=int(instance.active) - int(instance._was_active),
+                          unread=int(instance._was_read) - int(instance.read))
+
+
+@receiver(post_delete, sender=Comment)
+def count_comment_on_delete(sender, instance, **kwargs):
+    # The replies of a deleted comment are deleted by CASCADE, and each of them sends this signal too.
+    _count_comment_change(instance, approved=-int(instance.active), unread=-int(not instance.read))
+
+
+@receiver(request_started)
+def flush_post_views_on_request_started(sender, **kwargs):
+    # Django connects close_old_connections to request_started first, so the flush uses the connection of the request,
+    # which request_finished closes as usual (read PostViewCounter). A failed flush keeps the views in the buffer for
+    # the next one, and must not break the request.
+    try:
+        post_view_counter.flush_if_due()
+    except Exception:
+        logger.exception("Could not flush the buffered post views.")
@@ -1,9 +1,41 @@
-from django.test import TestCase
+import datetime
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.test import TestCase, override_settings
+from django.db import connection
+from django.core.management import call_command
+from django.core.cache import cache
+from django.core.exceptions import PermissionDenied
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.urls import reverse
 from django.utils import timezone
+from django.utils.http import http_date
 from django.contrib.auth import get_user_model
+from django.template import Context, Template
+from PIL import Image
+
+from extensions.paginators import KeysetPaginator
+from extensions.benchmarks import (QueryCounter, count_queries, get_samples, iter_view_urls, load_query_budgets,
+                                   write_query_budgets)
+from extensions.date import jalali
+from extensions import utils
+from extensions.sketches import HyperLogLog, hash64
+from extensions.ratelimit import TokenBucket, get_rejected_counts
+from extensions.images import refresh_variants
+from extensions.middleware import RequestTiming, ServerTimingMiddleware, _current_timing
+from extensions.utils import gregorian_to_jalali, get_jalali_date, get_jalali_dates, get_jalali_today
+from accounts.backends import EmailOrUsernameModelBackend
 
-from .models import Post, Category
+from .models import Post, Category, Comment, RelatedPost, SiteStatistic, PostViewEvent, PostDailyViews
+from .counters import PostViewCounter, post_view_counter
 
 # Create your tests here.
 
@@ -201,3 +233,1196 @@ class PostTestCase(TestCase):
     def test_post_detail_view_have_author_field(self):
         response = self.client.get(reverse("blog:post_detail", kwargs={"slug": self.post.slug}))
         self.assertContains(response, self.post.author)
+
+
+class PostPaginationTestCase(TestCase):
+    """
+    Public post lists are paginated with page numbers for the first pages and with cursors (keyset) for deeper pages.
+    Both modes must show the same posts in the same order.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create(username="author", is_author=True)
+        cls.category = Category.objects.create(title="PAGINATION", slug="pagination", designer=cls.user)
+        now = timezone.now()
+        cls.posts = [
+            Post.objects.create(
+                title="PAGINATION POST {}".format(number),
+                content="PAGINATION",
+                description="PAGINATION {}".format(number),
+                slug="pagination-{}".format(number),
+                pub_datetime=now - datetime.timedelta(hours=number),
+                status="1",
+                category=cls.category,
+                author=cls.user,
+            )
+            for number in range(1, 31)
+        ]
+
+    def test_keyset_paginator_cursor_round_trip(self):
+        paginator = KeysetPaginator(Post.objects.all(), 25)
+        cursor = paginator.encode_cursor(self.posts[0])
+        self.assertEqual(paginator.decode_cursor(cursor), (self.posts[0].pub_datetime, self.posts[0].pk))
+        self.assertIsNone(paginator.decode_cursor("not-a-cursor"))
+
+    def test_keyset_pages_follow_numbered_pages(self):
+        first_page = KeysetPaginator(Post.objects.all(), 25).get_page()
+        self.assertTrue(first_page.has_next())
+        second_page = KeysetPaginator(Post.objects.all(), 25).get_page(after=first_page.next_cursor)
+        self.assertEqual(list(second_page), self.posts[25:])
+        self.assertFalse(second_page.has_next())
+        previous_page = KeysetPaginator(Post.objects.all(), 25).get_page(before=second_page.previous_cursor)
+        self.assertEqual(list(previous_page), list(first_page))
+
+    def test_post_list_view_with_cursor(self):
+        first_page = KeysetPaginator(Post.objects.all(), 25).get_page()
+        response = self.client.get(reverse("blog:post_list"), {"after": first_page.next_cursor})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, self.posts[-1].title)
+        self.assertNotContains(response, self.posts[0].get_absolute_url())
+
+
+class PostViewCounterTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create(username="author", is_author=True)
+        cls.category = Category.objects.create(title="VIEWS", slug="views", designer=cls.user)
+        cls.post = Post.objects.create(
+            title="VIEWS POST",
+            content="VIEWS",
+            description="VIEWS",
+            slug="views-post",
+            pub_datetime=timezone.now() - datetime.timedelta(hours=1),
+            status="1",
+            category=cls.category,
+            author=cls.user,
+        )
+
+    def test_views_are_buffered_and_flushed_without_touching_datetime_modified(self):
+        counter = PostViewCounter(flush_interval=3600, flush_size=1000)
+        for _ in range(3):
+            counter.increment(self.post.id)
+
+        self.assertEqual(counter.pending(self.post.id), 3)
+        self.assertEqual(Post.objects.get(pk=self.post.pk).views, 0)
+
+        self.assertEqual(counter.flush(), 3)
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual(post.views, 3)
+        self.assertEqual(post.datetime_modified, self.post.datetime_modified)
+        self.assertEqual(counter.pending(self.post.id), 0)
+
+    def test_views_are_flushed_after_any_request_once_the_interval_is_over(self):
+        post_view_counter.flush()
+        post_view_counter.increment(self.post.id)
+        self.assertEqual(post_view_counter.flush_if_due(), 0)
+
+        # The next request (of any page) writes the views that waited longer than the interval.
+        post_view_counter._last_flush -= post_view_counter.flush_interval
+        self.client.get(reverse("pages:about"))
+        self.assertEqual(post_view_counter.pending(self.post.id), 0)
+        self.assertEqual(Post.objects.get(pk=self.post.pk).views, 1)
+
+    def test_post_detail_view_counts_the_view(self):
+        post_view_counter.flush()
+        self.client.get(self.post.get_absolute_url())
+        post_view_counter.flush()
+        self.assertEqual(Post.objects.get(pk=self.post.pk).views, 1)
+
+
+class RelatedPostTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create(username="author", is_author=True)
+        cls.category = Category.objects.create(title="RELATED", slug="related", designer=cls.user)
+        cls.other_category = Category.objects.create(title="OTHER", slug="other", designer=cls.user)
+
+    def _create_post(self, slug, category=None, tags=()):
+        post = Post.objects.create(
+            title=slug.upper(),
+            content=slug,
+            description=slug,
+            slug=slug,
+            pub_datetime=timezone.now() - datetime.timedelta(hours=1),
+            status="1",
+            category=category or self.category,
+            author=self.user,
+        )
+        if tags:
+            post.tags.add(*tags)
+        return post
+
+    def test_related_posts_are_ordered_by_tag_overlap(self):
+        post = self._create_post("base", tags=["django", "python", "web"])
+        close = self._create_post("close", category=self.other_category, tags=["django", "python", "web"])
+        far = self._create_post("far", category=self.other_category, tags=["django", "rust", "go", "c"])
+        same_category = self._create_post("same-category")
+
+        related = list(RelatedPost.objects.filter(post=post).values_list("related_id", "score"))
+        self.assertEqual([post_id for post_id, _ in related], [close.id, far.id, same_category.id])
+        self.assertEqual(related[0][1], 1.0)
+        self.assertAlmostEqual(related[1][1], 1 / 6)
+        self.assertEqual(related[2][1], 0)
+
+    def test_related_posts_follow_tag_and_visibility_changes(self):
+        post = self._create_post("base", category=self.other_category, tags=["django"])
+        other = self._create_post("other", category=self.other_category)
+        self.assertFalse(RelatedPost.objects.filter(post=post, related=other, score__gt=0).exists())
+
+        other.tags.add("django")
+        self.assertTrue(RelatedPost.objects.filter(post=post, related=other, score=1.0).exists())
+
+        other.active = False
+        other.save()
+        self.assertFalse(RelatedPost.objects.filter(post=post, related=other).exists())
+        self.assertFalse(RelatedPost.objects.filter(post=other).exists())
+
+    def test_related_posts_are_only_rebuilt_when_the_visibility_or_category_changes(self):
+        post = self._create_post("base", tags=["django"])
+        self._create_post("other", tags=["django"])
+        # A rebuilt list is deleted and created again, with new row ids.
+        row_ids = set(RelatedPost.objects.values_list("id", flat=True))
+
+        post.title = "EDITED"
+        post.content = "EDITED"
+        post.save()
+        self.assertEqual(set(RelatedPost.objects.values_list("id", flat=True)), row_ids)
+
+        post.category = self.other_category
+        post.save()
+        self.assertNotEqual(set(RelatedPost.objects.values_list("id", flat=True)), row_ids)
+
+    def test_posts_without_a_list_get_similar_posts_at_query_time(self):
+        post = self._create_post("base", tags=["django", "python"])
+        close = self._create_post("close", category=self.other_category, tags=["django", "python"])
+        far = self._create_post("far", category=self.other_category, tags=["django"])
+        self._create_post("unrelated", category=self.other_category, tags=["rust"])
+        # The posts of an old database, before "manage.py rebuild_related_posts".
+        RelatedPost.objects.all().delete()
+
+        response = self.client.get(post.get_absolute_url())
+        self.assertEqual([similar.id for similar in response.context["similar_posts"]], [close.id, far.id])
+
+
+class PostSearchTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create(username="author", is_author=True)
+        cls.category = Category.objects.create(title="SEARCH", slug="search", designer=cls.user)
+        cls.post = Post.objects.create(
+            title="Keyboards",
+            content="<p>Mechanical switches</p>",
+            description="SEARCH",
+            slug="search-post",
+            pub_datetime=timezone.now() - datetime.timedelta(hours=1),
+            status="1",
+            category=cls.category,
+            author=cls.user,
+        )
+
+    def test_search_vector_is_stored_on_save(self):
+        self.assertIsNotNone(Post.objects.get(pk=self.post.pk).search_vector)
+
+    def test_searched_post_list_view_uses_the_stored_vector(self):
+        response = self.client.get(reverse("blog:post_search"), {"query": "keyboards"})
+        self.assertContains(response, self.post.get_absolute_url())
+
+        Post.objects.filter(pk=self.post.pk).update(search_vector=None)
+        response = self.client.get(reverse("blog:post_search"), {"query": "keyboards"})
+        self.assertNotContains(response, self.post.get_absolute_url())
+
+        call_command("reindex_post_search", "--missing", "--workers", "1", stdout=io.StringIO())
+        response = self.client.get(reverse("blog:post_search"), {"query": "keyboards"})
+        self.assertContains(response, self.post.get_absolute_url())
+
+
+class SidebarContextProcessorTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create(username="author", is_author=True)
+        cls.category = Category.objects.create(title="SIDEBAR", slug="sidebar", designer=cls.user)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_sidebar_is_served_from_the_cache(self):
+        response = self.client.get(reverse("pages:about"))
+        self.assertContains(response, self.category.title)
+
+        with self.assertNumQueries(0):
+            self.client.get(reverse("pages:about"))
+
+    def test_sidebar_is_invalidated_by_category_changes(self):
+        self.client.get(reverse("pages:about"))
+        Category.objects.create(title="NEW SIDEBAR CATEGORY", slug="new-sidebar", designer=self.user)
+        response = self.client.get(reverse("pages:about"))
+        self.assertContains(response, "NEW SIDEBAR CATEGORY")
+
+
+class PostVisibilityTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create(username="author", is_author=True)
+        cls.category = Category.objects.create(title="VISIBILITY", slug="visibility", designer=cls.user)
+        cls.post = Post.objects.create(
+            title="SCHEDULED POST",
+            content="SCHEDULED",
+            description="SCHEDULED",
+            slug="scheduled-post",
+            pub_datetime=timezone.now() + datetime.timedelta(hours=1),
+            status="1",
+            category=cls.category,
+            author=cls.user,
+        )
+
+    def test_scheduled_post_is_published_by_the_scheduler(self):
+        self.assertFalse(Post.objects.get(pk=self.post.pk).is_public)
+        self.assertEqual(self.client.get(self.post.get_absolute_url()).status_code, 404)
+
+        # The publishing date arrives (update() does not call save()).
+        Post.objects.filter(pk=self.post.pk).update(pub_datetime=timezone.now() - datetime.timedelta(minutes=1))
+        call_command("publish_scheduled_posts", stdout=io.StringIO())
+
+        self.assertTrue(Post.objects.get(pk=self.post.pk).is_public)
+        self.assertEqual(self.client.get(self.post.get_absolute_url()).status_code, 200)
+
+    def test_category_activation_updates_its_posts(self):
+        Post.objects.filter(pk=self.post.pk).update(pub_datetime=timezone.now() - datetime.timedelta(minutes=1))
+        self.post.refresh_from_db()
+        self.post.save()
+        self.assertTrue(Post.objects.get(pk=self.post.pk).is_public)
+
+        self.category.active = False
+        self.category.save()
+        self.assertFalse(Post.objects.get(pk=self.post.pk).is_public)
+        self.assertFalse(Post.actives.filter(pk=self.post.pk).exists())
+
+
+class ConditionalGetTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create(username="author", is_author=True)
+        cls.category = Category.objects.create(title="CONDITIONAL", slug="conditional", designer=cls.user)
+        cls.post = Post.objects.create(
+            title="CONDITIONAL POST",
+            content="CONDITIONAL",
+            description="CONDITIONAL",
+            slug="conditional-post",
+            pub_datetime=timezone.now() - datetime.timedelta(hours=1),
+            status="1",
+            category=cls.category,
+            author=cls.user,
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def assertNotModified(self, url, last_modified=True):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.has_header("ETag"))
+        self.assertEqual(response.has_header("Last-Modified"), last_modified)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.templates, [])
+        return response
+
+    def test_post_list_answers_304_without_rendering(self):
+        self.assertNotModified(reverse("blog:post_list"))
+
+    def test_post_detail_answers_304_without_rendering(self):
+        # Only with the ETag, which depends on the reader.
+        self.assertNotModified(self.post.get_absolute_url(), last_modified=False)
+
+    def test_post_detail_ignores_if_modified_since_across_a_login(self):
+        url = self.post.get_absolute_url()
+        self.client.get(url)
+        self.client.force_login(self.user)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=http_date(time.time() + 3600))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["user"], self.user)
+
+    def test_pages_answer_304_without_rendering(self):
+        self.assertNotModified(reverse("pages:index"))
+        self.assertNotModified(reverse("pages:about"))
+
+    def test_post_detail_etag_changes_when_the_post_changes(self):
+        etag = self.client.get(self.post.get_absolute_url())["ETag"]
+        self.post.title = "CHANGED CONDITIONAL POST"
+        self.post.save()
+
+        response = self.client.get(self.post.get_absolute_url(), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "CHANGED CONDITIONAL POST")
+
+    def test_post_list_etag_changes_when_a_post_is_deleted(self):
+        other = Post.objects.create(title="DELETED CONDITIONAL POST", content="DELETED", description="DELETED",
+                                    slug="deleted-conditional-post", status="1", category=self.category,
+                                    author=self.user,
+                                    pub_datetime=timezone.now() - datetime.timedelta(hours=2))
+        # An older post: deleting it does not change the newest datetime_modified.
+        Post.objects.filter(pk=other.pk).update(datetime_modified=timezone.now() - datetime.timedelta(days=1))
+        url = reverse("blog:post_list")
+        etag = self.client.get(url)["ETag"]
+        other.delete()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, "DELETED CONDITIONAL POST")
+
+    def test_post_list_etag_changes_after_a_bulk_delete(self):
+        url = reverse("blog:post_list")
+        etag = self.client.get(url)["ETag"]
+        Post.objects.filter(pk=self.post.pk).bulk_delete()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
+class SeedBlogCommandTestCase(TestCase):
+    def test_seed_blog_creates_public_posts_with_tags_and_comments(self):
+        call_command("seed_blog", "--posts", "30", "--authors", "3", "--categories", "3", "--tags", "10",
+                     "--batch-size", "20", "--seed", "1", "--workers", "1", stdout=io.StringIO())
+
+        self.assertEqual(Post.objects.count(), 30)
+        self.assertTrue(Post.actives.exists())
+        self.assertFalse(Post.objects.filter(search_vector__isnull=True).exists())
+        public = Post.objects.filter(active=True, status="1", category__active=True, pub_datetime__lte=timezone.now())
+        self.assertEqual(set(Post.objects.filter(is_public=True)), set(public))
+
+        # The seeded threads have their paths and the posts their comment counters, like saved comments.
+        self.assertFalse(Comment.objects.filter(path="").exists())
+        for reply in Comment.objects.filter(parent__isnull=False).select_related("parent"):
+            self.assertEqual(reply.path, reply.parent.path + str(reply.pk).zfill(10))
+        post = Post.objects.filter(comments_count__gt=1).first()
+        comments, _ = Comment.objects.thread_page(post)
+        self.assertEqual([comment.path for comment in comments], sorted(comment.path for comment in comments))
+        self.assertEqual(post.comments_count, post.blog_post_comments.filter(active=True).count())
+        self.assertEqual(post.unread_comments_count, post.blog_post_comments.filter(read=False).count())
+        self.assertEqual(SiteStatistic.objects.get_values(), SiteStatistic.objects.get_exact_counts())
+
+
+class ServerTimingMiddlewareTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create(username="author", is_author=True)
+        cls.category = Category.objects.create(title="TIMING", slug="timing", designer=cls.user)
+        cls.post = Post.objects.create(
+            title="TIMING POST",
+            content="TIMING",
+            description="TIMING",
+            slug="timing-post",
+            pub_datetime=timezone.now() - datetime.timedelta(hours=1),
+            status="1",
+            category=cls.category,
+            author=cls.user,
+        )
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=1)
+    def test_sampled_request_has_server_timing_header_and_log_line(self):
+        with self.assertLogs("performance", level="INFO") as logs:
+            response = self.client.get(self.post.get_absolute_url())
+
+        self.assertIn("Server-Timing", response)
+        for metric in ("sql;dur=", "tpl;dur=", "cache;desc=", "total;dur="):
+            self.assertIn(metric, response["Server-Timing"])
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn('"path": "{}"'.format(self.post.get_absolute_url()), logs.output[0])
+
+    def test_cache_reads_are_counted_once(self):
+        ServerTimingMiddleware(lambda request: None)  # Installs the cache hooks.
+        cache.clear()
+        cache.set("timing-hit", 1)
+        timing = RequestTiming()
+        token = _current_timing.set(timing)
+        try:
+            cache.get_many(["timing-hit", "timing-miss", "timing-other-miss"])
+            cache.get("timing-hit")
+        finally:
+            _current_timing.reset(token)
+        self.assertEqual((timing.cache_hits, timing.cache_misses), (2, 2))
+
+    @override_settings(SERVER_TIMING_SAMPLE_RATE=0)
+    def test_request_out_of_the_sample_is_not_measured(self):
+        response = self.client.get(self.post.get_absolute_url())
+        self.assertNotIn("Server-Timing", response)
+
+
+class JalaliDateTestCase(TestCase):
+    def test_gregorian_to_jalali_matches_the_jalali_module(self):
+        date = datetime.date(1990, 1, 1)
+        while date < datetime.date(2100, 1, 1):
+            self.assertEqual(gregorian_to_jalali(date.year, date.month, date.day),
+                             jalali.Gregorian(date).persian_tuple(), date)
+            date += datetime.timedelta(days=1)
+
+    def test_get_jalali_date_uses_the_local_time(self):
+        # 20:30 UTC on the last day of 1401 is already the first of Farvardin 1402 in Tehran.
+        time = datetime.datetime(2023, 3, 20, 20, 30, tzinfo=datetime.timezone.utc)
+        self.assertEqual(get_jalali_date(time), "1 فروردین 1402 - ساعت 0 و 0 دقیقه")
+
+    def test_batch_and_template_filters_match_get_jalali_date(self):
+        times = [timezone.now() - datetime.timedelta(days=days, minutes=days) for days in range(0, 3000, 97)]
+        self.assertEqual(get_jalali_dates(times + [None]), [get_jalali_date(time) for time in times] + [None])
+
+        template = Template("{% load jalali_filters %}{{ time|jalali_date }}|{{ time|jalali_day }}")
+        rendered = template.render(Context({"time": times[0]}))
+        self.assertEqual(rendered, "{}|{}".format(get_jalali_date(times[0]), get_jalali_date(times[0]).split(" - ")[0]))
+
+    def test_jalali_today_is_kept_until_the_next_local_midnight(self):
+        today = get_jalali_today()
+        self.assertEqual(today, get_jalali_date(timezone.now()).split(" - ")[0])
+        self.assertGreater(utils._jalali_today[1], timezone.now().timestamp())
+
+        # An expired day (a worker that has been running since yesterday) is computed again.
+        utils._jalali_today = ("YESTERDAY", timezone.now().timestamp() - 1)
+        self.assertEqual(get_jalali_today(), today)
+
+    def test_admins_pages_show_the_jalali_today(self):
+        user = get_user_model().objects.create(username="admin", is_superuser=True, is_staff=True)
+        self.client.force_login(user)
+        utils._jalali_today = ("YESTERDAY", timezone.now().timestamp() - 1)
+
+        response = self.client.get(reverse("admins:terms"))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, get_jalali_today())
+        self.assertNotContains(response, "YESTERDAY")
+
+
+class JalaliArchiveTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create(username="author", is_author=True)
+        cls.category = Category.objects.create(title="ARCHIVE", slug="archive", designer=cls.user)
+        # 1 and 2 Farvardin 1402, and 1 Esfand 1401.
+        dates = {
+            "farvardin-1": datetime.datetime(2023, 3, 21, 12, tzinfo=datetime.timezone.utc),
+            "farvardin-2": datetime.datetime(2023, 3, 22, 12, tzinfo=datetime.timezone.utc),
+            "esfand-1": datetime.datetime(2023, 2, 20, 12, tzinfo=datetime.timezone.utc),
+        }
+        for slug, pub_datetime in dates.items():
+            Post.objects.create(
+                title=slug,
+                content=slug,
+                description=slug,
+                slug=slug,
+                pub_datetime=pub_datetime,
+                status="1",
+                category=cls.category,
+                author=cls.user,
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_save_stores_the_jalali_year_and_month(self):
+        self.assertEqual(Post.objects.values_list("jalali_year", "jalali_month").get(slug="farvardin-1"), (1402, 1))
+        self.assertEqual(Post.objects.values_list("jalali_year", "jalali_month").get(slug="esfand-1"), (1401, 12))
+
+    def test_archive_counts_posts_per_month_with_one_query(self):
+        with self.assertNumQueries(1):
+            archive = list(Post.actives.jalali_archive())
+        self.assertEqual(archive, [(1402, 1, 2), (1401, 12, 1)])
+
+        response = self.client.get(reverse("blog:archive_year", args=[1402]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["years"][0]["months"][0]["posts_count"], 2)
+        self.assertEqual(self.client.get(reverse("blog:archive_year", args=[1300])).status_code, 404)
+
+    def test_archive_month_lists_only_the_posts_of_the_month(self):
+        response = self.client.get(reverse("blog:archive_month", args=[1402, 1]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([post.slug for post in response.context["posts"]], ["farvardin-2", "farvardin-1"])
+        self.assertEqual(self.client.get(reverse("blog:archive_month", args=[1402, 13])).status_code, 404)
+
+    def test_backfill_jalali_dates_fills_missing_months(self):
+        Post.objects.update(jalali_year=None, jalali_month=None)
+        call_command("backfill_jalali_dates", "--batch-size", "2", stdout=io.StringIO())
+        self.assertEqual(list(Post.actives.jalali_archive()), [(1402, 1, 2), (1401, 12, 1)])
+
+
+class ListProjectionTestCase(TestCase):
+    """
+    Every list of posts must cost the same number of queries for 2 or 20 posts, and must never load the content of
+    the posts (the biggest column, which lists do not show).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create(username="author", is_author=True, is_superuser=True)
+        cls.category = Category.objects.create(title="PROJECTION", slug="projection", designer=cls.user)
+
+    def create_posts(self, count):
+        for number in range(Post.objects.count(), Post.objects.count() + count):
+            author = get_user_model().objects.create(username="projection-author-{}".format(number), is_author=True)
+            post = Post.objects.create(
+                title="PROJECTION {}".format(number),
+                content="<p>{}</p>".format("projection " * 10000),
+                description="PROJECTION {}".format(number),
+                slug="projection-{}".format(number),
+                pub_datetime=timezone.now() - datetime.timedelta(hours=1),
+                status="1",
+                category=self.category,
+                author=author,
+            )
+            post.tags.add("projection", "tag-{}".format(number))
+
+    def get_queries(self, url, **data):
+        cache.clear()
+        queries = []
+
+        def record(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(record):
+            response = self.client.get(url, data)
+        self.assertEqual(response.status_code, 200, url)
+        return queries
+
+    def test_list_views_do_not_grow_with_the_posts_nor_load_their_content(self):
+        self.client.force_login(self.user)
+        urls = [
+            (reverse("blog:post_list"), {}),
+            (reverse("blog:post_list", args=["projection"]), {}),
+            (reverse("blog:post_search"), {"query": "projection"}),
+            (reverse("blog:author_post_list", args=["projection-author-1"]), {}),
+            (reverse("blog:category_detail", args=[self.category.slug]), {}),
+            (reverse("pages:index"), {}),
+            (reverse("admins:admins"), {}),
+            (reverse("admins:post_list"), {}),
+            (reverse("admins:category_detail", args=[self.category.pk]), {}),
+        ]
+
+        self.create_posts(2)
+        small = [len(self.get_queries(url, **data)) for url, data in urls]
+        self.create_posts(18)
+        for (url, data), queries_count in zip(urls, small):
+            queries = self.get_queries(url, **data)
+            self.assertEqual(len(queries), queries_count, url)
+            self.assertFalse([sql for sql in queries if '"blog_post"."content"' in sql], url)
+
+
+class QueryBudgetTestCase(TestCase):
+    """
+    Renders every URL of blog.urls, pages.urls and admins.urls with a small and with a bigger dataset. A view fails if
+    it runs more queries with more data (an N+1 query, usually in a template loop) or more queries than its budget in
+    extensions/query_budgets.json. After an intended change, rewrite the table with:
+
+        WRITE_QUERY_BUDGETS=1 python manage.py test blog.tests.QueryBudgetTestCase
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = get_user_model().objects.create(username="budget-admin", is_author=True, is_superuser=True,
+                                                    is_staff=True)
+        cls.author = get_user_model().objects.create(username="budget-author", is_author=True)
+        cls.category = Category.objects.create(title="BUDGET", slug="budget", designer=cls.author)
+        cls.post = cls.create_post(0, timezone.now() - datetime.timedelta(minutes=1))
+
+    @classmethod
+    def create_post(cls, number, pub_datetime, category=None):
+        post = Post.objects.create(
+            title="budget post {}".format(number),
+            content="BUDGET",
+            description="BUDGET {}".format(number),
+            slug="budget-post-{}".format(number),
+            pub_datetime=pub_datetime,
+            status="1",
+            category=category or cls.category,
+            author=cls.author,
+        )
+        post.tags.add("budget", "budget-{}".format(number))
+        Comment.objects.create(post=post, author=cls.admin, title="BUDGET", text="BUDGET", active=True)
+        return post
+
+    def grow(self, count):
+        # Older than the sample post, with the same author and a shared tag. Half of the posts are in the category of
+        # the sample post, the other half in new categories.
+        first = Post.objects.count()
+        for number in range(first, first + count):
+            category = None
+            if number % 2:
+                category = Category.objects.create(title="BUDGET {}".format(number),
+                                                   slug="budget-{}".format(number), designer=self.author)
+            self.create_post(number, timezone.now() - datetime.timedelta(days=number), category)
+
+    def count_view_queries(self, samples):
+        counts = {}
+        for name, url in iter_view_urls(samples):
+            self.assertIsNotNone(url, "There is no sample data for {}.".format(name))
+            if name.startswith("admins:"):
+                self.client.force_login(self.admin)
+            else:
+                self.client.logout()
+            cache.clear()
+            response, counts[name] = count_queries(self.client, url)
+            self.assertLess(response.status_code, 500, url)
+        return counts
+
+    def test_query_counts_do_not_grow_with_the_data_and_stay_within_budget(self):
+        self.grow(2)
+        samples = get_samples()
+        self.assertEqual(samples["post"], self.post)
+        small = self.count_view_queries(samples)
+
+        self.grow(15)
+        large = self.count_view_queries(samples)
+
+        grown = {name: (small[name], large[name]) for name in small if large[name] > small[name]}
+        self.assertEqual(grown, {}, "These views run more queries with more data (small, large).")
+
+        if os.environ.get("WRITE_QUERY_BUDGETS"):
+            write_query_budgets(large)
+        budgets = load_query_budgets()
+        over_budget = {name: (count, budgets.get(name)) for name, count in large.items()
+                       if name not in budgets or count > budgets[name]}
+        self.assertEqual(over_budget, {}, "These views run more queries than their budget (queries, budget).")
+
+
+class SiteStatisticTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create(username="author", is_author=True, is_superuser=True)
+        cls.category = Category.objects.create(title="STATISTICS", slug="statistics", designer=cls.user)
+
+    def create_post(self, number, **kwargs):
+        return Post.objects.create(**dict(dict(
+            title="STATISTICS POST {}".format(number),
+            content="STATISTICS",
+            description="STATISTICS {}".format(number),
+            slug="statistics-post-{}".format(number),
+            pub_datetime=timezone.now() - datetime.timedelta(days=1),
+            status="1",
+            category=self.category,
+            author=self.user,
+        ), **kwargs))
+
+    def assertCountersAreExact(self):
+        self.assertEqual(SiteStatistic.objects.get_values(), SiteStatistic.objects.get_exact_counts())
+
+    def test_counters_follow_the_changes(self):
+        posts = [self.create_post(number) for number in range(3)]
+        draft = self.create_post(3, status="0")
+        Comment.objects.create(post=posts[0], author=self.user, text="COMMENT")
+        get_user_model().objects.create(username="reader")
+        self.assertCountersAreExact()
+        self.assertEqual(SiteStatistic.objects.get_values()["public_posts"], 3)
+
+        # Publishing a draft, hiding a category (a queryset update, no signals) and deleting.
+        draft.status = "1"
+        draft.save()
+        self.assertCountersAreExact()
+        self.category.active = False
+        self.category.save()
+        self.assertCountersAreExact()
+        self.category.active = True
+        self.category.save()
+        posts[0].delete()
+        get_user_model().objects.get(username="reader").delete()
+        self.assertCountersAreExact()
+        self.assertEqual(SiteStatistic.objects.get_values(), {"posts": 3, "public_posts": 3, "comments": 0,
+                                                                    "unread_comments": 0, "users": 1})
+
+    def test_reconcile_corrects_the_drift(self):
+        self.create_post(0)
+        SiteStatistic.objects.filter(name="posts").update(value=100)
+        SiteStatistic.objects.filter(name="users").delete()
+
+        output = io.StringIO()
+        call_command("reconcile_site_statistics", stdout=output)
+        self.assertIn("posts: 100 -> 1", output.getvalue())
+        self.assertIn("users: 1 (new)", output.getvalue())
+        self.assertCountersAreExact()
+
+    def test_portal_reads_the_counters_in_one_query(self):
+        self.create_post(0)
+        self.client.force_login(self.user)
+        with self.assertNumQueries(1):
+            self.assertEqual(SiteStatistic.objects.get_values(approximate=True)["public_posts"], 1)
+
+        response = self.client.get(reverse("admins:admins"))
+        self.assertEqual(response.context["total_posts"], 1)
+        self.assertEqual(response.context["total_users"], 1)
+
+
+class PostViewAnalyticsTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create(username="author", is_author=True, is_superuser=True)
+        cls.category = Category.objects.create(title="ANALYTICS", slug="analytics", designer=cls.user)
+        cls.post = Post.objects.create(
+            title="ANALYTICS POST",
+            content="ANALYTICS",
+            description="ANALYTICS",
+            slug="analytics-post",
+            pub_datetime=timezone.now() - datetime.timedelta(days=30),
+            status="1",
+            category=cls.category,
+            author=cls.user,
+        )
+
+    def test_hyperloglog_estimates_and_merges(self):
+        first, second, both = HyperLogLog(), HyperLogLog(), HyperLogLog()
+        for number in range(20000):
+            hashed = hash64(str(number))
+            (first if number % 2 else second).add(hashed)
+            both.add(hashed)
+
+        # The standard error is 3.25%, so 10% is three times as much.
+        self.assertAlmostEqual(len(both), 20000, delta=20000 * 0.1)
+        self.assertEqual(len(first.merge(second)), len(both))
+        self.assertEqual(HyperLogLog.from_bytes(both.to_bytes()).registers, both.registers)
+        self.assertEqual(len(HyperLogLog()), 0)
+
+    def test_views_are_rolled_up_per_day_and_compacted(self):
+        # Two views of last week, which are compacted after their day is rolled up.
+        old = timezone.now() - datetime.timedelta(days=8)
+        PostViewEvent.objects.bulk_create([PostViewEvent(post=self.post, visitor=visitor, datetime_created=old)
+                                           for visitor in (1, 2)])
+
+        post_view_counter.flush()
+        for address in ("10.0.0.1", "10.0.0.2", "10.0.0.1"):
+            self.client.get(self.post.get_absolute_url(), REMOTE_ADDR=address)
+        post_view_counter.flush()
+        self.assertEqual(PostViewEvent.objects.filter(post=self.post).count(), 5)
+
+        for _ in range(2):
+            # Rolling up twice changes nothing.
+            call_command("rollup_post_views", stdout=io.StringIO())
+            today = PostDailyViews.objects.get(post=self.post, date=timezone.localdate())
+            self.assertEqual((today.views, today.visitors), (3, 2))
+        self.assertEqual(PostDailyViews.objects.get(post=self.post, date=timezone.localdate(old)).views, 2)
+        self.assertFalse(PostViewEvent.objects.filter(datetime_created=old).exists())
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("admins:post_detail", args=[self.post.pk]))
+        self.assertEqual(response.context["views_total"], 5)
+        self.assertEqual(response.context["views_series"][-1]["views"], 3)
+        self.assertEqual(len(response.context["views_series"]), 30)
+        self.assertEqual(self.client.get(reverse("admins:admins")).context["views_series"][-1]["views"], 3)
+
+
+class ImportPostsCommandTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create(username="importer", is_author=True)
+        Category.objects.create(title="IMPORTED", slug="imported", designer=cls.user)
+
+    def write_records(self, name, content):
+        path = os.path.join(self.directory.name, name)
+        with open(path, "w", encoding="utf-8") as records:
+            records.write(content)
+        return path
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def import_posts(self, *args):
+        output, errors = io.StringIO(), io.StringIO()
+        call_command("import_posts", *args, stdout=output, stderr=errors)
+        return output.getvalue(), errors.getvalue()
+
+    def test_jsonl_import_with_dry_run_and_checkpoint(self):
+        records = [{
+            "title": "IMPORTED POST {}".format(number),
+            "content": "<p>IMPORTED CONTENT</p>",
+            "description": "IMPORTED {}".format(number),
+            "slug": "imported-post-{}".format(number),
+            "author": "importer",
+            "category": "IMPORTED" if number % 2 else "NEW CATEGORY",
+            "tags": ["imported", "tag {}".format(number % 2)],
+            "pub_datetime": "2023-05-01T10:00:00+03:30",
+            "status": "1",
+        } for number in range(5)]
+        records.append(dict(records[0], slug="another-slug"))
+        records.append({"title": "UNKNOWN AUTHOR", "content": "X", "description": "X", "slug": "x", "author": "nobody",
+                        "category": "IMPORTED"})
+        path = self.write_records("posts.jsonl", "\n".join(json.dumps(record) for record in records) + "\n{broken\n")
+        checkpoint = os.path.join(self.directory.name, "checkpoint.json")
+
+        output, errors = self.import_posts(path, "--dry-run")
+        self.assertIn("Would import 5 posts (0 existing, 3 invalid)", output)
+        self.assertFalse(Post.objects.exists())
+        self.assertFalse(Category.objects.filter(title="NEW CATEGORY").exists())
+
+        output, errors = self.import_posts(path, "--batch-size", "2", "--checkpoint", checkpoint)
+        self.assertIn("Imported 5 posts (0 existing, 3 invalid)", output)
+        self.assertIn("Record 6: A post with the same description already exists.", errors)
+        self.assertIn("Record 7: The author nobody does not exist.", errors)
+        self.assertIn("Record 8: Invalid JSON", errors)
+
+        post = Post.objects.get(slug="imported-post-2")
+        self.assertEqual(sorted(post.tags.names()), ["imported", "tag 0"])
+        self.assertEqual(post.category.title, "NEW CATEGORY")
+        self.assertEqual((post.jalali_year, post.jalali_month), (1402, 2))
+        self.assertTrue(post.is_public)
+        self.assertTrue(Post.objects.filter(search_vector="IMPORTED").exists())
+        self.assertEqual(SiteStatistic.objects.get_values(), SiteStatistic.objects.get_exact_counts())
+
+        # The checkpoint says everything is done; without it, the existing slugs are skipped.
+        output, _ = self.import_posts(path, "--checkpoint", checkpoint)
+        self.assertIn("Resuming after record 8.", output)
+        self.assertIn("Imported 0 posts (0 existing, 0 invalid)", output)
+        output, _ = self.import_posts(path)
+        self.assertIn("Imported 0 posts (5 existing, 3 invalid)", output)
+
+    def test_csv_import(self):
+        path = self.write_records("posts.csv", (
+            "title,content,description,slug,author,category,tags,status,active\n"
+            'CSV POST,<p>CSV</p>,CSV 1,csv-post,importer,IMPORTED,"first, second",0,False\n'
+        ))
+        output, _ = self.import_posts(path)
+        self.assertIn("Imported 1 posts", output)
+        post = Post.objects.get(slug="csv-post")
+        self.assertEqual(sorted(post.tags.names()), ["first", "second"])
+        self.assertFalse(post.active)
+        self.assertFalse(post.is_public)
+
+
+class CommentThreadTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = get_user_model().objects.create(username="thread-author", is_author=True)
+        cls.reader = get_user_model().objects.create(username="thread-reader")
+        cls.category = Category.objects.create(title="THREADS", slug="threads", designer=cls.author)
+        cls.post = Post.objects.create(
+            title="THREAD POST",
+            content="THREAD",
+            description="THREAD",
+            slug="thread-post",
+            pub_datetime=timezone.now() - datetime.timedelta(days=1),
+            status="1",
+            category=cls.category,
+            author=cls.author,
+        )
+
+    def comment(self, text, parent=None, active=True):
+        return Comment.objects.create(post=self.post, author=self.reader, text=text, parent=parent, active=active)
+
+    def test_paths_keep_the_tree_in_reading_order(self):
+        first = self.comment("FIRST")
+        second = self.comment("SECOND")
+        reply = self.comment("REPLY", parent=first)
+        nested = self.comment("NESTED", parent=reply)
+        self.assertEqual(reply.path, first.path + str(reply.pk).zfill(10))
+        self.assertEqual((nested.depth, nested.post_id), (2, self.post.pk))
+
+        comments, next_cursor = Comment.objects.thread_page(self.post)
+        self.assertEqual([comment.text for comment in comments], ["FIRST", "REPLY", "NESTED", "SECOND"])
+        self.assertIsNone(next_cursor)
+
+        # Pages continue from the path of the last comment, even in the middle of a thread.
+        comments, next_cursor = Comment.objects.thread_page(self.post, per_page=2)
+        self.assertEqual([comment.text for comment in comments], ["FIRST", "REPLY"])
+        comments, next_cursor = Comment.objects.thread_page(self.post, after=next_cursor, per_page=2)
+        self.assertEqual([comment.text for comment in comments], ["NESTED", "SECOND"])
+        self.assertIsNone(next_cursor)
+
+    def test_staff_comments_are_approved_and_read(self):
+        staff = get_user_model().objects.create(username="thread-staff", is_staff=True)
+        self.client.force_login(staff)
+        self.client.post(self.post.get_absolute_url(), {"text": "STAFF COMMENT"})
+        comment = Comment.objects.get(text="STAFF COMMENT")
+        self.assertTrue(comment.active and comment.read)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.unread_comments_count, 0)
+
+    def test_replies_stop_at_the_maximum_depth(self):
+        comment = self.comment("ROOT")
+        for _ in range(Comment.MAX_DEPTH + 2):
+            comment = self.comment("DEEP", parent=comment)
+        self.assertEqual(comment.depth, Comment.MAX_DEPTH)
+
+    def test_approved_comments_count_is_denormalized(self):
+        comment = self.comment("PENDING", active=False)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 0)
+        comment.active = True
+        comment.save()
+        reply = self.comment("REPLY", parent=comment)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 2)
+        self.assertIsNotNone(self.post.datetime_commented)
+
+        # The reply is deleted with its parent.
+        comment.delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 0)
+        self.assertFalse(Comment.objects.filter(pk=reply.pk).exists())
+
+    def test_post_detail_loads_a_page_of_comments_in_one_query(self):
+        for number in range(5):
+            root = self.comment("ROOT {}".format(number))
+            self.comment("REPLY {}".format(number), parent=self.comment("MIDDLE", parent=root))
+        url = self.post.get_absolute_url()
+        _, few_queries = count_queries(self.client, url)
+        for number in range(30):
+            self.comment("MORE", parent=root)
+        response, queries = count_queries(self.client, url)
+        self.assertEqual(queries, few_queries)
+        self.assertContains(response, "REPLY 4")
+        self.assertContains(response, "نظرات (45)")
+
+    def test_submit_comment_and_reply(self):
+        url = self.post.get_absolute_url()
+        response = self.client.post(url, {"text": "ANONYMOUS"})
+        self.assertEqual(response.status_code, 302)
+        self.assertIn("/accounts/login/", response["Location"])
+
+        self.client.force_login(self.reader)
+        parent = self.comment("PARENT")
+        response = self.client.post(url, {"text": "A REPLY", "parent": parent.pk})
+        self.assertRedirects(response, url + "?comment=pending#comments", fetch_redirect_response=False)
+        reply = Comment.objects.get(text="A REPLY")
+        self.assertEqual((reply.parent, reply.author, reply.active), (parent, self.reader, False))
+
+        # Replies only to the approved comments of the same post.
+        hidden = self.comment("HIDDEN", active=False)
+        response = self.client.post(url, {"text": "INVALID", "parent": hidden.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Comment.objects.filter(text="INVALID").exists())
+
+
+@override_settings(RATELIMITS={"login:ip": (5, 60), "login:account": (3, 60), "comment:ip": (4, 60),
+                               "comment:account": (2, 60)})
+class RateLimitTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username="limited", email="limited@example.com",
+                                                        password="CORRECT PASSWORD")
+        category = Category.objects.create(title="LIMITED", slug="limited", designer=cls.user)
+        cls.post = Post.objects.create(title="LIMITED", content="LIMITED", description="LIMITED", slug="limited",
+                                       pub_datetime=timezone.now() - datetime.timedelta(days=1), status="1",
+                                       category=category, author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_token_bucket_allows_a_burst_then_refills(self):
+        bucket = TokenBucket("test", capacity=3, period=3)
+        self.assertEqual([bucket.consume("key") for _ in range(3)], [0, 0, 0])
+        wait = bucket.consume("key")
+        self.assertGreater(wait, 0)
+        self.assertLessEqual(wait, 1)
+        # Other keys have their own buckets.
+        self.assertEqual(bucket.consume("other key"), 0)
+        bucket.reset("key")
+        self.assertEqual(bucket.consume("key"), 0)
+
+    def test_token_bucket_is_shared_by_concurrent_requests(self):
+        bucket = TokenBucket("test", capacity=5, period=60)
+        barrier = threading.Barrier(20)
+        waits = []
+
+        def request():
+            barrier.wait()
+            waits.append(bucket.consume("key"))
+
+        threads = [threading.Thread(target=request) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # Exactly the burst got through, and the rejected requests took no token.
+        self.assertEqual(waits.count(0), 5)
+        self.assertLessEqual(bucket.consume("key"), 60 / 5)
+
+    def test_login_attempts_are_limited_before_any_password_hashing(self):
+        # Every way of typing the login of the account takes from the same bucket.
+        for login in ("limited", "LIMITED@example.com", "limited@EXAMPLE.COM"):
+            self.assertFalse(self.client.login(username=login, password="WRONG"))
+        # The account is out of tokens: even the right password is refused, after the single query of the user and
+        # without hashing the password.
+        queries = QueryCounter()
+        with connection.execute_wrapper(queries):
+            self.assertFalse(self.client.login(username="limited@example.com", password="CORRECT PASSWORD"))
+        self.assertEqual(queries.count, 1)
+        self.assertEqual(get_rejected_counts()["login:account"], 1)
+
+        # The login form sends the request too: the IP address has its own bucket.
+        cache.clear()
+        login_url = reverse("login")
+        statuses = [self.client.post(login_url, {"username": "user{}".format(number), "password": "WRONG"},
+                                     REMOTE_ADDR="10.0.0.1").status_code for number in range(6)]
+        self.assertEqual(get_rejected_counts()["login:ip"], 1)
+        self.assertEqual(statuses, [200] * 6)
+
+        # An IP address out of tokens is refused before any query.
+        request = self.client.get(login_url, REMOTE_ADDR="10.0.0.1").wsgi_request
+        queries = QueryCounter()
+        with connection.execute_wrapper(queries):
+            with self.assertRaises(PermissionDenied):
+                EmailOrUsernameModelBackend().authenticate(request, username="limited", password="CORRECT PASSWORD")
+        self.assertEqual(queries.count, 0)
+
+    def test_comment_bursts_get_429(self):
+        self.client.force_login(self.user)
+        url = self.post.get_absolute_url()
+        statuses = [self.client.post(url, {"text": "SPAM"}).status_code for _ in range(3)]
+        self.assertEqual(statuses, [302, 302, 429])
+        self.assertEqual(Comment.objects.count(), 2)
+        self.assertEqual(get_rejected_counts()["comment:account"], 1)
+        # Reading the post is not limited.
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+        output = io.StringIO()
+        call_command("ratelimit_counters", "--reset", stdout=output)
+        self.assertIn("comment:account 1", output.getvalue())
+        self.assertEqual(get_rejected_counts()["comment:account"], 0)
+
+
+class ImageVariantTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = get_user_model().objects.create(username="photographer")
+        cls.category = Category.objects.create(title="PHOTOS", slug="photos", designer=cls.author)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        media = self.settings(MEDIA_ROOT=directory.name)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    @staticmethod
+    def make_image(name, size, image_format="JPEG"):
+        output = io.BytesIO()
+        Image.new("RGB", size, (200, 30, 60)).save(output, image_format)
+        return SimpleUploadedFile(name, output.getvalue())
+
+    def create_post(self, banner):
+        number = Post.objects.count()
+        return Post.objects.create(title="PHOTO", content="PHOTO", description="PHOTO {}".format(number),
+                                   slug="photo-{}".format(number), status="1", banner=banner, category=self.category,
+                                   author=self.author)
+
+    def test_variants_are_built_when_the_banner_is_uploaded(self):
+        post = self.create_post(self.make_image("photo.jpg", (2000, 1000)))
+        post.refresh_from_db()
+        variants = post.banner_variants
+        self.assertEqual(variants["source"], post.banner.name)
+        self.assertEqual((variants["width"], variants["height"]), (2000, 1000))
+        self.assertEqual([(variant["width"], variant["height"]) for variant in variants["variants"]],
+                         [(360, 180), (720, 360), (970, 485), (1440, 720), (1940, 970), (2000, 1000)])
+        self.assertIsNone(variants["variants"][-1]["name"])
+        with default_storage.open(variants["variants"][0]["webp"]) as webp:
+            image = Image.open(webp)
+            self.assertEqual((image.format, image.size), ("WEBP", (360, 180)))
+        with default_storage.open(variants["variants"][0]["name"]) as jpeg:
+            self.assertEqual(Image.open(jpeg).format, "JPEG")
+
+        # Other saves do not touch the files again.
+        queries = QueryCounter()
+        with connection.execute_wrapper(queries):
+            self.assertFalse(refresh_variants(post, "banner"))
+        self.assertEqual(queries.count, 0)
+
+    def test_small_images_are_not_enlarged_and_broken_files_are_skipped(self):
+        post = self.create_post(self.make_image("small.png", (300, 100), "PNG"))
+        self.assertEqual([(variant["width"], variant["name"]) for variant in post.banner_variants["variants"]],
+                         [(300, None)])
+
+        broken = self.create_post(SimpleUploadedFile("broken.jpg", b"NOT AN IMAGE"))
+        self.assertEqual(broken.banner_variants, {"source": broken.banner.name, "variants": []})
+
+    def test_responsive_image_tag(self):
+        post = self.create_post(self.make_image("photo.jpg", (1000, 500)))
+        template = Template("{% load responsive_images %}"
+                            "{% responsive_image post.banner post.banner_variants alt=post.title class='wide' %}|"
+                            "{% responsive_image post.banner post.banner_variants width=100 %}")
+        banner, thumbnail = template.render(Context({"post": post})).split("|")
+        self.assertIn('<source type="image/webp" sizes="100vw" srcset="/media/blog/post/variants/photo-360w.webp 360w, ',
+                      banner)
+        self.assertIn('/media/blog/post/variants/photo-1000w.webp 1000w"><img alt="PHOTO" class="wide"', banner)
+        self.assertIn('height="500" loading="lazy" sizes="100vw" src="/media/blog/post/photo.jpg"', banner)
+        self.assertIn('/media/blog/post/photo.jpg 1000w" width="1000"></picture>', banner)
+        self.assertIn('height="50"', thumbnail)
+        self.assertIn('sizes="100px"', thumbnail)
+        self.assertIn('width="100"', thumbnail)
+
+        # Variants of another file (a new banner not processed yet) are ignored.
+        post.banner_variants = {**post.banner_variants, "source": "blog/post/old.jpg"}
+        self.assertEqual(template.render(Context({"post": post})).split("|")[1],
+                         '<img decoding="async" loading="lazy" src="/media/blog/post/photo.jpg" width="100">')
+
+    def test_build_image_variants_command(self):
+        posts = [self.create_post(self.make_image("photo.jpg", (800, 400)))]
+        Post.objects.update(banner_variants={})
+        output = io.StringIO()
+        call_command("build_image_variants", "--field", "blog.Post.banner", stdout=output, stderr=io.StringIO())
+        self.assertIn("built the variants of 1 files (1 rows)", output.getvalue())
+        posts[0].refresh_from_db()
+        self.assertEqual(posts[0].banner_variants["width"], 800)
+        # Up to date rows are skipped.
+        call_command("build_image_variants", "--field", "blog.Post.banner", stdout=output)
+        self.assertIn("built the variants of 0 files (0 rows)", output.getvalue())
+
+
+class EditorUploadTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = get_user_model().objects.create_user(username="editor", password="SECRET", is_staff=True)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        media = self.settings(MEDIA_ROOT=directory.name)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.client.force_login(self.staff)
+
+    @staticmethod
+    def make_image(size, image_format="JPEG"):
+        image = Image.new("RGB", size, (20, 120, 200))
+        exif = Image.Exif()
+        exif[0x010F] = "CAMERA MAKER"
+        output = io.BytesIO()
+        image.save(output, image_format, exif=exif, quality=100)
+        return output.getvalue()
+
+    def upload(self, data, name="photo.jpeg"):
+        return self.client.post(reverse("ckeditor_upload"), {"upload": SimpleUploadedFile(name, data)})
+
+    def test_uploaded_images_are_resized_and_stripped(self):
+        data = self.make_image((3000, 1500))
+        with self.assertLogs("performance", "INFO") as logs:
+            response = self.upload(data)
+        self.assertEqual(response.json()["uploaded"], "1")
+        self.assertTrue(response.json()["url"].endswith(".jpg"))
+        saved = response.json()["url"][len("/media/"):]
+        with default_storage.open(saved) as image_file:
+            compressed = image_file.read()
+        image = Image.open(io.BytesIO(compressed))
+        self.assertEqual(image.size, (1920, 960))
+        self.assertFalse(image.getexif())
+        self.assertLess(len(compressed), len(data))
+        self.assertTrue(default_storage.exists(saved.replace(".jpg", "_thumb.jpg")))
+        self.assertIn("({} saved)".format(len(data) - len(compressed)), logs.output[0])
+
+    def test_oversized_uploads_are_refused_before_they_are_written(self):
+        with self.settings(CKEDITOR_UPLOAD_MAX_SIZE=1000):
+            response = self.upload(self.make_image((300, 300)))
+        self.assertEqual(response.json()["uploaded"], 0)
+        self.assertIn("حجم فایل", response.json()["error"]["message"])
+
+        with self.settings(CKEDITOR_UPLOAD_MAX_PIXELS=1000):
+            response = self.client.post(reverse("ckeditor_upload") + "?CKEditorFuncNum=3",
+                                        {"upload": SimpleUploadedFile("photo.png", self.make_image((100, 100), "PNG"))})
+        self.assertContains(response, "callFunction(3, ''")
+        self.assertFalse(default_storage.exists(settings.CKEDITOR_UPLOAD_PATH))
+
+    def test_compress_uploads_command(self):
+        name = default_storage.save(settings.CKEDITOR_UPLOAD_PATH + "old/photo.jpg",
+                                    ContentFile(self.make_image((2500, 1000))))
+        default_storage.save(settings.CKEDITOR_UPLOAD_PATH + "old/photo_thumb.jpg", ContentFile(b"NOT AN IMAGE"))
+        output = io.StringIO()
+        call_command("compress_uploads", "--dry-run", stdout=output)
+        self.assertIn("Would compress 1 of 1 images", output.getvalue())
+        call_command("compress_uploads", stdout=output)
+        self.assertIn("Compressed 1 of 1 images", output.getvalue())
+        with default_storage.open(name) as image_file:
+            self.assertEqual(Image.open(image_file).size, (1920, 768))
@@ -58,4 +58,9 @@ urlpatterns = [
     re_path(r"category/detail/(?P<slug>[-\w]+)/", views.category_detail_view, name="category_detail"),
     
     path("tag/list/", views.tag_list_view, name="tag_list"),
+
+    # The Jalali archive: all the months, the months of one year and the posts of one month.
+    path("archive/", views.archive_view, name="archive"),
+    path("archive/<int:year>/", views.archive_view, name="archive_year"),
+    path("archive/<int:year>/<int:month>/", views.archive_month_view, name="archive_month"),
 ]
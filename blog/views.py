@@ -1,23 +1,69 @@
 from django.shortcuts import render
-from django.core.paginator import Paginator
+from django.core.cache import cache
 from django.http import HttpResponseRedirect, Http404
 from taggit.models import Tag
-from django.utils import timezone
 from django.core.exceptions import ObjectDoesNotExist
-from django.db import models
+from django.db.models import Count, F, Q
 from django.contrib.auth import get_user_model
+from django.contrib.auth.views import redirect_to_login
 from accounts.models import CustomUser
 
-from django.contrib.postgres.search import SearchVector, SearchQuery, SearchRank
+from django.contrib.postgres.search import SearchQuery, SearchRank
 
-from .models import Post, Category
-from .forms import PostSearchForm
+from extensions.paginators import CachedCountPaginator, KeysetPaginator
+from extensions.ratelimit import ratelimit
+from extensions.utils import JALALI_MONTHS, set_jalali_dates
+
+from .models import Post, Category, Comment, RelatedPost
+from .counters import post_view_counter, get_visitor
+from .forms import PostSearchForm, CommentForm
+from .conditions import posts_condition, post_condition, get_posts_last_modified
 
 # Create your views here.
 
-tags_list = Tag.objects.all()[0:25]
+# The tags and categories of the sidebar ("tags_list" and "categories") are not queried here; they are served from the
+# cache to every template by the blog.context_processors.sidebar context processor.
+
+# Numbered pages (?page=X) are served with OFFSET queries, which get slower the deeper you go. After this many pages,
+# the "next" button switches to cursor (keyset) links (?after=X), which cost the same at any depth.
+POSTS_PER_PAGE = 25
+NUMBERED_PAGES_LIMIT = 10
+ARCHIVE_TIMEOUT = 60 * 60
+COMMENTS_PER_PAGE = 50
+
+
+def _paginate_posts(request, posts, count_cache_key):
+    """
+    Both post_list_view and author_post_list_view paginate their posts in the same way, so we keep the logic here.
+
+    If the URL contains ?after= or ?before=, the page is fetched with the KeysetPaginator. Otherwise the old ?page=
+    URLs keep working with a Paginator whose COUNT(*) is cached per filter (count_cache_key). Either way, the posts are
+    ordered by (pub_datetime, id) so that both modes show exactly the same sequence of posts.
+    """
+    posts = posts.order_by("-pub_datetime", "-id")
+    page_number = request.GET.get("page")
+    after = request.GET.get("after")
+    before = request.GET.get("before")
+
+    if after or before:
+        paginator = KeysetPaginator(posts, POSTS_PER_PAGE)
+        page_obj = paginator.get_page(after=after, before=before)
+        # The publishing dates of the whole page are converted to Jalali at once.
+        set_jalali_dates(page_obj.object_list)
+        return page_obj, paginator, page_number
+
+    paginator = CachedCountPaginator(posts, POSTS_PER_PAGE, cache_key=count_cache_key)
+    page_obj = paginator.get_page(page_number)
+    page_obj.adjusted_elided_pages = paginator.get_elided_page_range(page_obj.number, on_each_side=1, on_ends=2)
+
+    # Numbered pages never link backwards with a cursor, but the last numbered page hands over to cursor links.
+    page_obj.object_list = set_jalali_dates(list(page_obj.object_list))
+    page_obj.previous_cursor = None
+    page_obj.next_cursor = None
+    if page_obj.number >= NUMBERED_PAGES_LIMIT and page_obj.has_next() and page_obj.object_list:
+        page_obj.next_cursor = KeysetPaginator(posts, POSTS_PER_PAGE).encode_cursor(page_obj.object_list[-1])
 
-categories_list = Category.objects.filter(active=True)[0:25]
+    return page_obj, paginator, page_number
 
 
 def _post_list_view_lazy(request):
@@ -40,6 +86,7 @@ def _post_list_view_lazy(request):
     return HttpResponseRedirect("/blog/post/list/page/")
 
 
+@posts_condition
 def post_list_view(request, tag_slug=None):
     """
     Here we enter the main part of the View section in Django. It is good to know that there are two types of View
@@ -78,8 +125,11 @@ def post_list_view(request, tag_slug=None):
     # Unfortunately, Django ORM is not something that can be taught in the comments. Needs a lot of study. But if you
     # read the codes and queries (for example the following queries) carefully, you will definitely get acquainted with
     # the query process in Django ORM.
-    posts = Post.objects.all().filter(active=True).exclude(status="0").filter(category__active=True)\
-        .filter(pub_datetime__lte=timezone.now()).filter(pub_datetime__lt=timezone.now())
+    # Here we use our own manager, "actives" (read blog/managers.py). It only returns the posts that readers are allowed
+    # to see: active, published, with an active category and a publishing date in the past.
+    # summaries() leaves the content of the posts out and loads their authors and tags at once (read
+    # blog/managers.py).
+    posts = Post.actives.summaries()
     
     # We reached some interesting parts of the project. It's time to add some detail to the tagging system.
     # Many parts of the tagging system are missing in django-taggit. In fact, the lack of slugs is felt in taggit with
@@ -102,35 +152,13 @@ def post_list_view(request, tag_slug=None):
     # bottom of the page was a button that showed you several pages, you could go to the page, each page had equal post
     # layout, remember? There is another site :))))))))))) This system is called paging (Pagination) system.
 
-    # Here we create an object of Paginator class in Django, this object allows us to start initialization for a
-    # ListView that merges with Pagination.
-    # This object takes two primary inputs, the first input is the query you want (which should be of the ListView type)
-    # and the second input is the number of queries (pagination) per page. In fact, the second value is a divider that
-    # divides the query into pages and sections for the number you assign to it.
-    paginator = Paginator(posts, 25)
-
-    # Here is an interesting part of Django where you will learn more about the request variable. This variable has
-    # many uses that make you use it more and more. At request, most of what we do is get the URL from the user.
-    # When you Pagination, it will add a "?page=X[number]" value to your URL (Response), which will let the
-    # (Controllers) in Django know where we are located on the Pagination.
-    page_number = request.GET.get("page")
-
-    # Here is the part where Paginator is enabled. In fact, the Paginator class is responsive to a particular number,
-    # and until it receives that number, it can be said that it is almost not activated.
-    # We have enabled Paginator in another variable, and the required number (described above) is stored in the
-    # page_number variable, so we can easily pass it to the new variable.
-    page_obj = paginator.get_page(page_number)
-
-    # In normal Paginator, there is no need for this section. But we do not make a normal Paginator! We want to
-    # design a beautiful and detailed Paginator. To design this Paginator, we need to enable the following value.
-    # Understanding this value requires study, but it briefly says to display pages one through three, and leave the
-    # rest to the last page and one to the end ..., and as long as the user moves the numbers forward, forward Go and
-    # show more numbers. We will face this issue more in the templates.
-    # You may be wondering what "page_number or 1" means at the bottom line? This is a tiny Python technique that
-    # allows you to enter the first page of Pagination instead of PageNotAnInteger when you enter /blog/post/list/page/.
-    # In general, it means: "request page_number, if it does not work, request 1."
-    # You can delete "or 1" as a test and enter "/blog/post/list/page/". Interesting things happen :)
-    page_obj.adjusted_elided_pages = paginator.get_elided_page_range(page_number or 1, on_each_side=1, on_ends=2)
+    # Here we create a paginator. A paginator takes the query you want and the number of posts per page, and divides
+    # the query into pages. When you Pagination, it will add a "?page=X[number]" value to your URL (Response), which
+    # will let the (Controllers) in Django know where we are located on the Pagination.
+    # We do not make a normal Paginator! Deep pages are served with cursors (?after=X) instead of page numbers, and
+    # the total number of posts is cached per tag. Read _paginate_posts above to see how it works.
+    page_obj, paginator, page_number = _paginate_posts(
+        request, posts, "blog:post_list:count:tag:{}".format(tag.pk if tag else ""))
     
     # One of the highlights of MTV's Django architecture is context. Contexts are Python dictionaries
     # (usually dictionaries) that move information between the Template and the View as key and value.
@@ -140,10 +168,9 @@ def post_list_view(request, tag_slug=None):
         "page_obj": page_obj,
         "page_number": page_number,
         "paginator": paginator,
-        "tags_list": tags_list,
-        "categories": categories_list,
         "tag": tag,
         "current_post_author": current_posts_author,
+        "archive": _get_jalali_archive(request),
     }
 
     # And we are nearing the end of our View! Here and in this function we return the render function, which gives us
@@ -164,16 +191,18 @@ def searched_post_list_view(request):
         if form.is_valid():
             query = form.cleaned_data["query"]
             
-            # Weights: A -> 1.0, B -> 0.4, C -> 0.2, D -> 0.1
-            search_vector = SearchVector("title", weight="A") + SearchVector("description", weight="B") + SearchVector("content", weight="C")
-            
+            # The search document (title with weight A, description B, content C) is stored in the search_vector
+            # field and indexed, so the database only has to rank the posts that match.
             search_query = SearchQuery(query)
-            result = Post.actives.annotate(search=search_vector, rank=SearchRank(search_vector, search_query))\
-                .filter(search=query).filter(rank__gte=0.2).order_by("-rank")
+            result = Post.actives.summaries().filter(search_vector=search_query)\
+                .annotate(rank=SearchRank(F("search_vector"), search_query)).filter(rank__gte=0.2).order_by("-rank")
                 
     return render(request, "blog/post_list.html", {"form": form, "query": query, "posts": result})
 
 
+# The comments are posted to this view: bursts are rejected (429) before the conditional GET stamps are even read.
+@ratelimit("comment")
+@post_condition
 def post_detail_view(request, slug):
     """
     Little by little, the project is being completed :) Welcome to DetailViews in Django. The previous type we used in
@@ -196,42 +225,36 @@ def post_detail_view(request, slug):
     # and unique slug exists or not!
     # NOTE THAT: You can do the following process with a function called the get_object_or_404() .
     try:
-        # Welcome to nested Queries collection:) Maybe you have a question, why so many queries? The queries here
-        # contain a lot of security and filtering load so that if possible, an intruder (hacker) practically cannot
-        # inject anything into our queries or get additional information.
-
-        # Of course, this penetration is called "SQL Injection".
-
-        # SQL Injection is protected by default in Django, but in very large projects it is recommended to query your
-        # code more precisely, in order to achieve greater vulnerability protection.
-        # For example, we have coded the same query twice: .filter(active=True).exclude(active=False) Actually filters
-        # return different objects for us based on a specific field, but exclude based on A special field returns
-        # various objects and somehow deletes them and does not display them.
-        post = Post.objects.all().filter(active=True).exclude(status=str(0)).filter(status=str(1)).\
-            filter(category__active=True).filter(pub_datetime__lte=timezone.now()).\
-                filter(pub_datetime__lt=timezone.now()).exclude(pub_datetime__gte=timezone.now()).\
-                    exclude(pub_datetime__gt=timezone.now()).get(slug=slug)
-
-        # There is a little of complexity here. Explaining this part is not easy, and you should definitely get it
-        # with experience.
-        # You need to know that in this section we want to get posts similar to this post. A tool is needed for this,
-        # what better tool than tagging system?
-        # First, we get the tags of this post and then query them.
-        post_tags = post.tags.values_list("id", flat=True)
-
-        # This is not much different from previous queries. We will learn a little more about using the django-taggit
-        # package. We get to know a new type of query named ("annotate"). Annotate requires additional studies and
-        # explanation is not enough for them. Just know that annotate clears equals.
-        # On the other hand, we do an additional task: filtering posts whose tags are similar.
-        similar_posts = Post.objects.all().filter(active=True).exclude(active=False).filter(category__active=True).\
-            exclude(status="0").filter(pub_datetime__lte=timezone.now()).exclude(pub_datetime__gte=timezone.now()).\
-                filter(tags__in=post_tags).annotate(same_tags=models.Count("tags")).exclude(pk=post.id).\
-                    order_by("-same_tags").order_by("-pub_datetime")[:2]
+        # Only the posts that readers are allowed to see can be opened. Whether a post is visible (active, published,
+        # with an active category and a publishing date in the past) is stored in its is_public field, which the
+        # Post.actives manager checks for us (read blog/managers.py).
+        # The author, the category and the tags of the post are loaded with it, not one by one by the template.
+        post = Post.actives.select_related("author", "category").prefetch_related("tags").get(slug=slug)
+
+        # There is a little of complexity here. You need to know that in this section we want to get posts similar to
+        # this post. A tool is needed for this, what better tool than tagging system?
+        # Comparing the tags of this post with the tags of every other post on each request is very heavy, so the
+        # similar posts are computed ahead of time (when a post or its tags change) and stored in the RelatedPost
+        # model, ordered by rank (read blog/managers.py). Here we only read them back with one indexed query. The
+        # Post.actives manager makes sure that a similar post that has been hidden since then is not displayed.
+        similar_posts = list(Post.actives.summaries().filter(related_to_posts__post=post).order_by(
+            "related_to_posts__rank")[:2])
+        if not similar_posts and not RelatedPost.objects.filter(post=post).exists():
+            # The list of this post has not been built yet (a post older than the RelatedPost model, until
+            # "manage.py rebuild_related_posts" runs, or one imported with bulk queries): the posts that share the most
+            # tags with it are found at query time, like before.
+            similar_posts = list(Post.actives.summaries().filter(tags__in=[tag.id for tag in post.tags.all()])
+                                 .exclude(pk=post.pk).annotate(same_tags=Count("tags"))
+                                 .order_by("-same_tags", "-pub_datetime")[:2])
 
         # Here is a simple (but interesting) live querying system in Django and MTV. Here, whenever the user opens the page,
-        # a view is added to the views' field in the database.
-        post.views = post.views + 1
-        post.save()
+        # a view is added to the views' field. The view is not saved right away: post_view_counter collects the views
+        # in memory and writes them to the database in batches (read blog/counters.py). We only add the views that are
+        # still waiting in the buffer to the post object, so the reader sees the correct number. The visitor (a hash,
+        # never the IP address itself) is kept for the daily analytics of the admins.
+        if request.method != "POST":
+            post_view_counter.increment(post.id, visitor=get_visitor(request))
+        post.views = post.views + post_view_counter.pending(post.id)
 
         # Here, like post_list_view, we filter those types of fields that we need so that we are aware, for example,
         # the posts whose activation status is off in the database are not displayed and...
@@ -239,12 +262,37 @@ def post_detail_view(request, slug):
         # If the desired object is not in the database, 404 or (not found!) will be returned.
         raise Http404
 
+    # The comments form. Readers must log in to comment, and their comments wait for the approval of the admins
+    # (except the comments of the staff). Replies send the id of the comment they answer in the hidden parent field.
+    comment_form = CommentForm(request.POST or None, post=post)
+    if request.method == "POST":
+        if not request.user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        if comment_form.is_valid():
+            comment = comment_form.save(commit=False)
+            comment.post = post
+            comment.author = request.user
+            # The comments of the staff are approved, and already read: they never enter the moderation queue (and its
+            # unread counters).
+            comment.active = comment.read = request.user.is_staff or request.user.is_superuser
+            comment.save()
+            if comment.active:
+                return HttpResponseRedirect("{}#comment-{}".format(post.get_absolute_url(), comment.id))
+            return HttpResponseRedirect("{}?comment=pending#comments".format(post.get_absolute_url()))
+
+    # One page of the comment tree (with the authors) in one query, in reading order: every comment is followed by its
+    # replies (read CommentQuerySet in blog/managers.py). The next page continues from the path of the last comment,
+    # so a post with thousands of comments costs the same on every page. The total is the stored comments_count.
+    comments, comments_next = Comment.objects.thread_page(post, after=request.GET.get("comments"),
+                                                          per_page=COMMENTS_PER_PAGE)
 
     context = {
         "post": post,
-        "tags_list": tags_list,
-        "categories": categories_list,
         "similar_posts": similar_posts,
+        "comments": comments,
+        "comments_next": comments_next,
+        "comment_form": comment_form,
+        "comment_pending": request.GET.get("comment") == "pending",
     }
 
     # Here too, the desired object is sent by a dictionary. But where are the slugs filled??? Check the blog/urls.py
@@ -252,6 +300,7 @@ def post_detail_view(request, slug):
     return render(request, "blog/post_detail.html", context)
 
 
+@posts_condition
 def author_post_list_view(request, author_username):
     """
     excellent. QURNO has been completed to a very large extent. This function is no different from the previous
@@ -262,55 +311,108 @@ def author_post_list_view(request, author_username):
     except ObjectDoesNotExist:
         raise Http404
 
-    try:
-        author_posts = author.user_blog_posts.all().filter(active=True).exclude(active=False).\
-                filter(category__active=True).exclude(category__active=False).filter(pub_datetime__lte=timezone.now()).\
-                    exclude(pub_datetime__gte=timezone.now()).filter(status=str(1)).exclude(status=str(0))
-    except ObjectDoesNotExist:
-        raise Http404
-
-    paginator = Paginator(author_posts, 25)
-
-    page_number = request.GET.get('page')
-
-    page_obj = paginator.get_page(page_number)
+    author_posts = Post.actives.summaries().filter(author=author)
 
-    page_obj.adjusted_elided_pages = paginator.get_elided_page_range(page_number or 1, on_each_side=1, on_ends=2)
+    page_obj, paginator, page_number = _paginate_posts(
+        request, author_posts, "blog:post_list:count:author:{}".format(author.pk))
 
     context = {
         "author": author,
         "author_posts": page_obj,
+        "page_obj": page_obj,
         "page_number": page_number,
-        "tags_list": tags_list,
-        "categories_list": categories_list,
     }
     return render(request, "blog/author_post_list.html", context)
 
 
+@posts_condition
 def category_list_view(request):
-
-    return render(request, "blog/category_list.html", {"categories": categories_list, "tags_list": tags_list})
+    # All the active categories, each with its number of public posts, counted in the same (grouped) query instead of
+    # one COUNT query per category in the template.
+    categories = Category.objects.filter(active=True).annotate(
+        posts_count=Count("category_blog_posts", filter=Q(category_blog_posts__is_public=True)))
+    return render(request, "blog/category_list.html", {"categories": categories})
 
 
+@posts_condition
 def category_detail_view(request, slug):
     try:
         category = Category.objects.get(active=True, slug=slug)
-        category_posts = category.category_blog_posts.filter(active=True).exclude(status="0").filter(category__active=True)\
-                    .filter(pub_datetime__lte=timezone.now()).filter(pub_datetime__lt=timezone.now())
     except ObjectDoesNotExist:
         raise Http404
-    
-    return render(request, "blog/category_detail.html", {"category": category, 
-                                                         "category_posts": category_posts, 
-                                                         "tags_list": tags_list,
-                                                         "categories": categories_list, })
 
+    # A category can hold thousands of posts, so they are paginated like the other lists of posts.
+    category_posts = Post.actives.summaries().filter(category=category)
+    page_obj, paginator, page_number = _paginate_posts(
+        request, category_posts, "blog:post_list:count:category:{}".format(category.pk))
 
+    return render(request, "blog/category_detail.html", {"category": category,
+                                                         "category_posts": page_obj,
+                                                         "page_obj": page_obj,
+                                                         "page_number": page_number, })
+
+
+@posts_condition
 def tag_list_view(request):
     tags = Tag.objects.all()
     
     return render(request, "blog/tag_list.html", {
         "tags": tags,
-        "tags_list": tags_list,
-        "categories": categories_list,
     })
+
+
+def _get_jalali_archive(request):
+    """
+    The Jalali archive: the years (newest first), each with its months and the number of public posts in them. It is
+    one grouped query on the stored jalali_year/jalali_month columns, cached under the version stamp of the post
+    lists (blog/conditions.py), so a new, edited or newly published post gives it a new key.
+    """
+    key = "blog:archive:{}".format(get_posts_last_modified(request).timestamp())
+    archive = cache.get(key)
+    if archive is None:
+        archive = []
+        for jalali_year, jalali_month, posts_count in Post.actives.jalali_archive():
+            if not archive or archive[-1]["year"] != jalali_year:
+                archive.append({"year": jalali_year, "posts_count": 0, "months": []})
+            archive[-1]["posts_count"] += posts_count
+            archive[-1]["months"].append({"month": jalali_month, "name": JALALI_MONTHS[jalali_month - 1],
+                                          "posts_count": posts_count})
+        cache.set(key, archive, ARCHIVE_TIMEOUT)
+    return archive
+
+
+@posts_condition
+def archive_view(request, year=None):
+    """
+    The months of the Jalali archive with their number of posts, of all years or of one year.
+    """
+    archive = _get_jalali_archive(request)
+    years = [item for item in archive if item["year"] == year] if year else archive
+    if year and not years:
+        raise Http404
+    return render(request, "blog/archive.html", {"year": year, "years": years, "archive": archive})
+
+
+@posts_condition
+def archive_month_view(request, year, month):
+    """
+    The public posts of one Jalali month. They are read with a range scan on the blog_post_jalali_archive_idx index
+    and paginated just like the other post lists.
+    """
+    if not 1 <= month <= 12:
+        raise Http404
+
+    posts = Post.actives.summaries().filter(jalali_year=year, jalali_month=month)
+    page_obj, paginator, page_number = _paginate_posts(
+        request, posts, "blog:post_list:count:archive:{}-{}".format(year, month))
+
+    context = {
+        "year": year,
+        "month": month,
+        "month_name": JALALI_MONTHS[month - 1],
+        "posts": page_obj,
+        "page_obj": page_obj,
+        "page_number": page_number,
+        "archive": _get_jalali_archive(request),
+    }
+    return render(request, "blog/archive_month.html", context)
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/4.0/ref/settings/
 
 from pathlib import Path
 import os
+import sys
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -24,7 +25,8 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = os.environ["SECRET_KEY"]
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = os.environ["DEBUG"]
+# The environment only has strings, and any of them but "" is true (even "False"), so the value is parsed.
+DEBUG = os.environ.get("DEBUG", "").strip().lower() in ("1", "true", "yes", "on")
 
 ALLOWED_HOSTS = ["127.0.0.1", "0.0.0.0", "localhost"]
 
@@ -65,6 +67,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Developer installed middlewares
+    "extensions.middleware.ServerTimingMiddleware",
 ]
 
 ROOT_URLCONF = 'config.urls'
@@ -80,6 +84,10 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                # The cached tags and categories of the sidebar.
+                'blog.context_processors.sidebar',
+                # The Jalali date of today, shown on the admins pages.
+                'admins.context_processors.today',
             ],
         },
     },
@@ -116,6 +124,29 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.0/topics/cache/
+
+CACHES = {
+    # The cached sidebar and post lists (and the versions that invalidate them), the rate limits and their counters
+    # must be seen by every worker and by the management commands (import_posts bumps the sidebar version in its own
+    # process), so the cache is a shared Redis server: the redis service of docker-compose.yaml, or the server of the
+    # CACHE_URL environmental variable (README.md).
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get("CACHE_URL", "redis://redis:6379/0"),
+    }
+}
+
+# The tests run in one process and clear the cache themselves, so they need no server.
+if sys.argv[1:2] == ["test"]:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
 
@@ -211,6 +242,16 @@ JALALI_DATE_DEFAULTS = {
 
 CKEDITOR_UPLOAD_PATH = "server/"
 
+# The upload pipeline of the editor (read extensions/uploads.py): the uploaded images are shrunk to at most
+# CKEDITOR_IMAGE_MAX_DIMENSION pixels (twice the content column, for screens of two pixels per CSS pixel) and encoded
+# again at CKEDITOR_IMAGE_QUALITY without their metadata. Files over CKEDITOR_UPLOAD_MAX_SIZE bytes and images over
+# CKEDITOR_UPLOAD_MAX_PIXELS pixels are refused before anything is written.
+CKEDITOR_IMAGE_BACKEND = "extensions.uploads.CompressingImageBackend"
+CKEDITOR_IMAGE_MAX_DIMENSION = 1920
+CKEDITOR_IMAGE_QUALITY = 80
+CKEDITOR_UPLOAD_MAX_SIZE = 10 * 1024 * 1024
+CKEDITOR_UPLOAD_MAX_PIXELS = 50000000
+
 CKEDITOR_CONFIGS = {
     'default': {
         'skin': 'moono',
@@ -276,6 +317,57 @@ CKEDITOR_CONFIGS = {
     }
 }
 
+# Performance instrumentation settings (read extensions/middleware.py)
+# The share of the requests (between 0 and 1) that get a Server-Timing header and a line in the "performance" log.
+
+SERVER_TIMING_SAMPLE_RATE = float(os.environ.get("SERVER_TIMING_SAMPLE_RATE", 1 if DEBUG else 0.01))
+
+# The admin portal reads the totals of posts, comments and users from the planner statistics of PostgreSQL (estimates,
+# no counting at all) instead of the maintained counters. Worth it for very large tables.
+
+SITE_STATISTICS_APPROXIMATE = os.environ.get("SITE_STATISTICS_APPROXIMATE", "0") == "1"
+
+# Rate limits of the write paths (read extensions/ratelimit.py): for every limit, the size of the burst and the seconds
+# in which the whole burst refills. A limit that is missing here is disabled. The buckets live in the cache with the
+# RATELIMIT_CACHE alias, which must be shared by all the workers (the Redis server of CACHES).
+
+RATELIMIT_CACHE = "default"
+RATELIMITS = {
+    "login:ip": (20, 60),
+    "login:account": (5, 300),
+    "comment:ip": (10, 60),
+    "comment:account": (5, 60),
+}
+
+# Responsive images (read extensions/images.py): the widths of the resized copies of every uploaded banner and avatar,
+# made when the image is saved and by "manage.py build_image_variants" for existing files, and the quality of their
+# JPEG and WebP encoding.
+
+IMAGE_VARIANT_WIDTHS = {
+    # Cards of up to 970px (and the columns of the lists), on screens of one and two pixels per CSS pixel.
+    "blog.Post.banner": (360, 720, 970, 1440, 1940),
+    # Avatars of 26px to 155px.
+    "accounts.CustomUser.avatar": (52, 80, 155, 310),
+}
+IMAGE_VARIANT_QUALITY = 80
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {
+            "class": "logging.StreamHandler",
+        },
+    },
+    "loggers": {
+        "performance": {
+            "handlers": ["console"],
+            "level": "INFO",
+            "propagate": False,
+        },
+    },
+}
+
 # Crispy forms settings
 
 CRISPY_TEMPLATE_PACK = "bootstrap4"
@@ -14,11 +14,17 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
+from django.contrib.admin.views.decorators import staff_member_required
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from extensions.uploads import upload_view
+
 urlpatterns = [
+    # The uploads of the editor go through the limits and the compression of extensions/uploads.py. This path comes
+    # first, so it is used instead of the same one in ckeditor_uploader.urls.
+    path("ckeditor/upload/", staff_member_required(upload_view), name="ckeditor_upload"),
     path('ckeditor/', include('ckeditor_uploader.urls')),
     path('admin/', admin.site.urls),
     # Excellent! Here's how URLs work and complete a complete MTV cycle (this time the MTV cycle really ends :)
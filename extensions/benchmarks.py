@@ -0,0 +1,143 @@
+import json
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.urls import reverse
+
+from taggit.models import Tag
+
+from blog.models import Post, Category
+from blog.counters import post_view_counter
+
+# Create your benchmark helpers here.
+# They are shared by "manage.py benchmark_views", "manage.py query_budgets" and the query budget test
+# (blog/tests.py), so all of them visit the same URLs with the same arguments.
+
+URLCONFS = (("blog", "blog.urls"), ("pages", "pages.urls"), ("admins", "admins.urls"))
+
+# The committed query budget table: the highest number of SQL queries each view may run.
+QUERY_BUDGETS_PATH = settings.BASE_DIR / "extensions" / "query_budgets.json"
+
+
+class QueryCounter:
+    """
+    A database execute wrapper (connection.execute_wrapper) that counts the queries and their total time.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.time += time.perf_counter() - start
+
+
+def get_admin_user(username=None):
+    """
+    The user that opens the admins views: the given one, or a superuser, or at least an author.
+    """
+    users = get_user_model().objects.all()
+    if username:
+        return users.filter(username=username).first()
+    return users.filter(is_superuser=True).first() or users.filter(is_author=True).first()
+
+
+def get_samples():
+    """
+    Real values for the arguments of the URLs (slugs, ids and usernames): the newest public post, its category, one
+    of its tags and its author, so the views have work to do.
+    """
+    post = Post.actives.order_by("-pub_datetime", "-id").select_related("author", "category").first()
+    category = post.category if post else Category.objects.filter(active=True).first()
+    tag = post and post.tags.filter(slug__regex=r"^[-\w]+$").first()
+    tag = tag or Tag.objects.filter(slug__regex=r"^[-\w]+$").first()
+    return {
+        "post": post,
+        "category": category,
+        "tag": tag,
+        "query": post.title.split()[0] if post else "",
+    }
+
+
+def iter_view_urls(samples):
+    """
+    Yields (view name, URL) for every pattern of URLCONFS, with the arguments filled from the samples, or (view name,
+    None) if there is no data for its arguments. The view name is "namespace:name", plus the names of the arguments
+    when two patterns share a name (with and without arguments).
+    """
+    post, category, tag = samples["post"], samples["category"], samples["tag"]
+    for namespace, urlconf in URLCONFS:
+        for pattern in import_module(urlconf).urlpatterns:
+            name = pattern.name
+            kwargs = {}
+            for group in pattern.pattern.regex.groupindex:
+                if group == "slug" and name == "post_detail":
+                    kwargs[group] = post and post.slug
+                elif group == "slug":
+                    kwargs[group] = category and category.slug
+                elif group == "tag_slug":
+                    kwargs[group] = tag and tag.slug
+                elif group == "author_username":
+                    kwargs[group] = post and post.author.username
+                elif group == "category_designer_username":
+                    kwargs[group] = category and category.designer.username
+                elif group == "pk" and name.startswith("category"):
+                    kwargs[group] = category and category.pk
+                elif group == "pk":
+                    kwargs[group] = post and post.pk
+                elif group in ("year", "month"):
+                    kwargs[group] = post and getattr(post, "jalali_{}".format(group))
+                elif group == "name" and name == "export":
+                    kwargs[group] = "posts"
+                elif group == "file_format":
+                    kwargs[group] = "jsonl"
+                elif group == "queue":
+                    kwargs[group] = "pending"
+
+            view_name = "{}:{}".format(namespace, name) + ("[{}]".format(",".join(sorted(kwargs))) if kwargs else "")
+            if None in kwargs.values() or "" in kwargs.values():
+                yield view_name, None
+                continue
+
+            url = reverse("{}:{}".format(namespace, name), kwargs=kwargs or None)
+            if name == "post_search":
+                url += "?query={}".format(samples["query"])
+            yield view_name, url
+
+
+def count_queries(client, url):
+    """
+    Returns the response of a GET request and the number of queries it ran. A first request warms up the caches
+    (templates, sidebar, counts), as on a running server, and the buffered post views are written before it, so the
+    counted request never pays for a flush.
+    """
+    post_view_counter.flush()
+    client.get(url)
+    # connection.queries is cleared at the start of every request, so the queries are counted with a wrapper.
+    queries = QueryCounter()
+    with connection.execute_wrapper(queries):
+        response = client.get(url)
+        if response.streaming:
+            # The queries of a streaming response (the exports) run while its content is read.
+            for _ in response.streaming_content:
+                pass
+    return response, queries.count
+
+
+def load_query_budgets(path=QUERY_BUDGETS_PATH):
+    with open(path, encoding="utf-8") as budgets:
+        return json.load(budgets)
+
+
+def write_query_budgets(budgets, path=QUERY_BUDGETS_PATH):
+    with open(path, "w", encoding="utf-8") as output:
+        json.dump(budgets, output, indent=2, sort_keys=True)
+        output.write("\n")
@@ -0,0 +1,140 @@
+import io
+import posixpath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+# Create your image helpers here.
+# Banners and avatars are uploaded as they are (often photos of a few megabytes), but they are shown as cards of a few
+# hundred pixels and as avatars of 26 to 155 pixels. So every uploaded image gets resized copies ("variants") of the
+# widths in settings.IMAGE_VARIANT_WIDTHS, in its own format and in WebP, and their names and sizes are stored on the
+# row (the "<field>_variants" JSON fields) so the templates build srcset attributes without opening any file (read the
+# responsive_images template tags).
+
+VARIANTS_DIRECTORY = "variants"
+# The EXIF orientations that turn the image by 90 degrees (its width and height are swapped by exif_transpose).
+ROTATED_ORIENTATIONS = (5, 6, 7, 8)
+
+
+def get_variant_name(name, width, extension):
+    directory, filename = posixpath.split(name)
+    return posixpath.join(directory, VARIANTS_DIRECTORY, "{}-{}w.{}".format(
+        posixpath.splitext(filename)[0], width, extension))
+
+
+def encode_image(image, image_format, quality):
+    """
+    Encodes an image to JPEG, WebP or PNG. The metadata of the original (EXIF, GPS positions, ICC comments) is never
+    copied, only the pixels.
+    """
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if image.mode in ("LA", "PA") or "transparency" in image.info else "RGB")
+    output = io.BytesIO()
+    if image_format == "JPEG":
+        image.convert("RGB").save(output, "JPEG", quality=quality, optimize=True, progressive=True)
+    elif image_format == "WEBP":
+        image.save(output, "WEBP", quality=quality)
+    else:
+        image.save(output, "PNG", optimize=True)
+    return output.getvalue()
+
+
+def build_variants(field_file, widths, quality=None, force=False):
+    """
+    Writes the variants of an image (a FieldFile) next to it, in a "variants" directory, and returns their
+    description, the value of the "<field>_variants" field:
+
+        {"source": "blog/post/a.jpg", "width": 4000, "height": 2250,
+         "variants": [{"width": 360, "height": 203, "name": "blog/post/variants/a-360w.jpg",
+                       "webp": "blog/post/variants/a-360w.webp"}, ...]}
+
+    Only the widths smaller than the original are made, an image is never enlarged. The width of the original itself
+    only gets a WebP copy ("name" is None), the original is the other format. The variant files that already exist are
+    kept unless force is True, so the default images that many rows share are encoded once.
+
+    Returns {} when there is no file, and no variants when the file is missing or is not an image (the source is still
+    recorded, so the next saves do not try again).
+    """
+    if not field_file:
+        return {}
+    storage = field_file.storage
+    quality = quality or settings.IMAGE_VARIANT_QUALITY
+    description = {"source": field_file.name, "variants": []}
+    try:
+        with storage.open(field_file.name) as source:
+            image = Image.open(source)
+            width, height = image.size
+            if image.getexif().get(0x0112) in ROTATED_ORIENTATIONS:
+                width, height = height, width
+            image_format, extension = ("JPEG", "jpg") if image.format in ("JPEG", "MPO") else ("PNG", "png")
+
+            variants = []
+            for variant_width in sorted({variant_width for variant_width in widths if variant_width < width} | {width}):
+                variants.append({
+                    "width": variant_width,
+                    "height": max(1, round(height * variant_width / width)),
+                    "name": get_variant_name(field_file.name, variant_width, extension) if variant_width < width else
+                    None,
+                    "webp": get_variant_name(field_file.name, variant_width, "webp"),
+                })
+
+            missing = [
+                (variant, key, variant_format)
+                for variant in variants
+                for key, variant_format in (("name", image_format), ("webp", "WEBP"))
+                if variant[key] and (force or not storage.exists(variant[key]))
+            ]
+            if missing:
+                # Decoding the original (the slow part) is only needed when some variant has to be written.
+                image = ImageOps.exif_transpose(image)
+                for variant, key, variant_format in missing:
+                    # reducing_gap first shrinks big photos by a whole factor, which is much faster and looks the same.
+                    resized = image if variant["width"] == width else image.resize(
+                        (variant["width"], variant["height"]), Image.Resampling.LANCZOS, reducing_gap=3.0)
+                    if storage.exists(variant[key]):
+                        storage.delete(variant[key])
+                    variant[key] = storage.save(variant[key], ContentFile(encode_image(resized, variant_format,
+                                                                                       quality)))
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return description
+    description.update(width=width, height=height, variants=variants)
+    return description
+
+
+def refresh_variants(instance, field_name, force=False):
+    """
+    Rebuilds the "<field>_variants" of a model instance when its image changed (the stored source is not the current
+    file) or when force is True, and saves only that field with an UPDATE query (no signals). Returns whether the
+    variants were rebuilt.
+    """
+    field_file = getattr(instance, field_name)
+    variants_field = "{}_variants".format(field_name)
+    if not force and (getattr(instance, variants_field) or {}).get("source", "") == (field_file.name or ""):
+        return False
+    variants = build_variants(field_file, settings.IMAGE_VARIANT_WIDTHS[
+        "{}.{}".format(instance._meta.label, field_name)], force=force)
+    setattr(instance, variants_field, variants)
+    type(instance)._default_manager.filter(pk=instance.pk).update(**{variants_field: variants})
+    return True
+
+
+def get_variants(field_file, variants):
+    """
+    The variants of an image that are up to date (made from the current file), smallest first, or [] if there are
+    none yet.
+    """
+    if not field_file or not variants or variants.get("source") != field_file.name:
+        return []
+    return variants["variants"]
+
+
+def get_variant_url(field_file, variants, min_width):
+    """
+    The URL of the smallest WebP variant at least min_width pixels wide (the original if there is none), for the
+    thumbnails of a fixed size.
+    """
+    for variant in get_variants(field_file, variants):
+        if variant["width"] >= min_width:
+            return field_file.storage.url(variant["webp"])
+    return field_file.url
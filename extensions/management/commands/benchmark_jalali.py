@@ -0,0 +1,69 @@
+import datetime
+import random
+import timeit
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from extensions.date import jalali
+from extensions.utils import JALALI_MONTHS, gregorian_to_jalali, get_jalali_date, get_jalali_dates
+
+
+def legacy_get_jalali_date(time):
+    """
+    get_jalali_date as it was before the fast conversion: format the date into a string, let jalali.Gregorian parse it
+    again (with a regular expression) and validate it (with a datetime), then look for the month name in a loop.
+    """
+    time = timezone.localtime(time)
+    time_to_list = list(jalali.Gregorian("{} {} {}".format(time.year, time.month, time.day)).persian_tuple())
+    for index, month in enumerate(JALALI_MONTHS):
+        if time_to_list[1] == index + 1:
+            time_to_list[1] = month
+            break
+    return "{} {} {} - ساعت {} و {} دقیقه".format(
+        time_to_list[2], time_to_list[1], time_to_list[0], time.hour, time.minute)
+
+
+class Command(BaseCommand):
+    """
+    A microbenchmark of the Jalali date conversion: the jalali.Gregorian and jalali.Persian classes and the old
+    get_jalali_date against the integer gregorian_to_jalali (without and with its cache) and the batch
+    get_jalali_dates. Every case converts the same random datetimes (one page of posts by default).
+
+    Usage: python manage.py benchmark_jalali [--dates 25] [--repeat 2000]
+    """
+
+    help = "Compares the speed of the old and the new Jalali date conversions."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dates", type=int, default=25, help="Datetimes converted in each round (one page).")
+        parser.add_argument("--repeat", type=int, default=2000, help="Number of rounds of each case.")
+
+    def handle(self, *args, **options):
+        generator = random.Random(1)
+        start = timezone.now() - datetime.timedelta(days=365 * 5)
+        times = [start + datetime.timedelta(seconds=generator.randint(0, 365 * 5 * 86400))
+                 for _ in range(options["dates"])]
+        dates = [(time.year, time.month, time.day) for time in times]
+
+        if [legacy_get_jalali_date(time) for time in times] != get_jalali_dates(times):
+            self.stderr.write(self.style.ERROR("The new conversion does not match the old one!"))
+            return
+
+        uncached = gregorian_to_jalali.__wrapped__
+        cases = (
+            ("jalali.Gregorian(y, m, d)", lambda: [jalali.Gregorian(*date).persian_tuple() for date in dates]),
+            ("jalali.Persian(y, m, d)", lambda: [jalali.Persian(*date).gregorian_tuple() for date in dates]),
+            ("gregorian_to_jalali (no cache)", lambda: [uncached(*date) for date in dates]),
+            ("gregorian_to_jalali (cached)", lambda: [gregorian_to_jalali(*date) for date in dates]),
+            ("old get_jalali_date", lambda: [legacy_get_jalali_date(time) for time in times]),
+            ("get_jalali_date", lambda: [get_jalali_date(time) for time in times]),
+            ("get_jalali_dates (batch)", lambda: get_jalali_dates(times)),
+        )
+
+        baseline = None
+        for name, case in cases:
+            seconds = min(timeit.repeat(case, number=options["repeat"], repeat=3))
+            per_date = seconds / (options["repeat"] * len(times)) * 10 ** 6
+            baseline = baseline or per_date
+            self.stdout.write("{:<32} {:>8.2f} us/date  {:>6.1f}x".format(name, per_date, baseline / per_date))
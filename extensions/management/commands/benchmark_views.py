@@ -0,0 +1,105 @@
+import datetime
+import json
+import statistics
+import time
+import tracemalloc
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+
+from taggit.models import Tag
+
+from extensions.benchmarks import QueryCounter, get_admin_user, get_samples, iter_view_urls
+from blog.models import Post, Category
+
+
+class Command(BaseCommand):
+    """
+    Requests every URL of blog.urls, admins.urls and pages.urls against the current database (fill it first with
+    "manage.py seed_blog") and measures, for each view: p50 and p95 latency, number of SQL queries and peak Python
+    memory. The result is written as a JSON report with sorted keys, so the reports of two releases can be diffed.
+
+    Latency is measured without query capturing or tracemalloc; the queries and the memory are measured in separate
+    requests, because both slow the request down.
+
+    Usage: python manage.py benchmark_views --requests 20 --output benchmark.json [--user admin]
+    """
+
+    help = "Measures latency, query count and peak memory of every public and admins view and writes a JSON report."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=20, help="Number of timed requests per URL.")
+        parser.add_argument("--output", default="benchmark.json")
+        parser.add_argument("--user", default=None, help="Username used for the admins views (default: a superuser).")
+
+    def handle(self, *args, **options):
+        client = Client(HTTP_HOST="localhost")
+        admin_user = get_admin_user(options["user"])
+
+        report = {
+            "generated": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "dataset": {
+                "posts": Post.objects.count(),
+                "public_posts": Post.actives.count(),
+                "categories": Category.objects.count(),
+                "tags": Tag.objects.count(),
+                "users": get_user_model().objects.count(),
+            },
+            "views": {},
+        }
+
+        for name, url in iter_view_urls(get_samples()):
+            if url is None:
+                self.stdout.write(self.style.WARNING("Skipped {} (no data).".format(name)))
+                continue
+            if name.startswith("admins:"):
+                if admin_user is None:
+                    self.stdout.write(self.style.WARNING("Skipped {} (no admins user).".format(url)))
+                    continue
+                client.force_login(admin_user)
+            else:
+                client.logout()
+
+            result = self.measure(client, url, options["requests"])
+            report["views"][name] = result
+            self.stdout.write("{:<40} {:>4} p50 {:>8.2f}ms  p95 {:>8.2f}ms  {:>4} queries  {:>8.1f}KB".format(
+                url[:40], result["status"], result["p50_ms"], result["p95_ms"], result["queries"],
+                result["peak_memory_kb"]))
+
+        with open(options["output"], "w", encoding="utf-8") as output:
+            json.dump(report, output, indent=2, sort_keys=True, ensure_ascii=False)
+        self.stdout.write(self.style.SUCCESS("Report written to {}.".format(options["output"])))
+
+    @staticmethod
+    def measure(client, url, requests):
+        # A first request warms up the caches (templates, sidebar, counts), as on a running server.
+        response = client.get(url)
+
+        timings = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            client.get(url)
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+
+        # connection.queries is cleared at the start of every request, so the queries are counted with a wrapper.
+        queries = QueryCounter()
+        with connection.execute_wrapper(queries):
+            client.get(url)
+
+        tracemalloc.start()
+        client.get(url)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        return {
+            "url": url,
+            "status": response.status_code,
+            "p50_ms": round(statistics.median(timings), 2),
+            "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 2),
+            "queries": queries.count,
+            "query_ms": round(queries.time * 1000, 2),
+            "peak_memory_kb": round(peak / 1024, 1),
+        }
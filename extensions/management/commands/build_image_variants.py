@@ -0,0 +1,57 @@
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F, Q
+from django.db.models.fields.json import KeyTextTransform
+
+from extensions.images import build_variants
+
+
+class Command(BaseCommand):
+    """
+    Builds the resized variants (read extensions/images.py) of the images of settings.IMAGE_VARIANT_WIDTHS that do not
+    have up to date variants yet: the files uploaded before the variants existed, or rows written without save()
+    (bulk_create, raw SQL). New uploads get their variants when they are saved.
+
+    The rows are grouped by file, so an image that many rows share (the default banner and avatar) is resized once
+    and all its rows are written with one UPDATE query. With --force, every variant is encoded again (after a change of
+    the widths or of the quality, for example).
+
+    Usage: python manage.py build_image_variants [--field blog.Post.banner] [--force]
+    """
+
+    help = "Builds the resized variants of the uploaded banners and avatars."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--field", action="append", choices=list(settings.IMAGE_VARIANT_WIDTHS),
+                            help="Only this image field (can be repeated). By default, all of them.")
+        parser.add_argument("--force", action="store_true", help="Encode the variants of every image again.")
+
+    def handle(self, *args, **options):
+        for key in options["field"] or settings.IMAGE_VARIANT_WIDTHS:
+            label, field_name = key.rsplit(".", 1)
+            try:
+                model = apps.get_model(label)
+            except LookupError as error:
+                raise CommandError(error)
+            field = model._meta.get_field(field_name)
+            variants_field = "{}_variants".format(field_name)
+
+            rows = model._default_manager.exclude(**{field_name: ""})
+            if not options["force"]:
+                # (A row without variants has no source at all, and NULL is never different from anything in SQL.)
+                rows = rows.annotate(variants_source=KeyTextTransform("source", variants_field)).filter(
+                    Q(variants_source__isnull=True) | ~Q(variants_source=F(field_name)))
+
+            files = rows_count = missing = 0
+            for name in list(rows.order_by().values_list(field_name, flat=True).distinct()):
+                variants = build_variants(field.attr_class(None, field, name), settings.IMAGE_VARIANT_WIDTHS[key],
+                                          force=options["force"])
+                rows_count += model._default_manager.filter(**{field_name: name}).update(**{variants_field: variants})
+                files += 1
+                if not variants.get("variants"):
+                    missing += 1
+                    self.stderr.write("{}: {} is missing or is not an image.".format(key, name))
+
+            self.stdout.write(self.style.SUCCESS("{}: built the variants of {} files ({} rows), {} failed.".format(
+                key, files - missing, rows_count, missing)))
@@ -0,0 +1,69 @@
+import posixpath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand
+from PIL import Image
+
+from ckeditor_uploader.utils import storage
+
+from extensions.uploads import compress_image
+
+IMAGE_EXTENSIONS = {".jpg": ".jpg", ".jpeg": ".jpg", ".png": ".png", ".webp": ".webp"}
+
+
+class Command(BaseCommand):
+    """
+    Compresses the images that were uploaded in the editor (settings.CKEDITOR_UPLOAD_PATH) before the upload pipeline
+    existed, like the new uploads (read extensions/uploads.py). The contents of the posts link to these files, so they
+    keep their names: an image is only replaced when its compressed version has the same format and is smaller. The
+    thumbnails of the file browser ("_thumb" files) are skipped.
+
+    Prints the total size before and after, and the bytes saved.
+
+    Usage: python manage.py compress_uploads [--dry-run]
+    """
+
+    help = "Compresses the images uploaded in the editor in place and reports the bytes saved."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Only report what would be saved.")
+
+    def handle(self, *args, **options):
+        images = compressed = before = after = 0
+        for name in self.walk(settings.CKEDITOR_UPLOAD_PATH):
+            stem, extension = posixpath.splitext(name)
+            if extension.lower() not in IMAGE_EXTENSIONS or stem.endswith("_thumb"):
+                continue
+            with storage.open(name) as image_file:
+                data = image_file.read()
+            images += 1
+            before += len(data)
+            try:
+                result = compress_image(data)
+            except (OSError, Image.DecompressionBombError) as error:
+                self.stderr.write("{}: {}".format(name, error))
+                result = None
+            if result is None or result[1] != IMAGE_EXTENSIONS[extension.lower()] or len(result[0]) >= len(data):
+                after += len(data)
+                continue
+
+            compressed += 1
+            after += len(result[0])
+            if not options["dry_run"]:
+                storage.delete(name)
+                storage.save(name, ContentFile(result[0]))
+
+        self.stdout.write(self.style.SUCCESS(
+            "{}{} of {} images: {:,} bytes -> {:,} bytes ({:,} bytes saved).".format(
+                "Would compress " if options["dry_run"] else "Compressed ", compressed, images, before, after,
+                before - after)))
+
+    def walk(self, directory):
+        if not storage.exists(directory):
+            return
+        directories, files = storage.listdir(directory)
+        for name in files:
+            yield posixpath.join(directory, name)
+        for name in directories:
+            yield from self.walk(posixpath.join(directory, name))
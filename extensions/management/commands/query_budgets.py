@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+
+from extensions.benchmarks import (QUERY_BUDGETS_PATH, count_queries, get_admin_user, get_samples, iter_view_urls,
+                                   load_query_budgets, write_query_budgets)
+
+
+class Command(BaseCommand):
+    """
+    Counts the SQL queries of every view of blog.urls, pages.urls and admins.urls against the current database and
+    compares them with the committed query budget table (extensions/query_budgets.json). It fails if a view runs more
+    queries than its budget, so it can run in CI or before a release. With --write, the table is rewritten with the
+    current counts instead (commit it after checking the diff).
+
+    The same table is enforced by the QueryBudgetTestCase in blog/tests.py, which also checks that no view runs more
+    queries when there is more data.
+
+    Usage: python manage.py query_budgets [--write] [--user admin]
+    """
+
+    help = "Checks (or writes) the per-view SQL query budget table."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--write", action="store_true", help="Write the current counts as the new budgets.")
+        parser.add_argument("--user", default=None, help="Username used for the admins views (default: a superuser).")
+
+    def handle(self, *args, **options):
+        client = Client(HTTP_HOST="localhost")
+        admin_user = get_admin_user(options["user"])
+        budgets = {} if options["write"] else load_query_budgets()
+
+        counts = {}
+        over_budget = []
+        for name, url in iter_view_urls(get_samples()):
+            if url is None or (name.startswith("admins:") and admin_user is None):
+                self.stdout.write(self.style.WARNING("{:<48} skipped (no data)".format(name)))
+                continue
+            if name.startswith("admins:"):
+                client.force_login(admin_user)
+            else:
+                client.logout()
+
+            response, counts[name] = count_queries(client, url)
+            budget = budgets.get(name)
+            if options["write"]:
+                status = "written"
+            elif budget is None:
+                status = "NO BUDGET"
+                over_budget.append(name)
+            elif counts[name] > budget:
+                status = "OVER BUDGET"
+                over_budget.append(name)
+            else:
+                status = "ok"
+            self.stdout.write("{:<48} {:>4} {:>4} queries  budget {:>4}  {}".format(
+                name, response.status_code, counts[name], "-" if budget is None else budget, status))
+
+        if options["write"]:
+            write_query_budgets(counts)
+            self.stdout.write(self.style.SUCCESS("Query budgets written to {}.".format(QUERY_BUDGETS_PATH)))
+        elif over_budget:
+            raise CommandError("Over the query budget: {}".format(", ".join(over_budget)))
+        else:
+            self.stdout.write(self.style.SUCCESS("All views are within their query budgets."))
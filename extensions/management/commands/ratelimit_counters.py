@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from extensions.ratelimit import get_rejected_counts, reset_rejected_counts
+
+
+class Command(BaseCommand):
+    """
+    Prints the number of requests every rate limit (settings.RATELIMITS, read extensions/ratelimit.py) has rejected,
+    one "name count" line per limit, so cron or a monitoring agent can collect them. With --reset, the counters start
+    again from zero after being printed.
+
+    Usage: python manage.py ratelimit_counters [--reset]
+    """
+
+    help = "Prints (and optionally resets) the counters of the requests rejected by the rate limits."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", action="store_true")
+
+    def handle(self, *args, **options):
+        for name, count in get_rejected_counts().items():
+            self.stdout.write("{} {}".format(name, count))
+        if options["reset"]:
+            reset_rejected_counts()
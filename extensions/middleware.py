@@ -0,0 +1,171 @@
+import contextvars
+import json
+import logging
+import random
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.template.backends.django import Template
+
+# Create your custom middlewares here.
+
+logger = logging.getLogger("performance")
+
+# The timing of the request that is running in this thread (or coroutine), or None if it is not sampled. The template
+# and cache hooks below look at it and do nothing when it is None, so requests that are not sampled pay (almost)
+# nothing.
+_current_timing = contextvars.ContextVar("server_timing", default=None)
+_missing = object()
+_install_lock = threading.Lock()
+_installed = False
+
+
+class RequestTiming:
+    """
+    Everything that is measured during one request.
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.query_time = 0.0
+        self.template_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.total_time = 0.0
+        # Some backends read the keys of get_many() with get() (BaseCache, LocMemCache), others the key of get() with
+        # get_many() (DatabaseCache): only the outer call of a read is counted.
+        self.in_cache_read = False
+
+    def record_query(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.query_time += time.perf_counter() - start
+            self.queries += 1
+
+    def as_header(self):
+        # https://www.w3.org/TR/server-timing/ (durations are in milliseconds). Browsers show them in the Network tab.
+        return ", ".join([
+            'sql;dur={:.1f};desc="{} queries"'.format(self.query_time * 1000, self.queries),
+            'tpl;dur={:.1f};desc="Templates"'.format(self.template_time * 1000),
+            'cache;desc="{} hits, {} misses"'.format(self.cache_hits, self.cache_misses),
+            'total;dur={:.1f};desc="View"'.format(self.total_time * 1000),
+        ])
+
+    def as_dict(self):
+        return {
+            "queries": self.queries,
+            "sql_ms": round(self.query_time * 1000, 2),
+            "template_ms": round(self.template_time * 1000, 2),
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "total_ms": round(self.total_time * 1000, 2),
+        }
+
+
+def _timed_template_render(render):
+    def wrapper(self, *args, **kwargs):
+        timing = _current_timing.get()
+        if timing is None:
+            return render(self, *args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return render(self, *args, **kwargs)
+        finally:
+            timing.template_time += time.perf_counter() - start
+    return wrapper
+
+
+def _counted_cache_get(get):
+    def wrapper(self, key, default=None, version=None):
+        timing = _current_timing.get()
+        if timing is None or timing.in_cache_read:
+            return get(self, key, default, version=version)
+        timing.in_cache_read = True
+        try:
+            value = get(self, key, _missing, version=version)
+        finally:
+            timing.in_cache_read = False
+        if value is _missing:
+            timing.cache_misses += 1
+            return default
+        timing.cache_hits += 1
+        return value
+    return wrapper
+
+
+def _counted_cache_get_many(get_many):
+    def wrapper(self, keys, version=None):
+        timing = _current_timing.get()
+        if timing is None or timing.in_cache_read:
+            return get_many(self, keys, version=version)
+        keys = list(keys)
+        timing.in_cache_read = True
+        try:
+            values = get_many(self, keys, version=version)
+        finally:
+            timing.in_cache_read = False
+        timing.cache_hits += len(values)
+        timing.cache_misses += len(keys) - len(values)
+        return values
+    return wrapper
+
+
+def _install_hooks():
+    """
+    Django has no signals for template rendering and cache reads (outside the tests), so the Django template backend
+    and the classes of the configured caches are wrapped once, the first time the middleware is created.
+    """
+    global _installed
+    with _install_lock:
+        if _installed:
+            return
+        Template.render = _timed_template_render(Template.render)
+        for cache_class in {type(caches[alias]) for alias in settings.CACHES}:
+            cache_class.get = _counted_cache_get(cache_class.get)
+            cache_class.get_many = _counted_cache_get_many(cache_class.get_many)
+        _installed = True
+
+
+class ServerTimingMiddleware:
+    """
+    Measures where the time of a request goes: the number and the time of the SQL queries, the time of the template
+    rendering, the cache hits and misses, and the total time of the view. The result is sent back in the
+    Server-Timing header (the browser shows it in the Network tab of the developer tools) and written as one JSON line
+    to the "performance" logger.
+
+    Only a sample of the requests is measured (SERVER_TIMING_SAMPLE_RATE, between 0 and 1), so it can stay on in
+    production. The other requests only pay for one random number.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        _install_hooks()
+
+    def __call__(self, request):
+        sample_rate = getattr(settings, "SERVER_TIMING_SAMPLE_RATE", 0)
+        if not sample_rate or random.random() >= sample_rate:
+            return self.get_response(request)
+
+        timing = RequestTiming()
+        token = _current_timing.set(timing)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timing.record_query))
+                response = self.get_response(request)
+        finally:
+            timing.total_time = time.perf_counter() - start
+            _current_timing.reset(token)
+
+        response["Server-Timing"] = timing.as_header()
+        logger.info(json.dumps(dict(
+            method=request.method, path=request.path, status=response.status_code, **timing.as_dict()
+        )))
+        return response
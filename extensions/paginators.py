@@ -0,0 +1,149 @@
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.encoding import force_bytes, force_str
+from django.utils.functional import cached_property
+from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
+
+# Create your custom paginators here.
+
+
+class CachedCountPaginator(Paginator):
+    """
+    The regular Paginator in Django runs a COUNT(*) query over the whole queryset on every request, just to know how
+    many pages there are. On a large archive this query is as heavy as the page itself. This Paginator works exactly
+    like the regular one, except that the total count is kept in the cache (per filter, for example per tag or per
+    author) for a short time.
+    """
+
+    def __init__(self, object_list, per_page, cache_key, timeout=300, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.cache_key = cache_key
+        self.timeout = timeout
+
+    @cached_property
+    def count(self):
+        count = cache.get(self.cache_key)
+        if count is None:
+            count = super().count
+            cache.set(self.cache_key, count, self.timeout)
+        return count
+
+
+class KeysetPage:
+    """
+    A page that is produced by KeysetPaginator. It behaves like a list of objects (you can loop over it in templates)
+    and knows the cursors of its neighbours instead of their page numbers.
+    """
+
+    # Keyset pages are not numbered, so there is nothing to show between the previous and next buttons.
+    adjusted_elided_pages = ()
+    number = None
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __repr__(self):
+        return "<Keyset page of {} objects>".format(len(self))
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if self._has_next and self.object_list:
+            return self.paginator.encode_cursor(self.object_list[-1])
+        return None
+
+    @property
+    def previous_cursor(self):
+        if self._has_previous and self.object_list:
+            return self.paginator.encode_cursor(self.object_list[0])
+        return None
+
+
+class KeysetPaginator:
+    """
+    Keyset (or cursor) pagination. Instead of "skip the first 10000 rows and give me the next 25" (OFFSET), this
+    paginator says "give me 25 rows that come after this (pub_datetime, id)". The database can answer the second
+    question directly from an index, so page 400 costs the same as page 1. The price is that pages have no numbers;
+    each page only knows the cursor of the page before and after it.
+
+    The queryset is always ordered by the newest pub_datetime first, and the id breaks ties between posts that were
+    published at the same moment.
+    """
+
+    def __init__(self, object_list, per_page, date_field="pub_datetime"):
+        self.date_field = date_field
+        self.object_list = object_list.order_by("-{}".format(date_field), "-id")
+        self.per_page = int(per_page)
+
+    def encode_cursor(self, obj):
+        value = "{}|{}".format(getattr(obj, self.date_field).isoformat(), obj.pk)
+        return urlsafe_base64_encode(force_bytes(value))
+
+    def decode_cursor(self, cursor):
+        """
+        Returns the (datetime, id) pair hidden in the cursor, or None if the cursor has been tampered with.
+        """
+        try:
+            date_value, pk = force_str(urlsafe_base64_decode(cursor)).split("|")
+            date_value = parse_datetime(date_value)
+            pk = int(pk)
+        except (TypeError, ValueError):
+            return None
+        if date_value is None:
+            return None
+        return date_value, pk
+
+    def get_page(self, after=None, before=None):
+        """
+        Returns the page after the "after" cursor or before the "before" cursor. Invalid or empty cursors return the
+        first page, just like Paginator.get_page() does with invalid page numbers.
+        """
+        after = self.decode_cursor(after) if after else None
+        before = self.decode_cursor(before) if before else None
+
+        if before:
+            date_value, pk = before
+            # Walk backwards (oldest first), then flip the rows so the page still reads newest first.
+            queryset = self.object_list.filter(**{"{}__gte".format(self.date_field): date_value}).filter(
+                Q(**{"{}__gt".format(self.date_field): date_value}) | Q(id__gt=pk)
+            ).order_by(self.date_field, "id")
+            rows = list(queryset[:self.per_page + 1])
+            has_previous = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            rows.reverse()
+            return KeysetPage(rows, self, has_next=True, has_previous=has_previous)
+
+        queryset = self.object_list
+        if after:
+            date_value, pk = after
+            # "date <= X and (date < X or id < Y)" means the same as "(date, id) < (X, Y)", but the first (redundant)
+            # condition lets the database start its index scan right at the cursor.
+            queryset = queryset.filter(**{"{}__lte".format(self.date_field): date_value}).filter(
+                Q(**{"{}__lt".format(self.date_field): date_value}) | Q(id__lt=pk)
+            )
+        # One extra row tells us if there is a next page, without any COUNT(*) query.
+        rows = list(queryset[:self.per_page + 1])
+        has_next = len(rows) > self.per_page
+        return KeysetPage(rows[:self.per_page], self, has_next=has_next, has_previous=after is not None)
@@ -0,0 +1,171 @@
+import functools
+import math
+import time
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.core.cache import caches
+from django.http import HttpResponse
+
+from .sketches import hash64
+
+# Create your rate limits here.
+# The write paths (comments, logins) are limited per IP address and per account. The limits are token buckets whose
+# state lives in the shared cache (settings.RATELIMIT_CACHE), so every worker sees the same buckets, and checking one
+# costs one cache read and one cache write: no query, no password hashing.
+
+REJECTED_KEY = "ratelimit:rejected:{}"
+
+
+class TokenBucket:
+    """
+    A token bucket of "capacity" tokens that refills completely in "period" seconds: a client can send a burst of
+    "capacity" requests, then one request every period / capacity seconds.
+
+    The bucket is stored as a single number, its "theoretical arrival time" (the Generic Cell Rate Algorithm, which
+    behaves exactly like a token bucket): the moment the bucket will be full again, in microseconds. Every request
+    pushes that moment one interval further; a request that would push it more than the whole period into the future
+    is rejected. So there is no refill timer and nothing to clean up: the cache entry expires when the bucket is full
+    again.
+
+    The moment is moved with the atomic operations of the cache (add() for a new bucket, incr() and decr() for the
+    others) and never read then written back, so concurrent requests of many workers each take their own token.
+    Only a bucket that is already full is set back to "now" with a plain write, where a few concurrent requests may be
+    forgotten (never more than the burst that a full bucket allows anyway).
+    """
+
+    def __init__(self, name, capacity, period):
+        self.name = name
+        self.capacity = capacity
+        self.period = period
+        self.interval = period / capacity
+        # The cache can only add integers atomically.
+        self._interval = round(self.interval * 10 ** 6)
+        self._period = round(period * 10 ** 6)
+
+    @property
+    def cache(self):
+        return caches[settings.RATELIMIT_CACHE]
+
+    def get_cache_key(self, key):
+        # Hashed (with the secret key), so IP addresses and usernames are not stored in the cache, and any value fits
+        # the key rules of memcached.
+        return "ratelimit:{}:{:x}".format(self.name, hash64(str(key)))
+
+    def consume(self, key):
+        """
+        Takes one token from the bucket of the key. Returns 0 if the request is allowed, otherwise the seconds until
+        the next token (for the Retry-After header).
+        """
+        now = round(time.time() * 10 ** 6)
+        cache_key = self.get_cache_key(key)
+        arrival = now + self._interval
+        if not self.cache.add(cache_key, arrival, math.ceil(self.interval)):
+            try:
+                arrival = self.cache.incr(cache_key, self._interval)
+            except ValueError:
+                # The bucket expired (it is full) between add() and incr().
+                arrival = None
+            if arrival is None or arrival - self._interval < now:
+                # The bucket was full: its arrival time is in the past.
+                arrival = now + self._interval
+                self.cache.set(cache_key, arrival, math.ceil(self.interval))
+            # (The margin absorbs the rounding of the intervals to microseconds, so a full burst is always allowed.)
+            elif arrival - now > self._period + self.capacity:
+                # A rejected request takes no token.
+                self.cache.decr(cache_key, self._interval)
+                self.count_rejection()
+                return (arrival - self._period - now) / 10 ** 6
+            else:
+                self.cache.touch(cache_key, math.ceil((arrival - now) / 10 ** 6))
+        return 0
+
+    def reset(self, key):
+        self.cache.delete(self.get_cache_key(key))
+
+    def count_rejection(self):
+        cache_key = REJECTED_KEY.format(self.name)
+        # incr() is atomic in memcached and Redis, add() creates the counter the first time.
+        if not self.cache.add(cache_key, 1, None):
+            try:
+                self.cache.incr(cache_key)
+            except ValueError:
+                self.cache.add(cache_key, 1, None)
+
+
+def get_bucket(name):
+    """
+    The bucket of settings.RATELIMITS with this name, or None if there is no such limit (the limit is disabled).
+    """
+    if name not in settings.RATELIMITS:
+        return None
+    capacity, period = settings.RATELIMITS[name]
+    return TokenBucket(name, capacity, period)
+
+
+def get_rejected_counts():
+    """
+    The number of rejected requests of every limit since the counters were reset, read from the shared cache in one
+    call (for "manage.py ratelimit_counters", or a monitoring scraper).
+    """
+    cache = caches[settings.RATELIMIT_CACHE]
+    counts = cache.get_many([REJECTED_KEY.format(name) for name in settings.RATELIMITS])
+    return {name: counts.get(REJECTED_KEY.format(name), 0) for name in settings.RATELIMITS}
+
+
+def reset_rejected_counts():
+    caches[settings.RATELIMIT_CACHE].delete_many([REJECTED_KEY.format(name) for name in settings.RATELIMITS])
+
+
+def get_client_ip(request):
+    # Behind a reverse proxy, the proxy must put the address of the client in REMOTE_ADDR.
+    return request.META.get("REMOTE_ADDR", "")
+
+
+def check_limits(scope, ip=None, account=None):
+    """
+    Consumes a token from the "<scope>:ip" and "<scope>:account" buckets (the ones that exist in settings.RATELIMITS
+    and have a key). Returns 0 if the request is allowed, otherwise the seconds to wait. The IP address is checked
+    first: it is the cheapest key and the one that stops most bursts.
+    """
+    for kind, key in (("ip", ip), ("account", account)):
+        bucket = get_bucket("{}:{}".format(scope, kind))
+        if bucket is not None and key:
+            wait = bucket.consume(key)
+            if wait:
+                return wait
+    return 0
+
+
+def too_many_requests(wait):
+    response = HttpResponse("تعداد درخواست های شما بیش از حد مجاز است. لطفا کمی بعد دوباره تلاش کنید.", status=429,
+                            content_type="text/plain; charset=utf-8")
+    response["Retry-After"] = str(math.ceil(wait))
+    return response
+
+
+def ratelimit(scope, methods=("POST", )):
+    """
+    Limits a view with the "<scope>:ip" and "<scope>:account" buckets of settings.RATELIMITS, for the given methods
+    only (by default the POST requests, the writes). The account is the id of the logged in user, read from the
+    session without loading the user. Rejected requests get "429 Too Many Requests" before the view (and its decorators
+    below this one) run. For example:
+
+        @ratelimit("comment")
+        @post_condition
+        def post_detail_view(request, slug):
+    """
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method in methods:
+                # The session (one query with the database backend) is only read if the IP address is allowed.
+                session = getattr(request, "session", None)
+                wait = check_limits(scope, ip=get_client_ip(request)) or check_limits(
+                    scope, account=session.get(SESSION_KEY) if session is not None else None)
+                if wait:
+                    return too_many_requests(wait)
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
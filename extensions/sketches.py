@@ -0,0 +1,78 @@
+import functools
+import hashlib
+import math
+import zlib
+
+from django.conf import settings
+
+# Create your probabilistic data structures (sketches) here.
+
+
+@functools.lru_cache(maxsize=None)
+def _get_hash_key():
+    return hashlib.sha256(settings.SECRET_KEY.encode()).digest()
+
+
+def hash64(value):
+    """
+    A stable 64-bit hash of a string (Python's hash() changes between processes). It is keyed with SECRET_KEY, so the
+    hashes of visitors (read blog/counters.py) cannot be reversed by guessing IP addresses.
+    """
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8, key=_get_hash_key()).digest(), "big")
+
+
+class HyperLogLog:
+    """
+    Counting the distinct visitors of a post exactly means keeping every visitor of every day. A HyperLogLog sketch
+    estimates the same number from a fixed number of small registers (2 ** precision bytes): every 64-bit hash picks a
+    register with its first bits, and the register keeps the longest run of leading zeros seen in the rest of the
+    bits. The standard error is about 1.04 / sqrt(2 ** precision), 3.25% with the default precision of 10.
+
+    Two sketches of the same precision can be merged (the maximum of each register), so the distinct visitors of a
+    month are the merge of the sketches of its days, without touching the raw views again.
+
+    Reference: Flajolet, Fusy, Gandouet and Meunier, "HyperLogLog: the analysis of a near-optimal cardinality estimation
+    algorithm" (2007).
+    """
+
+    PRECISION = 10
+
+    def __init__(self, precision=PRECISION, registers=None):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = bytearray(registers) if registers is not None else bytearray(self.size)
+
+    def add(self, hashed):
+        """
+        Adds an (unsigned) 64-bit hash, for example the result of hash64().
+        """
+        index = hashed >> (64 - self.precision)
+        rest = hashed & ((1 << (64 - self.precision)) - 1)
+        # The position of the first 1 bit in the remaining 64 - precision bits (all zeros counts as one more).
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError("Only sketches of the same precision can be merged.")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def __len__(self):
+        alpha = 0.7213 / (1 + 1.079 / self.size)
+        estimate = alpha * self.size ** 2 / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * self.size and zeros:
+            # Small cardinalities: most of the registers are still empty, and linear counting is more precise.
+            estimate = self.size * math.log(self.size / zeros)
+        return int(round(estimate))
+
+    def to_bytes(self):
+        # Sketches of a few visitors are almost all zeros and compress to a few dozen bytes.
+        return bytes([self.precision]) + zlib.compress(bytes(self.registers))
+
+    @classmethod
+    def from_bytes(cls, data):
+        data = bytes(data)
+        return cls(data[0], zlib.decompress(data[1:]))
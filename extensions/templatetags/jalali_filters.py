@@ -0,0 +1,28 @@
+from django import template
+
+from extensions.utils import get_jalali_date, format_jalali_day
+
+# Create your custom template filters here.
+# Usage: {% load jalali_filters %} ... {{ post.pub_datetime|jalali_date }} or {{ comment.datetime_created|jalali_day }}
+
+register = template.Library()
+
+
+@register.filter
+def jalali_date(value):
+    """
+    The Jalali date and time of a datetime (read get_jalali_date in extensions/utils.py).
+    """
+    if not value:
+        return ""
+    return get_jalali_date(value)
+
+
+@register.filter
+def jalali_day(value):
+    """
+    Only the Jalali day of a datetime, without the time.
+    """
+    if not value:
+        return ""
+    return format_jalali_day(value)
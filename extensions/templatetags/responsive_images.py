@@ -0,0 +1,51 @@
+from django import template
+from django.forms.utils import flatatt
+from django.utils.html import format_html
+
+from extensions.images import get_variants
+
+# Create your custom template tags here.
+# Usage: {% load responsive_images %} ...
+# {% responsive_image post.banner post.banner_variants sizes="(min-width: 992px) 970px, 100vw" alt=post.title %}
+
+register = template.Library()
+
+
+@register.simple_tag
+def responsive_image(image, variants, sizes=None, width=None, height=None, **attributes):
+    """
+    An <img> of an ImageField with all its variants (read extensions/images.py): a <picture> whose WebP <source> and
+    <img> have a srcset of every width, so the browser downloads the smallest file that fills the image on the screen.
+
+    The width and height attributes are the size of the image on the page when they are given (the avatars, for
+    example), otherwise the size of the original. Either way the browser knows the aspect ratio of the image before it
+    is loaded, and the page does not jump. "sizes" defaults to the given width, or to the whole screen. The other
+    keyword arguments (alt, class, ...) become attributes of the <img>, and the images are lazy loaded unless
+    loading="eager" is given.
+
+        {% responsive_image post.author.avatar post.author.avatar_variants width=26 height=26 alt="..." %}
+
+    An image without variants (not built yet, or not an image) is a plain <img> of the original.
+    """
+    variants_of_image = get_variants(image, variants)
+    if sizes is None:
+        sizes = "{}px".format(width) if width is not None else "100vw"
+    if variants_of_image and width is None and height is None:
+        width, height = variants["width"], variants["height"]
+    elif variants_of_image and height is None:
+        height = round(int(width) * variants["height"] / variants["width"])
+    attributes = {"src": image.url if image else "", "width": width, "height": height, "loading": "lazy",
+                  "decoding": "async", **attributes}
+    attributes = {name: value for name, value in attributes.items() if value is not None}
+    if not variants_of_image:
+        return format_html("<img{}>", flatatt(attributes))
+
+    storage = image.storage
+    srcset = ", ".join(
+        "{} {}w".format(storage.url(variant["name"]) if variant["name"] else image.url, variant["width"])
+        for variant in variants_of_image)
+    webp_srcset = ", ".join(
+        "{} {}w".format(storage.url(variant["webp"]), variant["width"]) for variant in variants_of_image)
+    return format_html('<picture><source type="image/webp"{}><img{}></picture>',
+                       flatatt({"srcset": webp_srcset, "sizes": sizes}),
+                       flatatt({**attributes, "srcset": srcset, "sizes": sizes}))
@@ -0,0 +1,124 @@
+import io
+import logging
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.http import HttpResponse, JsonResponse
+from django.utils.html import escape, escapejs
+from django.views.decorators.csrf import csrf_exempt
+from PIL import Image, ImageOps
+
+from ckeditor_uploader import views as ckeditor_views
+from ckeditor_uploader.backends import PillowBackend
+
+from .images import encode_image
+
+# Create your upload helpers here.
+# The images of the contents of the posts are uploaded in the editor (django-ckeditor, into
+# settings.CKEDITOR_UPLOAD_PATH), very often straight from a camera: 4000px photos of several megabytes, with their EXIF
+# metadata (the camera, sometimes the GPS position). Readers only see them in a column of less than 1000px. So the
+# uploads go through this pipeline: files over the size limits are refused before anything is written, and the images
+# are shrunk to settings.CKEDITOR_IMAGE_MAX_DIMENSION, encoded again at settings.CKEDITOR_IMAGE_QUALITY, without their
+# metadata. The saved bytes of every upload go to the "performance" log, and "manage.py compress_uploads" does the same
+# to the files uploaded before.
+
+logger = logging.getLogger("performance")
+
+# The format (and extension) an uploaded image is encoded to. Other formats (BMP, TIFF, ...) become JPEG, or PNG when
+# they are transparent. Animations are never touched.
+FORMATS = {"JPEG": ("JPEG", ".jpg"), "MPO": ("JPEG", ".jpg"), "PNG": ("PNG", ".png"), "WEBP": ("WEBP", ".webp")}
+# The multipart envelope of the upload request around the file itself.
+REQUEST_OVERHEAD = 64 * 1024
+
+
+def compress_image(data, max_dimension=None, quality=None):
+    """
+    Compresses an image (bytes). Returns the new bytes and the extension of their format, or None if the image should
+    be kept as it is: an animation, or an image that is small enough, has no metadata and would only grow.
+    """
+    max_dimension = max_dimension or settings.CKEDITOR_IMAGE_MAX_DIMENSION
+    quality = quality or settings.CKEDITOR_IMAGE_QUALITY
+    image = Image.open(io.BytesIO(data))
+    if getattr(image, "is_animated", False):
+        return None
+    transparent = image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info
+    image_format, extension = FORMATS.get(image.format, ("PNG", ".png") if transparent else ("JPEG", ".jpg"))
+    has_metadata = bool(image.getexif()) or any(key in image.info for key in ("exif", "xmp", "comment"))
+
+    image = ImageOps.exif_transpose(image)
+    resized = max(image.size) > max_dimension
+    if resized:
+        image.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS, reducing_gap=3.0)
+    compressed = encode_image(image, image_format, quality)
+    if not resized and not has_metadata and len(compressed) >= len(data):
+        return None
+    return compressed, extension
+
+
+class CompressingImageBackend(PillowBackend):
+    """
+    The image backend of ckeditor_uploader (settings.CKEDITOR_IMAGE_BACKEND) that saves the compressed image instead of
+    the uploaded one (read compress_image). Other files are saved as they are.
+    """
+
+    def save_as(self, filepath):
+        if not self.is_image:
+            return self.storage_engine.save(filepath, self.file_object)
+        original = self.file_object.read()
+        self.file_object.seek(0)
+        compressed = compress_image(original)
+        if compressed is None:
+            return super().save_as(filepath)
+
+        data, extension = compressed
+        saved_path = self.storage_engine.save(os.path.splitext(filepath)[0] + extension, ContentFile(data))
+        self.create_thumbnail(io.BytesIO(data), saved_path)
+        logger.info("editor upload %s: %d bytes -> %d bytes (%d saved)", saved_path, len(original), len(data),
+                    len(original) - len(data))
+        return saved_path
+
+
+def upload_error(request, message):
+    # The same answers as the errors of ckeditor_uploader: a script for the dialog of the image button, JSON for the
+    # images that are pasted or dropped in the editor (which shows "error.message").
+    function_number = request.GET.get("CKEditorFuncNum")
+    if function_number:
+        return HttpResponse("<script type='text/javascript'>window.parent.CKEDITOR.tools.callFunction({}, '', '{}');"
+                            "</script>".format(escape(function_number), escapejs(message)))
+    return JsonResponse({"uploaded": 0, "error": {"message": message}})
+
+
+@csrf_exempt
+def upload_view(request):
+    """
+    The upload view of the editor (ckeditor_uploader.views.upload, used instead of it in config/urls.py) with limits:
+    a request bigger than settings.CKEDITOR_UPLOAD_MAX_SIZE is refused from its Content-Length, before its body is
+    read, and an image of more than settings.CKEDITOR_UPLOAD_MAX_PIXELS pixels after reading its header only. Nothing
+    is decoded or written for them.
+    """
+    max_size = settings.CKEDITOR_UPLOAD_MAX_SIZE
+    size_error = "حجم فایل بیش از حد مجاز ({} مگابایت) است.".format(max_size // (1024 * 1024))
+    try:
+        content_length = int(request.META.get("CONTENT_LENGTH") or 0)
+    except ValueError:
+        content_length = 0
+    if content_length > max_size + REQUEST_OVERHEAD:
+        return upload_error(request, size_error)
+
+    uploaded_file = request.FILES.get("upload")
+    if uploaded_file is None:
+        return upload_error(request, "فایلی ارسال نشده است.")
+    if uploaded_file.size > max_size:
+        return upload_error(request, size_error)
+    try:
+        width, height = Image.open(uploaded_file).size
+    except Image.DecompressionBombError:
+        width, height = settings.CKEDITOR_UPLOAD_MAX_PIXELS + 1, 1
+    except OSError:
+        # Not an image: the settings of ckeditor_uploader decide whether other files are allowed.
+        width, height = 0, 0
+    uploaded_file.seek(0)
+    if width * height > settings.CKEDITOR_UPLOAD_MAX_PIXELS:
+        return upload_error(request, "ابعاد تصویر بیش از حد مجاز است.")
+    return ckeditor_views.upload(request)
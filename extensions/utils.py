@@ -1,3 +1,7 @@
+import datetime
+import functools
+import time as pytime
+
 from . import *
 from .date import jalali
 
@@ -5,88 +9,131 @@ from django.utils import timezone
 
 # Create your custom utils and abilities here. (Pure Python and Pure technics)
 
-
-def get_jalali_date(time):
-    # First we get a complete list of the Jalali/Hijri Solar months.
-    jalali_months = [
-        "فروردین",
-        "اردیبهشت",
-        "خرداد",
-        "تیر",
-        "مرداد",
-        "شهریور",
-        "مهر",
-        "آبان",
-        "آذر",
-        "دی",
-        "بهمن",
-        "اسفند",
-    ]
-
-    # Contrary to what you may think, the time sent to us by Django is not the time of Asia/Tehran, and it becomes a
-    # Gregorian date. Here we retrieve our local time (same Asia / Tehran) from timezone module.
+# The Jalali/Hijri Solar months, in order. JALALI_MONTHS[month - 1] is the name of a month.
+JALALI_MONTHS = (
+    "فروردین",
+    "اردیبهشت",
+    "خرداد",
+    "تیر",
+    "مرداد",
+    "شهریور",
+    "مهر",
+    "آبان",
+    "آذر",
+    "دی",
+    "بهمن",
+    "اسفند",
+)
+
+# The number of days before each Gregorian month in a normal year.
+_GREGORIAN_DAYS_BEFORE_MONTH = (0, 0, 31, 59, 90, 120, 151, 181, 212, 243, 273, 304, 334)
+
+
+@functools.lru_cache(maxsize=4096)
+def gregorian_to_jalali(year, month, day):
+    """
+    Converts a Gregorian date to a (year, month, day) Jalali tuple. This is the same arithmetic as
+    jalali.Gregorian (so the results are exactly the same), without the detour through a string, a regular expression
+    and a datetime object for validation. The result is also remembered for the last few thousand dates, and a blog
+    page only shows a handful of different days, so most calls are a dictionary lookup.
+    """
+    d_4 = year % 4
+    doy_g = _GREGORIAN_DAYS_BEFORE_MONTH[month] + day
+    if d_4 == 0 and month > 2:
+        doy_g += 1
+    d_33 = int(((year - 16) % 132) * .0305)
+    a = 286 if (d_33 == 3 or d_33 < (d_4 - 1) or d_4 == 0) else 287
+    if (d_33 == 1 or d_33 == 2) and (d_33 == d_4 or d_4 == 1):
+        b = 78
+    else:
+        b = 80 if (d_33 == 3 and d_4 == 0) else 79
+    if int((year - 10) / 63) == 30:
+        a -= 1
+        b += 1
+    if doy_g > b:
+        jalali_year = year - 621
+        doy_j = doy_g - b
+    else:
+        jalali_year = year - 622
+        doy_j = doy_g + a
+    if doy_j < 187:
+        jalali_month, jalali_day = divmod(doy_j - 1, 31)
+    else:
+        jalali_month, jalali_day = divmod(doy_j - 187, 30)
+        jalali_month += 6
+    return jalali_year, jalali_month + 1, jalali_day + 1
+
+
+@functools.lru_cache(maxsize=4096)
+def _format_jalali_day(year, month, day):
+    jalali_year, jalali_month, jalali_day = gregorian_to_jalali(year, month, day)
+    return "{} {} {}".format(jalali_day, JALALI_MONTHS[jalali_month - 1], jalali_year)
+
+
+def format_jalali_day(time):
+    """
+    "day month-name year" of a datetime, in the local time (Asia/Tehran).
+    """
     time = timezone.localtime(time)
+    return _format_jalali_day(time.year, time.month, time.day)
 
-    # The jalali module we received requires a variable in string format and a specific behavior.
-    # Here we build this method for our module, then pass it to the module and get the result.
-    time_to_str = "{} {} {}".format(time.year, time.month, time.day)
-    time_to_tuple = jalali.Gregorian(time_to_str).persian_tuple()
-
-    # The result of this module is a tuple, something that Python cannot change (or manipulate).
-    # We convert it to a list and store it in a new variable so that we can make the desired changes to them.
-    time_to_list = list(time_to_tuple)
-
-    # The result of this module is a tuple, something that Python cannot change (or manipulate). We convert it to a
-    # list and store it in a new variable so that we can make the desired changes to them.
-    for index, month in enumerate(jalali_months):
-        if time_to_list[1] == index + 1:
-            time_to_list[1] = month
-            break
-
-    # Now it's time to design the whole result in the form of a variable in a specific format and finally return it.
-    output = "{} {} {} - ساعت {} و {} دقیقه".format(
-        time_to_list[2],
-        time_to_list[1],
-        time_to_list[0],
-        time.hour,
-        time.minute,
-    )
-
-    return str(output)
-
-
-def get_jalali_today(time=timezone.now()):
-    jalali_months = [
-        "فروردین",
-        "اردیبهشت",
-        "خرداد",
-        "تیر",
-        "مرداد",
-        "شهریور",
-        "مهر",
-        "آبان",
-        "آذر",
-        "دی",
-        "بهمن",
-        "اسفند",
-    ]
 
-    time = timezone.localtime(time)
+def _format_jalali_datetime(time):
+    return "{} - ساعت {} و {} دقیقه".format(
+        _format_jalali_day(time.year, time.month, time.day), time.hour, time.minute)
 
-    time_to_str = "{} {} {}".format(time.year, time.month, time.day)
-    time_to_tuple = jalali.Gregorian(time_to_str).persian_tuple()
 
-    time_to_list = list(time_to_tuple)
-
-    for index, month in enumerate(jalali_months):
-        if time_to_list[1] == index + 1:
-            time_to_list[1] = month
-            break
-        
-    output = "{} {} {}".format(
-        time_to_list[2],
-        time_to_list[1],
-        time_to_list[0],
-    )
-
-    return str(output)
+def get_jalali_date(time):
+    """
+    The Jalali date and time of a datetime, for example "25 فروردین 1402 - ساعت 10 و 5 دقیقه".
+
+    Contrary to what you may think, the time sent to us by Django is not the time of Asia/Tehran, and it becomes a
+    Gregorian date. So we first retrieve our local time (same Asia / Tehran) from timezone module, then convert the
+    day with the fast (and cached) gregorian_to_jalali.
+    """
+    return _format_jalali_datetime(timezone.localtime(time))
+
+
+def get_jalali_dates(times):
+    """
+    The batch version of get_jalali_date: converts a whole page of datetimes at once (None stays None). Looking up
+    the current time zone is the slowest part of a single conversion, so here it is done only once per batch.
+    """
+    local_timezone = timezone.get_current_timezone()
+    return [_format_jalali_datetime(timezone.localtime(time, local_timezone)) if time is not None else None
+            for time in times]
+
+
+def set_jalali_dates(objects, field="pub_datetime"):
+    """
+    Converts the datetime field of a page of objects with get_jalali_dates and stores the results on the objects as
+    "jalali_<field>" (for example post.jalali_pub_datetime), where methods like Post.get_pub_datetime_jalali_date
+    find them.
+    """
+    attribute = "jalali_{}".format(field)
+    for obj, jalali_date in zip(objects, get_jalali_dates([getattr(obj, field) for obj in objects])):
+        setattr(obj, attribute, jalali_date)
+    return objects
+
+
+# The Jalali "today" of this process and the moment (a timestamp) at which it expires: the next local midnight.
+_jalali_today = (None, 0.0)
+
+
+def get_jalali_today(time=None):
+    """
+    The Jalali day of the given datetime, or of today in the local time (Asia/Tehran). The time is read on every call
+    (never at import, or a long-running worker would show the day it started on), but today's answer is computed only
+    once per day and process, and kept until the next local midnight.
+    """
+    global _jalali_today
+    if time is not None:
+        return format_jalali_day(time)
+
+    today, expires = _jalali_today
+    if today is None or pytime.time() >= expires:
+        now = timezone.localtime()
+        tomorrow = (now + datetime.timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+        today = _format_jalali_day(now.year, now.month, now.day)
+        _jalali_today = (today, tomorrow.timestamp())
+    return today
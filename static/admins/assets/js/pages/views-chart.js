@@ -0,0 +1,22 @@
+// Daily views chart (admins/includes/_views_chart.html)
+(function () {
+    var element = document.getElementById("views-chart");
+    var source = document.getElementById("views-chart-data");
+    if (!element || !source) {
+        return;
+    }
+    var series = JSON.parse(source.textContent);
+    // The visitors are only known for the series of one post.
+    var withVisitors = series.length && series[0].visitors !== null;
+    Morris.Line({
+        element: element,
+        data: series,
+        xkey: "label",
+        ykeys: withVisitors ? ["views", "visitors"] : ["views"],
+        labels: withVisitors ? ["بازدید", "بازدیدکننده"] : ["بازدید"],
+        lineColors: ["#13a2a6", "#f55145"],
+        parseTime: false,
+        hideHover: "auto",
+        resize: true
+    });
+})();